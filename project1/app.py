@@ -5,13 +5,12 @@ import pandas as pd
 import time
 
 # 导入模块
-from modules.data_loader import load_data
-from modules.data_cleaner import clean_data
-from modules.data_visualizer import create_dashboard
-from modules.customer_segmentation import perform_customer_segmentation
-from modules.marketing_analysis import analyze_marketing
-from modules.sales_forecasting import forecast_sales
-from modules.utils import display_dataset_info
+# 各分析页面的模块在打开对应页面时才导入（见各 display_* 函数），启动和项目介绍页面
+# 不加载 plotly、sklearn、statsmodels 等只有部分页面需要的依赖
+from modules.data_loader import get_data_version, load_data
+from modules.instrumentation import display_debug_panel
+from modules.sampling import DEFAULT_SAMPLE_FRACTION, SAMPLE_FRACTIONS, set_approximate_mode
+from modules.shared_data import get_shared_datasets
 
 # 页面配置已经在run_app.py中设置，此处不再重复设置
 
@@ -27,9 +26,26 @@ def main():
         ["项目介绍", "数据探索", "数据清理", "数据可视化仪表盘", "客户细分分析", "营销效果分析", "销售预测"]
     )
     
+    show_debug_panel = st.sidebar.checkbox("显示性能调试面板", value=False)
+    
+    # 近似查询模式：仪表盘基于分层样本计算，显示置信区间
+    approximate = st.sidebar.checkbox("近似查询模式", value=False,
+                                      help="仪表盘基于交易数据的分层样本快速估计，并显示95%置信区间")
+    sample_fraction = None
+    if approximate:
+        sample_fraction = st.sidebar.select_slider("样本比例", options=SAMPLE_FRACTIONS, value=DEFAULT_SAMPLE_FRACTION,
+                                                   format_func=lambda x: f"{x:.0%}")
+    set_approximate_mode(sample_fraction)
+    
+    # 本会话提交过后台任务时，在侧边栏显示未完成任务的进度（键见 job_runner.JOB_STATE_KEY）
+    if st.session_state.get('background_jobs'):
+        from modules.job_runner import display_session_jobs
+        display_session_jobs()
+    
     # 数据加载（仅在需要时加载）
     if menu != "项目介绍":
-        data = load_data()
+        # 多进程部署时各应用进程映射启动脚本发布的共享数据，否则从CSV加载
+        data = get_shared_datasets() or load_data()
         if not data:
             st.error("无法加载数据。请确保数据文件存在。")
             return
@@ -49,6 +65,10 @@ def main():
         display_marketing_analysis(data)
     elif menu == "销售预测":
         display_sales_forecasting(data)
+    
+    # 性能调试面板：显示各页面、图表和计算的耗时统计
+    if show_debug_panel:
+        display_debug_panel()
 
 # 项目介绍页面
 def display_intro():
@@ -137,6 +157,8 @@ def display_intro():
 
 # 数据探索页面
 def display_data_exploration(data):
+    from modules.utils import display_dataset_info
+    
     st.title("数据探索")
     
     # 添加AI辅助学习指导
@@ -209,8 +231,19 @@ def display_data_exploration(data):
                 '唯一值数量': df.nunique()
             }))
 
+# 数据质量监控器在所有会话之间共享
+@st.cache_resource
+def get_quality_monitor():
+    from modules.data_quality import DataQualityMonitor
+    return DataQualityMonitor()
+
 # 数据清理页面
 def display_data_cleaning(data):
+    from modules.data_cleaner import clean_data
+    from modules.data_exporter import EXPORT_FORMATS, export_dataframe, get_available_formats, remove_export
+    from modules.data_quality import check_all_datasets
+    from modules.job_runner import NOT_READY, display_job, submit_job
+    
     st.title("数据清理与预处理")
     
     # 添加AI辅助学习指导
@@ -255,11 +288,26 @@ def display_data_cleaning(data):
     st.write(f"### 原始{dataset}")
     st.dataframe(df.head())
     
+    # 数据质量检查（每个数据版本只检查新增的行）
+    with st.expander("数据质量检查"):
+        monitor = get_quality_monitor()
+        check_all_datasets(monitor, data)
+        
+        st.write("各质量规则的违规情况：")
+        st.dataframe(monitor.get_summary(dataset_key))
+        
+        st.write("按数据版本的累计违规数量：")
+        st.dataframe(monitor.get_history(dataset_key))
+    
     # 数据清理步骤
     st.write("### 数据清理步骤")
     
-    # 清理数据
-    cleaned_df, cleaning_report = clean_data(df, dataset_key)
+    # 清理数据：在后台任务中运行，大数据集清理期间页面显示进度，不会因浏览器超时中断
+    job = submit_job('clean_data', (get_data_version(df), dataset_key), clean_data, df, dataset_key)
+    result = display_job(job, f"清理{dataset}")
+    if result is NOT_READY:
+        return
+    cleaned_df, cleaning_report = result
     
     # 显示清理报告
     for step, details in cleaning_report.items():
@@ -278,17 +326,38 @@ def display_data_cleaning(data):
     st.write(f"### 清理后的{dataset}")
     st.dataframe(cleaned_df.head())
     
-    # 下载清理后的数据
-    csv = cleaned_df.to_csv(index=False)
-    st.download_button(
-        label=f"下载清理后的{dataset} CSV",
-        data=csv,
-        file_name=f"cleaned_{dataset_key}.csv",
-        mime="text/csv",
-    )
+    # 下载清理后的数据（仅在用户请求时才生成导出文件）
+    st.write("### 导出清理后的数据")
+    export_format = st.selectbox("选择导出格式:", get_available_formats())
+
+    if st.button("生成导出文件"):
+        export_path = None
+        with st.spinner("正在导出数据..."):
+            try:
+                export_path = export_dataframe(cleaned_df, export_format)
+            except Exception as e:
+                st.error(f"导出数据时出错: {str(e)}")
+
+        # 下载按钮只在生成文件的这一次运行中显示：Streamlit 在创建按钮时读取文件内容，
+        # 之后的运行不会重复读取和注册下载文件；读取后临时文件即可删除
+        if export_path:
+            format_info = EXPORT_FORMATS[export_format]
+            try:
+                with open(export_path, "rb") as f:
+                    st.download_button(
+                        label=f"下载清理后的{dataset} ({export_format})",
+                        data=f,
+                        file_name=f"cleaned_{dataset_key}.{format_info['extension']}",
+                        mime=format_info["mime"],
+                    )
+            finally:
+                remove_export(export_path)
+            st.caption("页面下一次更新后下载按钮会消失，需要时请重新生成导出文件")
 
 # 数据可视化仪表盘页面
 def display_dashboard(data):
+    from modules.data_visualizer import create_dashboard
+    
     st.title("数据可视化仪表盘")
     
     # 添加AI辅助学习指导
@@ -318,6 +387,8 @@ def display_dashboard(data):
 
 # 客户细分分析页面
 def display_customer_segmentation(data):
+    from modules.customer_segmentation import perform_customer_segmentation
+    
     st.title("客户细分分析")
     
     # 添加AI辅助学习指导
@@ -350,6 +421,8 @@ def display_customer_segmentation(data):
 
 # 营销效果分析页面
 def display_marketing_analysis(data):
+    from modules.marketing_analysis import analyze_marketing
+    
     st.title("营销效果分析")
     
     # 添加AI辅助学习指导
@@ -382,6 +455,8 @@ def display_marketing_analysis(data):
 
 # 销售预测页面
 def display_sales_forecasting(data):
+    from modules.sales_forecasting import forecast_sales
+    
     st.title("销售预测")
     
     # 添加AI辅助学习指导
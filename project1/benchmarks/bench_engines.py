@@ -0,0 +1,157 @@
+"""
+计算引擎基准：比较 pandas 和 Polars 两种引擎在各页面汇总计算上的结果和耗时
+
+交易数据按客户抽样或复制到多个规模，每个规模下先检查两种引擎的结果一致，
+再多次运行取中位数。需要安装 polars: pip install polars
+
+示例:
+    python benchmarks/bench_engines.py --data-dir data
+    python benchmarks/bench_engines.py --data-dir data --scales 0.5 1 4 8 --repeat 5 --json engines.json
+"""
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from modules.compute.behavior import compute_segment_behavior
+from modules.compute.customers import build_customer_360
+from modules.compute.engine import POLARS_AVAILABLE
+from modules.compute.rfm import compute_rfm
+from modules.data_loader import load_data
+from modules.sales_cube import build_sales_cube
+
+ENGINES = ['pandas', 'polars']
+
+# 各页面依赖的汇总计算，customer_360 为预先用 pandas 构建的 Customer-360 表
+PAGE_KERNELS = {
+    'sales_dashboard': lambda transactions, customers, customer_360, engine:
+        build_sales_cube(transactions, customers, engine),
+    'rfm': lambda transactions, customers, customer_360, engine:
+        compute_rfm(build_customer_360(transactions, customers, engine), today=pd.Timestamp('2026-01-01')),
+    'behavior': lambda transactions, customers, customer_360, engine:
+        compute_segment_behavior(transactions, customer_360, engine),
+}
+
+def scale_transactions(transactions_df, scale, seed=0):
+    """
+    按客户抽样或复制交易数据，抽样时保留被选中客户的全部交易
+    
+    Args:
+        transactions_df (pd.DataFrame): 交易数据
+        scale (float): 规模倍数，整数部分为复制的份数，复制的订单ID加上序号后缀；小数部分按客户抽样
+        seed (int): 抽样的随机种子
+    
+    Returns:
+        pd.DataFrame: 约为原数据 scale 倍的交易数据
+    """
+    copies = int(scale)
+    parts = [transactions_df.assign(transaction_id=transactions_df['transaction_id'] + f"-{i}") if i else transactions_df
+             for i in range(copies)]
+    fraction = scale - copies
+    if fraction > 0:
+        customers = transactions_df['customer_id'].dropna().unique()
+        chosen = np.random.default_rng(seed).choice(customers, int(len(customers) * fraction), replace=False)
+        sample = transactions_df[transactions_df['customer_id'].isin(chosen)]
+        parts.append(sample.assign(transaction_id=sample['transaction_id'] + f"-{copies}") if copies else sample)
+    return pd.concat(parts, ignore_index=True)
+
+def assert_same_result(expected, actual, path='result'):
+    """递归比较两种引擎的结果，DataFrame 要求列、类型和值相同，浮点数允许舍入误差"""
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(expected, actual, obj=path)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, actual, obj=path)
+    elif isinstance(expected, np.ndarray):
+        if expected.dtype.kind == 'f':
+            np.testing.assert_allclose(expected, actual, err_msg=path)
+        else:
+            np.testing.assert_array_equal(expected, actual, err_msg=path)
+    elif dataclasses.is_dataclass(expected):
+        for item in dataclasses.fields(expected):
+            assert_same_result(getattr(expected, item.name), getattr(actual, item.name), f"{path}.{item.name}")
+    elif isinstance(expected, dict):
+        assert list(expected) == list(actual), f"{path} 的键不同"
+        for key in expected:
+            assert_same_result(expected[key], actual[key], f"{path}[{key!r}]")
+    else:
+        assert expected == actual, f"{path} 不同: {expected!r} != {actual!r}"
+
+def benchmark(data, scales, repeat=3):
+    """
+    在每个规模下检查两种引擎的结果一致并测量耗时
+    
+    Args:
+        data (dict): load_data 返回的数据集
+        scales (list): 规模倍数列表
+        repeat (int): 每个计算的测量次数
+    
+    Returns:
+        list: 每个规模和页面一项，包含 page、scale、rows、各引擎耗时（秒）和 speedup
+    """
+    customers = data['customers']
+    results = []
+    for scale in scales:
+        transactions = scale_transactions(data['transactions'], scale)
+        customer_360 = build_customer_360(transactions, customers, 'pandas')
+        for page, kernel in PAGE_KERNELS.items():
+            outputs = {engine: kernel(transactions, customers, customer_360, engine) for engine in ENGINES}
+            assert_same_result(outputs['pandas'], outputs['polars'], page)
+            
+            timings = {}
+            for engine in ENGINES:
+                runs = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    kernel(transactions, customers, customer_360, engine)
+                    runs.append(time.perf_counter() - start)
+                timings[engine] = statistics.median(runs)
+            results.append({
+                'page': page,
+                'scale': scale,
+                'rows': len(transactions),
+                **timings,
+                'speedup': timings['pandas'] / timings['polars'],
+            })
+    return results
+
+def format_report(results):
+    """把基准结果格式化为文本表格"""
+    lines = [f"{'页面':<16}{'规模':>6}{'交易行数':>12}{'pandas':>10}{'polars':>10}{'加速比':>8}"]
+    for result in results:
+        lines.append(f"{result['page']:<18}{result['scale']:>6g}{result['rows']:>14,}"
+                     f"{result['pandas'] * 1000:>8.0f}ms{result['polars'] * 1000:>8.0f}ms{result['speedup']:>9.2f}x")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较 pandas 和 Polars 计算引擎的结果和耗时")
+    parser.add_argument("--data-dir", default=None, help="数据文件目录，默认为项目的 data 目录")
+    parser.add_argument("--scales", nargs="+", type=float, default=[0.25, 1, 4], help="交易数据的规模倍数（默认 0.25 1 4）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个计算的测量次数，取中位数（默认 3）")
+    parser.add_argument("--json", dest="json_path", default=None, help="同时把结果写入JSON文件")
+    args = parser.parse_args(argv)
+    
+    if not POLARS_AVAILABLE:
+        parser.error("需要安装 polars: pip install polars")
+    data = load_data(args.data_dir)
+    if not data or 'transactions' not in data or 'customers' not in data:
+        parser.error("无法加载交易和客户数据，请检查 --data-dir")
+    
+    results = benchmark(data, args.scales, args.repeat)
+    print("两种引擎的结果一致")
+    print(format_report(results))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+冷启动基准：在全新的解释器中导入各模块，统计导入耗时及最慢的依赖
+
+每个模块在单独的子进程中用 python -X importtime 导入，多次运行取中位数，
+结果区分项目自身的代码（app、modules.*）和第三方依赖。
+
+示例:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --modules app modules.sales_forecasting --repeat 5 --top 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认测量的模块：应用入口、各分析页面以及离线渲染和API的入口
+DEFAULT_MODULES = [
+    'app',
+    'modules.data_visualizer',
+    'modules.customer_segmentation',
+    'modules.marketing_analysis',
+    'modules.sales_forecasting',
+    'modules.report_renderer',
+    'modules.analytics_api',
+]
+
+# 项目自身代码的模块名前缀
+OWN_PREFIXES = ('app', 'modules')
+
+def measure_import(module, python=sys.executable):
+    """
+    在新的解释器中导入一个模块，解析 -X importtime 的输出
+    
+    Args:
+        module (str): 模块名
+        python (str): Python解释器路径
+    
+    Returns:
+        dict: total（模块的累计导入耗时，秒）、own（项目代码自身耗时）、
+              packages（各顶层包的累计导入耗时）
+    """
+    result = subprocess.run([python, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=PROJECT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    
+    total = 0.0
+    own = 0.0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|').split('|'))
+        self_seconds, cumulative_seconds = int(self_us) / 1e6, int(cumulative_us) / 1e6
+        root = name.split('.')[0]
+        if root in OWN_PREFIXES:
+            own += self_seconds
+        elif '.' not in name and name not in sys.stdlib_module_names:
+            # 顶层包第一次被导入时的累计耗时就是它的全部导入耗时
+            packages[root] = max(packages.get(root, 0.0), cumulative_seconds)
+        if name == module:
+            total = cumulative_seconds
+    return {'total': total, 'own': own, 'packages': packages}
+
+def benchmark(modules, repeat=3, python=sys.executable):
+    """
+    多次测量每个模块的冷启动导入耗时，取中位数
+    
+    Args:
+        modules (list): 模块名列表
+        repeat (int): 每个模块的测量次数
+        python (str): Python解释器路径
+    
+    Returns:
+        list: 每个模块一项，包含 module、total、own、packages
+    """
+    results = []
+    for module in modules:
+        runs = [measure_import(module, python) for _ in range(repeat)]
+        package_names = set().union(*(run['packages'] for run in runs))
+        results.append({
+            'module': module,
+            'total': statistics.median(run['total'] for run in runs),
+            'own': statistics.median(run['own'] for run in runs),
+            'packages': {name: statistics.median(run['packages'].get(name, 0.0) for run in runs)
+                         for name in package_names},
+        })
+    return results
+
+def format_report(results, top=5):
+    """把基准结果格式化为文本表格，每个模块列出最慢的 top 个第三方包"""
+    lines = [f"{'模块':<34}{'导入耗时':>10}{'项目代码':>10}  最慢的依赖"]
+    for result in results:
+        slowest = sorted(result['packages'].items(), key=lambda item: item[1], reverse=True)[:top]
+        dependencies = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in slowest)
+        lines.append(f"{result['module']:<36}{result['total'] * 1000:>9.0f}ms{result['own'] * 1000:>9.0f}ms  {dependencies}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量应用和各页面模块的冷启动导入耗时")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="要测量的模块，默认为应用入口和各页面")
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块的测量次数，取中位数（默认 3）")
+    parser.add_argument("--top", type=int, default=5, help="每个模块列出的最慢依赖数（默认 5）")
+    parser.add_argument("--json", dest="json_path", default=None, help="同时把结果写入JSON文件")
+    args = parser.parse_args(argv)
+    
+    results = benchmark(args.modules, args.repeat)
+    print(format_report(results, args.top))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from modules.compute.clustering import CLUSTERING_FEATURES, DEFAULT_CLUSTERING_FEATURES
+from modules.compute.forecast import FORECAST_METHODS
+from modules.customer_segmentation import get_kmeans_result, get_rfm_result
+from modules.data_loader import get_data_version, load_data
+from modules.marketing.roi_analysis import get_roi_result
+from modules.metrics import METRICS, compute_metrics, format_metric, metric_sources
+from modules.sales_cube import CUBE_DIMENSIONS, get_sales_cube, query_cube
+from modules.sales_forecasting import get_forecast_result
+
+# 分析API基于 Starlette（随 streamlit 一起安装），用 uvicorn 运行
+try:
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Route
+    import uvicorn
+    API_SERVER_AVAILABLE = True
+except ImportError:
+    API_SERVER_AVAILABLE = False
+
+# 每类端点同时执行的请求数：聚类、预测等重计算与KPI等轻量查询分别限流，
+# 重计算占满时轻量查询仍然可以立即执行
+CONCURRENCY_LIMITS = {'light': 8, 'heavy': 2}
+
+# 重计算端点排队等待的最长秒数，超时返回503
+HEAVY_QUEUE_TIMEOUT = 30
+
+# 响应缓存保存的最大条目数
+RESPONSE_CACHE_SIZE = 256
+
+# 默认返回的KPI
+DEFAULT_KPIS = ['total_sales', 'total_orders', 'avg_order_value', 'completion_rate',
+                'total_spend', 'total_conversions', 'overall_roi', 'total_visits']
+
+logger = logging.getLogger(__name__)
+
+class APIError(Exception):
+    """请求参数错误，返回给客户端的状态码和说明"""
+    
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _records(df):
+    """DataFrame 转为JSON记录列表：日期为ISO格式，NaN为null"""
+    return json.loads(df.to_json(orient='records', date_format='iso', force_ascii=False))
+
+def _number(value):
+    """numpy 标量转为Python数值，NaN为None"""
+    value = value.item() if hasattr(value, 'item') else value
+    return None if isinstance(value, float) and value != value else value
+
+def _split(value, default=None):
+    """逗号分隔的查询参数转为列表"""
+    if not value:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def _int_param(params, name, default, minimum, maximum):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise APIError(f"参数 {name} 必须是整数")
+    if not minimum <= value <= maximum:
+        raise APIError(f"参数 {name} 必须在 {minimum} 到 {maximum} 之间")
+    return value
+
+def _date_param(params, name):
+    """日期参数，返回 pd.Timestamp，未提供时返回None"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        raise APIError(f"参数 {name} 不是有效的日期: {value}")
+    if pd.isna(timestamp):
+        raise APIError(f"参数 {name} 不是有效的日期: {value}")
+    return timestamp
+
+class AnalyticsService:
+    """
+    分析API的计算层：按数据版本和参数计算并缓存序列化后的结果
+    
+    每个端点声明它依赖的数据集，数据集版本和规范化后的参数组成 ETag。客户端带着
+    相同的 ETag 重新请求时直接返回304，不需要计算；缓存中已有的结果直接返回；
+    同一 ETag 的并发请求只计算一次。
+    """
+    
+    # 端点：名称 -> (限流类别, 依赖的数据集, 处理方法)
+    ENDPOINTS = {
+        'kpis': ('light', ['transactions', 'customers', 'marketing', 'traffic'], '_kpis'),
+        'sales_monthly': ('light', ['transactions', 'customers'], '_sales_monthly'),
+        'marketing_summary': ('light', ['marketing'], '_marketing_summary'),
+        'segments_rfm': ('heavy', ['transactions', 'customers'], '_segments_rfm'),
+        'segments_kmeans': ('heavy', ['transactions', 'customers'], '_segments_kmeans'),
+        'forecast': ('heavy', ['transactions'], '_forecast'),
+    }
+    
+    def __init__(self, data):
+        self.data = data
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def etag(self, endpoint, params):
+        """
+        计算端点结果的 ETag，不执行计算
+        
+        客户细分依赖当天日期（最近消费天数），日期也计入 ETag。
+        """
+        _, datasets, _ = self.ENDPOINTS[endpoint]
+        version = get_data_version({key: self.data[key] for key in datasets})
+        parts = [endpoint, version, json.dumps(params, sort_keys=True, ensure_ascii=False)]
+        if endpoint.startswith('segments_'):
+            parts.append(str(pd.Timestamp('today').date()))
+        return '"' + hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:16] + '"'
+    
+    def cached(self, etag):
+        """返回缓存中 ETag 对应的响应内容，没有时返回None"""
+        with self._lock:
+            body = self._cache.get(etag)
+            if body is not None:
+                self._cache.move_to_end(etag)
+            return body
+    
+    async def get(self, endpoint, params, etag):
+        """
+        返回端点结果的JSON字节串，同一 ETag 的并发请求共享一次计算
+        
+        Args:
+            endpoint (str): ENDPOINTS 中的端点名称
+            params (dict): 规范化后的参数
+            etag (str): etag() 的结果
+        
+        Returns:
+            bytes: JSON响应内容
+        """
+        body = self.cached(etag)
+        if body is not None:
+            return body
+        
+        task = self._inflight.get(etag)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(self._compute, endpoint, params, etag))
+            self._inflight[etag] = task
+            task.add_done_callback(lambda _: self._inflight.pop(etag, None))
+        return await asyncio.shield(task)
+    
+    def _compute(self, endpoint, params, etag):
+        _, _, handler = self.ENDPOINTS[endpoint]
+        result = getattr(self, handler)(**params)
+        body = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+        with self._lock:
+            self._cache[etag] = body
+            self._cache.move_to_end(etag)
+            while len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return body
+    
+    def _kpis(self, names, start=None, end=None):
+        filters = {'date': (start, end)} if start and end else None
+        # 日期筛选只作用于销售指标，营销和流量指标的数据没有统一的日期列，不带筛选计算
+        sales = [name for name in names if metric_sources([name]) == {'sales'}]
+        values = compute_metrics(self.data, sales, filters)
+        values.update(compute_metrics(self.data, [name for name in names if name not in values]))
+        values = {name: values[name] for name in names}
+        return {
+            'filters': {'start': start, 'end': end},
+            'kpis': [{'name': name, 'label': METRICS[name]['label'], 'value': _number(value),
+                      'formatted': format_metric(name, value)} for name, value in values.items()],
+        }
+    
+    def _sales_monthly(self, by):
+        table = query_cube(get_sales_cube(self.data), by=['month'] + by)
+        return {'by': by, 'rows': _records(table[['month'] + by + ['revenue', 'orders', 'avg_order_value']])}
+    
+    def _marketing_summary(self):
+        names = ['total_campaigns', 'total_spend', 'total_conversions', 'avg_ctr', 'avg_conversion_rate',
+                 'avg_cpa', 'estimated_return', 'overall_roi']
+        result = get_roi_result(self.data)
+        return {
+            'kpis': {name: _number(value) for name, value in compute_metrics(self.data, names).items()},
+            'roi_estimated': result.roi_estimated,
+            'median_roi': _number(result.median_roi),
+            'channel_roi': _records(result.channel_roi),
+            'audience_roi': _records(result.audience_roi),
+            'monthly_roi': _records(result.monthly_roi),
+            'optimal_allocation': _records(result.optimal_allocation) if result.optimal_allocation is not None else None,
+        }
+    
+    def _segments_rfm(self):
+        result = get_rfm_result(self.data)
+        return {
+            'segment_counts': _records(result.segment_counts),
+            'characteristics': _records(result.characteristics),
+            'scores': _records(result.scores),
+        }
+    
+    def _segments_kmeans(self, features, n_clusters):
+        result = get_kmeans_result(self.data, tuple(features), n_clusters)
+        return {
+            'features': features,
+            'n_clusters': n_clusters,
+            'cluster_counts': _records(result.cluster_counts),
+            'characteristics': _records(result.characteristics),
+        }
+    
+    def _forecast(self, method, periods):
+        result = get_forecast_result(self.data, method, periods)
+        return {
+            'method': result.method,
+            'periods': periods,
+            'notes': [{'level': level, 'message': message} for level, message in result.notes],
+            'accuracy': {'mae': _number(result.mae), 'mape': _number(result.mape), 'rmse': _number(result.rmse)},
+            'predicted_total': _number(result.predicted_total),
+            'growth_rate': _number(result.growth_rate),
+            'monthly': _records(result.table[['month_name', 'total_amount', 'forecast']]),
+        }
+
+def _endpoint_params(endpoint, query):
+    """解析和校验查询参数，返回端点处理方法的关键字参数"""
+    if endpoint == 'kpis':
+        names = _split(query.get('names'), DEFAULT_KPIS)
+        unknown = [name for name in names if name not in METRICS]
+        if unknown:
+            raise APIError(f"未定义的指标: {', '.join(unknown)}")
+        start, end = _date_param(query, 'start'), _date_param(query, 'end')
+        if (start is None) != (end is None):
+            raise APIError("start 和 end 需要同时提供")
+        if start is not None and start > end:
+            raise APIError("start 不能晚于 end")
+        return {'names': names, 'start': query.get('start'), 'end': query.get('end')}
+    if endpoint == 'sales_monthly':
+        by = _split(query.get('by'), [])
+        invalid = [dim for dim in by if dim not in CUBE_DIMENSIONS or dim == 'date']
+        if invalid:
+            raise APIError(f"不支持的分组维度: {', '.join(invalid)}")
+        return {'by': by}
+    if endpoint == 'segments_kmeans':
+        features = _split(query.get('features'), DEFAULT_CLUSTERING_FEATURES)
+        invalid = [feature for feature in features if feature not in CLUSTERING_FEATURES]
+        if invalid or len(features) < 2:
+            raise APIError(f"聚类特征至少两个，可选: {', '.join(CLUSTERING_FEATURES)}")
+        return {'features': features, 'n_clusters': _int_param(query, 'n_clusters', 4, 2, 10)}
+    if endpoint == 'forecast':
+        method = query.get('method', FORECAST_METHODS[0])
+        if method not in FORECAST_METHODS:
+            raise APIError(f"不支持的预测方法，可选: {', '.join(FORECAST_METHODS)}")
+        return {'method': method, 'periods': _int_param(query, 'periods', 3, 1, 12)}
+    return {}
+
+def create_app(data=None, data_dir=None):
+    """
+    创建分析API应用
+    
+    端点（均为GET，返回JSON）：
+        /api/health                 数据版本
+        /api/kpis                   KPI，参数 names、start、end
+        /api/sales/monthly          月度销售额，参数 by（立方体维度，逗号分隔）
+        /api/marketing/summary      营销指标和各维度ROI
+        /api/segments/rfm           RFM客户分群
+        /api/segments/kmeans        K-means聚类，参数 features、n_clusters
+        /api/forecast               月度销售预测，参数 method、periods
+    
+    Args:
+        data (dict): 包含所有数据集的字典，默认从 data_dir 加载
+        data_dir (str): 数据文件目录，默认为项目的 data 目录
+    
+    Returns:
+        Starlette: ASGI应用
+    """
+    if not API_SERVER_AVAILABLE:
+        raise RuntimeError("运行分析API需要安装 starlette 和 uvicorn: pip install starlette uvicorn")
+    data = data if data is not None else load_data(data_dir)
+    if not data:
+        raise RuntimeError("无法加载数据，请确认数据目录中的文件存在")
+    
+    service = AnalyticsService(data)
+    semaphores = {category: asyncio.Semaphore(limit) for category, limit in CONCURRENCY_LIMITS.items()}
+    
+    def endpoint_handler(endpoint):
+        category = AnalyticsService.ENDPOINTS[endpoint][0]
+        
+        async def handler(request):
+            try:
+                params = _endpoint_params(endpoint, request.query_params)
+            except APIError as e:
+                return JSONResponse({'error': str(e)}, status_code=e.status_code)
+            
+            etag = service.etag(endpoint, params)
+            headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+            if request.headers.get('if-none-match') == etag:
+                return Response(status_code=304, headers=headers)
+            
+            body = service.cached(etag)
+            if body is None:
+                semaphore = semaphores[category]
+                try:
+                    await asyncio.wait_for(semaphore.acquire(), HEAVY_QUEUE_TIMEOUT if category == 'heavy' else None)
+                except asyncio.TimeoutError:
+                    return JSONResponse({'error': "服务繁忙，请稍后重试"}, status_code=503,
+                                        headers={'Retry-After': str(HEAVY_QUEUE_TIMEOUT)})
+                try:
+                    body = await service.get(endpoint, params, etag)
+                except Exception as e:
+                    logger.exception("计算 %s 时出错", endpoint)
+                    return JSONResponse({'error': f"计算出错: {e}"}, status_code=500)
+                finally:
+                    semaphore.release()
+            return Response(body, media_type='application/json', headers=headers)
+        
+        return handler
+    
+    async def health(request):
+        return JSONResponse({'status': 'ok', 'data_version': get_data_version(data)})
+    
+    routes = [
+        Route('/api/health', health),
+        Route('/api/kpis', endpoint_handler('kpis')),
+        Route('/api/sales/monthly', endpoint_handler('sales_monthly')),
+        Route('/api/marketing/summary', endpoint_handler('marketing_summary')),
+        Route('/api/segments/rfm', endpoint_handler('segments_rfm')),
+        Route('/api/segments/kmeans', endpoint_handler('segments_kmeans')),
+        Route('/api/forecast', endpoint_handler('forecast')),
+    ]
+    return Starlette(routes=routes)
+
+def run_server(host='127.0.0.1', port=8000, data_dir=None):
+    """加载数据并用 uvicorn 运行分析API"""
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    uvicorn.run(create_app(data_dir=data_dir), host=host, port=port)
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# 折线图最多绘制的点数，超过时使用LTTB降采样
+MAX_LINE_POINTS = 2000
+
+# 散点数超过该值时使用WebGL渲染
+WEBGL_THRESHOLD = 5000
+
+# 散点数超过该值时改为在服务端分箱的密度热力图，浏览器只接收网格
+DENSITY_THRESHOLD = 100000
+
+# 三维散点图最多绘制的点数，超过时按颜色分组抽样
+MAX_3D_POINTS = 20000
+
+# 密度热力图每个坐标轴的分箱数
+DENSITY_BINS = 100
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标
+    
+    首尾两点始终保留，中间的点分成 threshold-2 个桶，每个桶保留与前一个保留点、
+    下一个桶平均点组成的三角形面积最大的点，从而保留峰值和趋势的形状。
+    
+    Args:
+        x (np.ndarray): 升序的横坐标（数值）
+        y (np.ndarray): 纵坐标
+        threshold (int): 保留的点数
+    
+    Returns:
+        np.ndarray: 保留点的下标（升序）
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2)
+    # 第i个桶为 [edges[i], edges[i+1])，最后一个边界之后只剩最后一个点
+    edges = (np.floor(np.arange(threshold - 1) * every) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        indices[i + 1] = previous
+    return indices
+
+def downsample_lttb(df, x, y, threshold=MAX_LINE_POINTS, color=None):
+    """
+    对折线图数据做LTTB降采样
+    
+    多个纵轴列时保留各列降采样结果的并集；指定颜色列时在每个分组内分别降采样。
+    
+    Args:
+        df (pd.DataFrame): 图表数据，按横坐标排序
+        x (str): 横坐标列，可以是日期
+        y (str | list): 纵坐标列
+        threshold (int): 每条折线最多保留的点数
+        color (str): 分组列
+    
+    Returns:
+        pd.DataFrame: 降采样后的数据
+    """
+    if color is not None and color in df.columns:
+        groups = [group for _, group in df.groupby(color, sort=False, observed=True)]
+        if not groups:
+            return df
+        return pd.concat([downsample_lttb(group, x, y, threshold) for group in groups])
+    
+    if len(df) <= threshold:
+        return df
+    
+    df = df.sort_values(x)
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype('int64')
+    x_values = x_values.to_numpy(dtype=float)
+    
+    keep = np.zeros(len(df), dtype=bool)
+    for column in ([y] if isinstance(y, str) else y):
+        values = df[column].to_numpy(dtype=float)
+        valid = np.flatnonzero(~np.isnan(values))
+        keep[valid[lttb_indices(x_values[valid], values[valid], threshold)]] = True
+    return df[keep]
+
+def line_chart(df, x, y, max_points=MAX_LINE_POINTS, **kwargs):
+    """
+    绘制折线图，点数超过上限时先做LTTB降采样
+    
+    Args:
+        df (pd.DataFrame): 图表数据
+        x (str): 横坐标列
+        y (str | list): 纵坐标列
+        max_points (int): 每条折线最多绘制的点数
+        **kwargs: 传给 px.line 的其他参数
+    
+    Returns:
+        plotly.graph_objects.Figure: 折线图
+    """
+    return px.line(downsample_lttb(df, x, y, max_points, color=kwargs.get('color')), x=x, y=y, **kwargs)
+
+def scatter_chart(df, x, y, webgl_threshold=WEBGL_THRESHOLD, density_threshold=DENSITY_THRESHOLD,
+                  bins=DENSITY_BINS, **kwargs):
+    """
+    绘制散点图，根据点数选择渲染方式
+    
+    点数较少时与 px.scatter 相同；超过 webgl_threshold 时使用 scattergl；
+    超过 density_threshold 时在服务端用 numpy 分箱，绘制密度热力图，
+    浏览器接收的数据量只与分箱数有关。
+    
+    Args:
+        df (pd.DataFrame): 图表数据
+        x (str): 横坐标列
+        y (str): 纵坐标列
+        webgl_threshold (int): 使用WebGL渲染的点数阈值
+        density_threshold (int): 改用密度热力图的点数阈值
+        bins (int): 密度热力图每个坐标轴的分箱数
+        **kwargs: 传给 px.scatter 的其他参数（title、labels、color等）
+    
+    Returns:
+        plotly.graph_objects.Figure: 散点图或密度热力图
+    """
+    if len(df) > density_threshold:
+        return density_chart(df, x, y, bins=bins, title=kwargs.get('title'), labels=kwargs.get('labels'))
+    
+    render_mode = 'webgl' if len(df) > webgl_threshold else 'auto'
+    return px.scatter(df, x=x, y=y, render_mode=render_mode, **kwargs)
+
+def density_chart(df, x, y, bins=DENSITY_BINS, title=None, labels=None):
+    """
+    在服务端计算二维直方图并绘制热力图
+    
+    Args:
+        df (pd.DataFrame): 图表数据
+        x (str): 横坐标列
+        y (str): 纵坐标列
+        bins (int): 每个坐标轴的分箱数
+        title (str): 图表标题
+        labels (dict): 列名到显示名称的映射
+    
+    Returns:
+        plotly.graph_objects.Figure: 密度热力图
+    """
+    labels = labels or {}
+    values = df[[x, y]].apply(pd.to_numeric, errors='coerce').dropna().to_numpy(dtype=float)
+    counts, x_edges, y_edges = np.histogram2d(values[:, 0], values[:, 1], bins=bins)
+    # 空白网格显示为透明
+    counts = np.where(counts > 0, counts, np.nan)
+    
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=counts.T,
+        colorscale='Viridis',
+        colorbar={'title': '数量'},
+    ))
+    fig.update_layout(
+        title=f"{title}（共{len(values):,}个点，按密度显示）" if title else None,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+    )
+    return fig
+
+def scatter_3d_chart(df, x, y, z, max_points=MAX_3D_POINTS, color=None, random_state=42, **kwargs):
+    """
+    绘制三维散点图，点数超过上限时按颜色分组等比例抽样
+    
+    三维散点图本身使用WebGL渲染，但每个点都要传到浏览器，因此在服务端限制点数。
+    
+    Args:
+        df (pd.DataFrame): 图表数据
+        x (str): x轴列
+        y (str): y轴列
+        z (str): z轴列
+        max_points (int): 最多绘制的点数
+        color (str): 颜色分组列
+        random_state (int): 抽样的随机种子，保证同一数据每次抽样结果相同
+        **kwargs: 传给 px.scatter_3d 的其他参数
+    
+    Returns:
+        plotly.graph_objects.Figure: 三维散点图
+    """
+    total = len(df)
+    if total > max_points:
+        fraction = max_points / total
+        if color is not None and color in df.columns:
+            df = df.groupby(color, group_keys=False, observed=True, dropna=False).sample(
+                frac=fraction, random_state=random_state)
+        else:
+            df = df.sample(n=max_points, random_state=random_state)
+        if kwargs.get('title'):
+            kwargs['title'] = f"{kwargs['title']}（抽样显示{len(df):,}/{total:,}个点）"
+    return px.scatter_3d(df, x=x, y=y, z=z, color=color, **kwargs)
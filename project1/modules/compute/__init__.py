@@ -0,0 +1 @@
+# 纯计算函数包：输入数据和参数，返回结果对象，不调用 streamlit
\ No newline at end of file
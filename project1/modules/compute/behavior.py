@@ -0,0 +1,169 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from modules.compute.engine import resolve_engine, to_lazy
+from modules.compute.joins import join_aggregate
+
+# 购买时段划分：[开始小时, 结束小时) 及名称，其余小时为夜间
+TIME_PERIODS = [(5, 12, '上午 (5-12点)'), (12, 18, '下午 (12-18点)'), (18, 22, '晚上 (18-22点)')]
+NIGHT_PERIOD = '夜间 (22-5点)'
+
+# 行为汇总用到的交易列
+BEHAVIOR_COLUMNS = ['total_amount', 'product_category', 'time', 'payment_method', 'device', 'coupon_used']
+
+@dataclass
+class BehaviorResult:
+    """
+    各客户细分的消费行为汇总
+    
+    Attributes:
+        segment_category: 各细分各产品类别的消费金额，缺少 product_category 时为None
+        segment_time: 各细分各时段的订单数量（客户细分、时段、订单数量），缺少 time 时为None
+        segment_payment: 各细分各支付方式的订单数量，缺少 payment_method 时为None
+        segment_device: 各细分各设备的订单数量，缺少 device 时为None
+        coupon_usage: 各细分的优惠券使用率，缺少 coupon_used 时为None
+        coupon_amount: 各细分使用/未使用优惠券的平均订单金额，缺少 coupon_used 时为None
+        portraits: 细分 -> {'devices', 'payments', 'categories'}，各细分最常用的设备、
+                   支付方式和产品类别
+    """
+    segment_category: pd.DataFrame = None
+    segment_time: pd.DataFrame = None
+    segment_payment: pd.DataFrame = None
+    segment_device: pd.DataFrame = None
+    coupon_usage: pd.DataFrame = None
+    coupon_amount: pd.DataFrame = None
+    portraits: dict = field(default_factory=dict)
+
+def _time_period(times):
+    hours = pd.to_datetime(times).dt.hour
+    conditions = [(hours >= start) & (hours < end) for start, end, _ in TIME_PERIODS]
+    return np.select(conditions, [name for _, _, name in TIME_PERIODS], default=NIGHT_PERIOD)
+
+def _top_values(counts, column, n):
+    """根据各细分各取值的出现次数，返回每个细分中出现次数最多的 n 个取值"""
+    counts = counts.sort_values(['segment', 'count'], ascending=[True, False], kind='stable')
+    return counts.groupby('segment')[column].apply(lambda values: values.head(n).tolist()).to_dict()
+
+def _add_time_period(merged):
+    return merged.assign(time_period=_time_period(merged['time']))
+
+def compute_segment_behavior(transactions_df, customer_360, engine=None, plan=None):
+    """
+    按客户细分汇总品类偏好、购买时段、支付方式、设备和优惠券使用情况
+    
+    pandas 引擎只取交易数据中汇总需要的列与客户细分连接，由 join_aggregate 按内存预算
+    选择在内存中连接，或分区写入磁盘后逐个分区汇总。
+    
+    Args:
+        transactions_df (pd.DataFrame): 交易数据
+        customer_360 (pd.DataFrame): Customer-360 表，提供每位客户的细分
+        engine (str): 计算引擎，见 modules.compute.engine.resolve_engine
+        plan (JoinPlan): pandas 引擎的连接执行计划，默认见 modules.compute.joins.plan_join
+    
+    Returns:
+        BehaviorResult: 消费行为汇总
+    """
+    if resolve_engine(engine) == 'polars':
+        return _compute_segment_behavior_polars(transactions_df, customer_360)
+    
+    columns = [col for col in BEHAVIOR_COLUMNS if col in transactions_df.columns]
+    # 行号用于按细分在交易中首次出现的顺序排列客户画像
+    left = transactions_df[['customer_id'] + columns].assign(row_number=np.arange(len(transactions_df)))
+    count = ('row_number', 'size')
+    groupings = {'segment': (['segment'], {'first_row': ('row_number', 'min')})}
+    if 'product_category' in columns:
+        groupings['product_category'] = (['segment', 'product_category'],
+                                         {'total_amount': ('total_amount', 'sum'), 'count': count})
+    if 'time' in columns:
+        groupings['time_period'] = (['segment', 'time_period'], {'count': count})
+    for column in ('payment_method', 'device'):
+        if column in columns:
+            groupings[column] = (['segment', column], {'count': count})
+    if 'coupon_used' in columns:
+        groupings['coupon_usage'] = (['segment'], {'coupon_used': ('coupon_used', 'mean')})
+        groupings['coupon_amount'] = (['segment', 'coupon_used'], {'total_amount': ('total_amount', 'mean')})
+    summaries = join_aggregate(left, customer_360[['customer_id', 'segment']], 'customer_id', groupings,
+                               prepare=_add_time_period if 'time' in columns else None, plan=plan)
+    
+    result = BehaviorResult()
+    if 'product_category' in summaries:
+        result.segment_category = summaries['product_category'][['segment', 'product_category', 'total_amount']]
+    for key, name, columns in [('segment_time', 'time_period', ['客户细分', '时段', '订单数量']),
+                               ('segment_payment', 'payment_method', ['客户细分', '支付方式', '订单数量']),
+                               ('segment_device', 'device', ['客户细分', '设备', '订单数量']),
+                               ('coupon_usage', 'coupon_usage', ['客户细分', '优惠券使用率']),
+                               ('coupon_amount', 'coupon_amount', ['客户细分', '是否使用优惠券', '平均订单金额'])]:
+        if name in summaries:
+            frame = summaries[name].copy()
+            frame.columns = columns
+            setattr(result, key, frame)
+    
+    # 各细分最常用的设备、支付方式和产品类别
+    tops = {key: _top_values(summaries[column], column, n) if column in summaries else {}
+            for key, column, n in [('devices', 'device', 1), ('payments', 'payment_method', 2),
+                                   ('categories', 'product_category', 3)]}
+    segments = summaries['segment'].sort_values('first_row')['segment']
+    result.portraits = {segment: {key: tops[key].get(segment, []) for key in tops} for segment in segments}
+    return result
+
+def _compute_segment_behavior_polars(transactions_df, customer_360):
+    """compute_segment_behavior 的 Polars 实现，结果与 pandas 实现相同"""
+    import polars as pl
+    
+    columns = [col for col in BEHAVIOR_COLUMNS if col in transactions_df.columns]
+    merged = to_lazy(transactions_df[['customer_id'] + columns]).join(
+        to_lazy(customer_360[['customer_id', 'segment']]), on='customer_id', how='left', maintain_order='left')
+    # 与 DataFrame.groupby 一致，细分或分组列为空值的行不参与汇总，结果按分组键排序
+    merged = merged.filter(pl.col('segment').is_not_null())
+    
+    def count_by(frame, column):
+        return frame.filter(pl.col(column).is_not_null()).group_by(['segment', column]).agg(
+            pl.len().cast(pl.Int64).alias('count'))
+    
+    queries = {'segments': merged.select(pl.col('segment').unique(maintain_order=True))}
+    if 'product_category' in columns:
+        queries['segment_category'] = merged.filter(pl.col('product_category').is_not_null()).group_by(
+            ['segment', 'product_category']).agg(pl.col('total_amount').sum()).sort(['segment', 'product_category'])
+    if 'time' in columns:
+        hours = pl.col('time').str.to_time(strict=False).dt.hour()
+        period = pl.lit(NIGHT_PERIOD)
+        for start, end, name in reversed(TIME_PERIODS):
+            period = pl.when((hours >= start) & (hours < end)).then(pl.lit(name)).otherwise(period)
+        queries['segment_time'] = count_by(merged.with_columns(period.alias('time_period')),
+                                           'time_period').sort(['segment', 'time_period'])
+    for key, column in [('segment_payment', 'payment_method'), ('segment_device', 'device')]:
+        if column in columns:
+            queries[key] = count_by(merged, column).sort(['segment', column])
+    if 'coupon_used' in columns:
+        queries['coupon_usage'] = merged.group_by('segment').agg(pl.col('coupon_used').mean()).sort('segment')
+        queries['coupon_amount'] = merged.filter(pl.col('coupon_used').is_not_null()).group_by(
+            ['segment', 'coupon_used']).agg(pl.col('total_amount').mean()).sort(['segment', 'coupon_used'])
+    # 各细分最常用的取值：次数相同时按取值排序，与 _top_values 一致
+    tops = [(key, column, n) for key, column, n in [('devices', 'device', 1), ('payments', 'payment_method', 2),
+                                                    ('categories', 'product_category', 3)] if column in columns]
+    for key, column, n in tops:
+        queries[key] = count_by(merged, column).sort(['segment', 'count', column], descending=[False, True, False]).group_by(
+            'segment', maintain_order=True).agg(pl.col(column).head(n))
+    
+    frames = dict(zip(queries, pl.collect_all(list(queries.values()))))
+    result = BehaviorResult()
+    if 'segment_category' in frames:
+        result.segment_category = frames['segment_category'].to_pandas()
+    for key, columns in [('segment_time', ['客户细分', '时段', '订单数量']),
+                         ('segment_payment', ['客户细分', '支付方式', '订单数量']),
+                         ('segment_device', ['客户细分', '设备', '订单数量']),
+                         ('coupon_usage', ['客户细分', '优惠券使用率']),
+                         ('coupon_amount', ['客户细分', '是否使用优惠券', '平均订单金额'])]:
+        if key in frames:
+            frame = frames[key].to_pandas()
+            frame.columns = columns
+            setattr(result, key, frame)
+    
+    top_values = {key: dict(zip(frames[key]['segment'].to_list(), frames[key][column].to_list()))
+                  for key, column, _ in tops}
+    result.portraits = {segment: {key: top_values.get(key, {}).get(segment, [])
+                                  for key in ('devices', 'payments', 'categories')}
+                        for segment in frames['segments']['segment'].to_list()}
+    return result
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+from modules.compute.customers import add_recency_features
+
+# 可用于聚类的客户特征
+CLUSTERING_FEATURES = ['recency', 'purchase_count', 'total_spend', 'avg_order_value', 'age', 'income',
+                       'loyalty_days', 'total_items']
+DEFAULT_CLUSTERING_FEATURES = ['recency', 'purchase_count', 'total_spend', 'age']
+
+@dataclass
+class KMeansResult:
+    """
+    K-means聚类结果
+    
+    Attributes:
+        customers: 聚类输入数据加上 cluster 列
+        cluster_counts: 各聚类的客户数量（聚类、客户数量）
+        characteristics: 各聚类的特征均值
+        radar: 各聚类的特征均值按特征缩放到0-1
+        pca: 标准化特征的前两个主成分和所属聚类（PCA1、PCA2、cluster）
+        segment_clusters: 各聚类中原始客户细分的客户数量，缺少细分数据时为None
+        region_clusters: 各区域各聚类的客户数量，缺少区域数据时为None
+        gender_clusters: 各性别各聚类的客户数量，缺少性别数据时为None
+    """
+    customers: pd.DataFrame
+    cluster_counts: pd.DataFrame
+    characteristics: pd.DataFrame
+    radar: pd.DataFrame
+    pca: pd.DataFrame
+    segment_clusters: pd.DataFrame = None
+    region_clusters: pd.DataFrame = None
+    gender_clusters: pd.DataFrame = None
+
+def prepare_clustering_data(customer_360, today=None):
+    """
+    从 Customer-360 表准备聚类输入：购买行为列改为聚类使用的名称，年龄和收入的缺失值用中位数填充
+    
+    Args:
+        customer_360 (pd.DataFrame): Customer-360 表
+        today (pd.Timestamp): 计算最近购买天数和注册天数的基准日期，默认今天
+    
+    Returns:
+        pd.DataFrame: 每位客户一行，包含 CLUSTERING_FEATURES 中的特征和客户属性
+    """
+    clustering_data = add_recency_features(customer_360, today).rename(columns={
+        'order_count': 'purchase_count',
+        'total_amount': 'total_spend',
+        'latest_purchase': 'last_purchase',
+    })
+    return clustering_data.fillna({
+        'age': clustering_data['age'].median(),
+        'income': clustering_data['income'].median()
+    })
+
+def compute_kmeans(clustering_data, features, n_clusters, random_state=42):
+    """
+    对标准化后的客户特征执行K-means聚类
+    
+    Args:
+        clustering_data (pd.DataFrame): prepare_clustering_data 的结果
+        features (list): 参与聚类的特征列
+        n_clusters (int): 聚类数量
+        random_state (int): 随机种子，相同输入得到相同结果
+    
+    Returns:
+        KMeansResult: 聚类结果
+    """
+    # sklearn 导入较慢（连带导入 scipy），只在执行聚类时导入
+    from sklearn.cluster import KMeans
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+    
+    features = list(features)
+    customers = clustering_data.reset_index(drop=True).copy()
+    X_scaled = StandardScaler().fit_transform(customers[features])
+    
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+    customers['cluster'] = kmeans.fit_predict(X_scaled)
+    
+    cluster_counts = customers['cluster'].value_counts().reset_index()
+    cluster_counts.columns = ['聚类', '客户数量']
+    
+    characteristics = customers.groupby('cluster')[features].mean().reset_index()
+    
+    # 雷达图数据：每个特征缩放到0-1之间
+    radar = characteristics.copy()
+    for feature in features:
+        radar[feature] = (radar[feature] - radar[feature].min()) / (radar[feature].max() - radar[feature].min())
+    
+    pca = pd.DataFrame(PCA(n_components=2).fit_transform(X_scaled), columns=['PCA1', 'PCA2'])
+    pca['cluster'] = customers['cluster']
+    
+    return KMeansResult(
+        customers=customers,
+        cluster_counts=cluster_counts,
+        characteristics=characteristics,
+        radar=radar,
+        pca=pca,
+        segment_clusters=_cluster_breakdown(customers, 'segment', '聚类', '客户细分'),
+        region_clusters=_cluster_breakdown(customers, 'region', '集群', '区域'),
+        gender_clusters=_cluster_breakdown(customers, 'gender', '集群', '性别'),
+    )
+
+def _cluster_breakdown(customers, column, cluster_label, label):
+    if column not in customers.columns:
+        return None
+    breakdown = customers.groupby(['cluster', column]).size().reset_index()
+    breakdown.columns = [cluster_label, label, '客户数量']
+    return breakdown
@@ -0,0 +1,152 @@
+import pandas as pd
+
+from modules.compute.engine import resolve_engine, to_lazy
+
+# 从交易数据汇总的客户指标
+CUSTOMER_AGGREGATES = ['total_amount', 'order_count', 'total_items', 'first_purchase', 'latest_purchase']
+
+# 附加到客户汇总上的客户属性
+CUSTOMER_360_ATTRIBUTES = ['name', 'age', 'gender', 'region', 'country', 'city', 'income', 'registration_date',
+                           'segment', 'preferred_payment', 'preferred_device', 'newsletter_subscription',
+                           'loyalty_points']
+
+def aggregate_customers(transactions_df, engine=None):
+    """
+    按客户汇总交易：消费金额、订单数、购买件数、首次和最近购买日期
+    
+    订单数按订单ID去重，同一订单的所有明细行需要在同一批交易中。
+    
+    Args:
+        transactions_df (pd.DataFrame): 交易明细数据
+        engine (str): 计算引擎，见 modules.compute.engine.resolve_engine
+    
+    Returns:
+        pd.DataFrame: 以 customer_id 为索引，列见 CUSTOMER_AGGREGATES
+    """
+    if resolve_engine(engine) == 'polars':
+        return _aggregate_customers_polars(transactions_df)
+    
+    detail = pd.DataFrame({
+        'order_code': pd.factorize(transactions_df['transaction_id'])[0],
+        'customer_id': transactions_df['customer_id'].to_numpy(),
+        'total_amount': transactions_df['total_amount'].to_numpy(dtype=float),
+        'date': pd.to_datetime(transactions_df['date'], errors='coerce').to_numpy(),
+    })
+    if 'quantity' in transactions_df.columns:
+        detail['quantity'] = transactions_df['quantity'].to_numpy()
+    else:
+        detail['quantity'] = 0
+    
+    # 先合并为每个订单一行，再按客户汇总
+    per_order = detail.groupby('order_code', sort=False).agg(
+        customer_id=('customer_id', 'first'),
+        revenue=('total_amount', 'sum'),
+        items=('quantity', 'sum'),
+        date=('date', 'max'),
+    )
+    return per_order.groupby('customer_id', sort=False).agg(
+        total_amount=('revenue', 'sum'),
+        order_count=('revenue', 'size'),
+        total_items=('items', 'sum'),
+        first_purchase=('date', 'min'),
+        latest_purchase=('date', 'max'),
+    )
+
+def _aggregate_customers_polars(transactions_df):
+    """aggregate_customers 的 Polars 实现，结果与 pandas 实现相同"""
+    import polars as pl
+    
+    # Polars 直接按订单ID分组，不需要先编码为整数
+    detail = pd.DataFrame({
+        'transaction_id': transactions_df['transaction_id'],
+        'customer_id': transactions_df['customer_id'],
+        'total_amount': transactions_df['total_amount'].astype(float),
+        'date': pd.to_datetime(transactions_df['date'], errors='coerce'),
+        'quantity': transactions_df['quantity'] if 'quantity' in transactions_df.columns else 0,
+    })
+    per_order = to_lazy(detail).group_by('transaction_id', maintain_order=True).agg(
+        pl.col('customer_id').drop_nulls().first(),
+        pl.col('total_amount').sum().alias('revenue'),
+        pl.col('quantity').sum().alias('items'),
+        pl.col('date').max(),
+    )
+    # 与 DataFrame.groupby 一致，客户ID为空的订单不参与汇总
+    customers = per_order.filter(pl.col('customer_id').is_not_null()).group_by('customer_id', maintain_order=True).agg(
+        pl.col('revenue').sum().alias('total_amount'),
+        pl.len().cast(pl.Int64).alias('order_count'),
+        pl.col('items').sum().alias('total_items'),
+        pl.col('date').min().alias('first_purchase'),
+        pl.col('date').max().alias('latest_purchase'),
+    )
+    return customers.collect().to_pandas().set_index('customer_id')
+
+def build_customer_360(transactions_df, customers_df, engine=None):
+    """
+    构建 Customer-360 表：每位有交易的客户一行
+    
+    包含交易汇总（CUSTOMER_AGGREGATES）、客户属性（CUSTOMER_360_ATTRIBUTES 中存在的列）
+    和派生特征：平均订单金额、平均每单件数、首次到最近购买的天数。与当前日期有关的
+    特征（最近购买天数、注册天数）由 add_recency_features 在使用时计算。
+    
+    Args:
+        transactions_df (pd.DataFrame): 交易明细数据
+        customers_df (pd.DataFrame): 客户数据
+        engine (str): 计算引擎，见 modules.compute.engine.resolve_engine
+    
+    Returns:
+        pd.DataFrame: Customer-360 表
+    """
+    return _finalize(aggregate_customers(transactions_df, engine), customers_df)
+
+def merge_customer_aggregates(table, increments, customers_df):
+    """
+    将新交易的客户汇总合并到已有的 Customer-360 表，返回新表，原表不变
+    
+    Args:
+        table (pd.DataFrame): 已有的 Customer-360 表
+        increments (pd.DataFrame): aggregate_customers 对新交易的汇总结果
+        customers_df (pd.DataFrame): 客户数据，用于补充新客户的属性
+    
+    Returns:
+        pd.DataFrame: 合并后的 Customer-360 表
+    """
+    combined = pd.concat([table.set_index('customer_id')[CUSTOMER_AGGREGATES], increments])
+    aggregates = combined.groupby(level=0, sort=False).agg({
+        'total_amount': 'sum',
+        'order_count': 'sum',
+        'total_items': 'sum',
+        'first_purchase': 'min',
+        'latest_purchase': 'max',
+    })
+    aggregates.index.name = 'customer_id'
+    return _finalize(aggregates, customers_df)
+
+def _finalize(aggregates, customers_df):
+    """附加客户属性并计算派生特征"""
+    attributes = [col for col in CUSTOMER_360_ATTRIBUTES if col in customers_df.columns]
+    customer_info = customers_df[['customer_id'] + attributes].drop_duplicates('customer_id')
+    table = aggregates.reset_index().merge(customer_info, on='customer_id', how='left')
+    
+    table['avg_order_value'] = table['total_amount'] / table['order_count']
+    table['avg_items_per_order'] = table['total_items'] / table['order_count']
+    table['active_days'] = (table['latest_purchase'] - table['first_purchase']).dt.days
+    if 'registration_date' in table.columns:
+        table['registration_date'] = pd.to_datetime(table['registration_date'], errors='coerce')
+    return table
+
+def add_recency_features(table, today=None):
+    """
+    计算与当前日期有关的特征，返回新表
+    
+    Args:
+        table (pd.DataFrame): Customer-360 表
+        today (pd.Timestamp): 计算基准日期，默认今天
+    
+    Returns:
+        pd.DataFrame: 增加 recency（最近购买距今天数）和 loyalty_days（注册距今天数）列
+    """
+    today = pd.Timestamp(today) if today is not None else pd.to_datetime('today').normalize()
+    features = {'recency': (today - table['latest_purchase']).dt.days}
+    if 'registration_date' in table.columns:
+        features['loyalty_days'] = (today - table['registration_date']).dt.days
+    return table.assign(**features)
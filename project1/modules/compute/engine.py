@@ -0,0 +1,31 @@
+import importlib.util
+import os
+
+# 计算引擎：默认使用 pandas，设置环境变量 GLOBALMART_COMPUTE_ENGINE=polars 后，
+# 客户汇总、销售立方体和消费行为汇总中的分组聚合改用 Polars 的惰性多线程查询
+COMPUTE_ENGINE_ENV = "GLOBALMART_COMPUTE_ENGINE"
+ENGINES = ('pandas', 'polars')
+
+POLARS_AVAILABLE = importlib.util.find_spec('polars') is not None
+
+def resolve_engine(engine=None):
+    """
+    返回实际使用的计算引擎
+    
+    Args:
+        engine (str): 指定的引擎，None 时读取环境变量 GLOBALMART_COMPUTE_ENGINE，默认 pandas
+    
+    Returns:
+        str: 'pandas' 或 'polars'；指定 polars 但未安装时回退到 pandas
+    """
+    engine = engine or os.environ.get(COMPUTE_ENGINE_ENV) or 'pandas'
+    if engine not in ENGINES:
+        raise ValueError(f"不支持的计算引擎: {engine}，可选: {', '.join(ENGINES)}")
+    if engine == 'polars' and not POLARS_AVAILABLE:
+        return 'pandas'
+    return engine
+
+def to_lazy(df):
+    """把 pandas DataFrame 转换为 Polars LazyFrame，NaN 和 NaT 转换为 null"""
+    import polars as pl
+    return pl.from_pandas(df, nan_to_null=True).lazy()
@@ -0,0 +1,336 @@
+import importlib.util
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# 高级预测模型需要 statsmodels、pmdarima 和 prophet，不可用时只提供基础预测方法。
+# 这些库导入很慢，这里只检查是否安装，在用到的函数中再导入
+ADVANCED_MODELS_AVAILABLE = all(importlib.util.find_spec(name) is not None
+                                for name in ('statsmodels', 'pmdarima', 'prophet'))
+
+BASIC_FORECAST_METHODS = ["简单移动平均", "加权移动平均", "指数平滑"]
+FORECAST_METHODS = BASIC_FORECAST_METHODS + ["SARIMA", "Prophet"] if ADVANCED_MODELS_AVAILABLE else BASIC_FORECAST_METHODS
+
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+MONTH_NAMES = ['一月', '二月', '三月', '四月', '五月', '六月', '七月', '八月', '九月', '十月', '十一月', '十二月']
+
+# 加权移动平均的权重，从最早到最近的观测值
+WEIGHTED_MA_WEIGHTS = [0.2, 0.3, 0.5]
+
+@dataclass
+class SalesHistory:
+    """
+    历史销售的时间序列汇总
+    
+    Attributes:
+        daily: 每日销售额，包含 day_of_week、month、year、is_weekend 派生特征
+        monthly: 每月销售额（year、month、total_amount、date、month_name）
+        weekday: 按周几的日均和总销售额（day_of_week、mean、sum、day_name）
+        month_pattern: 按月份的日均销售额（month、total_amount、month_name）
+    """
+    daily: pd.DataFrame
+    monthly: pd.DataFrame
+    weekday: pd.DataFrame
+    month_pattern: pd.DataFrame
+
+@dataclass
+class CampaignEffect:
+    """
+    营销活动对日销售额的影响
+    
+    Attributes:
+        effect: 有无营销活动的日均销售额（has_campaign、total_amount、status）
+        lift: 有活动时日均销售额相对无活动时的提升（%）
+    """
+    effect: pd.DataFrame
+    lift: float
+
+@dataclass
+class ForecastResult:
+    """
+    销售预测结果
+    
+    Attributes:
+        table: 历史和预测月份的实际销售额与预测值（date、total_amount、forecast、month_name），
+               预测月份的 total_amount 为空
+        method: 实际使用的预测方法，所选方法失败时为回退的简单移动平均
+        last_history_date: 最后一个历史月份
+        mae: 历史部分的平均绝对误差
+        mape: 历史部分的平均绝对百分比误差（%）
+        rmse: 历史部分的均方根误差
+        predicted_total: 预测月份的总销售额
+        growth_rate: 预测总销售额相对最近相同月数历史销售额的变化（%）
+        notes: 预测过程中的提示，(级别, 内容) 列表，级别为 info、warning 或 error
+    """
+    table: pd.DataFrame
+    method: str
+    last_history_date: pd.Timestamp
+    mae: float = 0.0
+    mape: float = 0.0
+    rmse: float = 0.0
+    predicted_total: float = 0.0
+    growth_rate: float = 0.0
+    notes: list = field(default_factory=list)
+
+def prepare_sales_history(transactions_df):
+    """
+    将交易数据汇总为每日和每月销售额，并计算周几和月份的销售模式
+    
+    Args:
+        transactions_df (pd.DataFrame): 交易数据，不会被修改
+    
+    Returns:
+        SalesHistory: 历史销售的时间序列汇总
+    """
+    dates = pd.to_datetime(transactions_df['date'])
+    daily_sales = transactions_df['total_amount'].groupby(dates).sum().rename_axis('date').reset_index()
+    daily_sales = daily_sales.sort_values('date')
+    
+    daily_sales['day_of_week'] = daily_sales['date'].dt.dayofweek
+    daily_sales['month'] = daily_sales['date'].dt.month
+    daily_sales['year'] = daily_sales['date'].dt.year
+    daily_sales['is_weekend'] = (daily_sales['day_of_week'] >= 5).astype(int)
+    
+    monthly_sales = daily_sales.groupby([daily_sales['year'], daily_sales['month']])['total_amount'].sum().reset_index()
+    monthly_sales['date'] = pd.to_datetime(monthly_sales[['year', 'month']].assign(day=1))
+    monthly_sales['month_name'] = monthly_sales['date'].dt.strftime('%Y-%m')
+    
+    weekday_sales = daily_sales.groupby('day_of_week')['total_amount'].agg(['mean', 'sum']).reset_index()
+    weekday_sales['day_name'] = weekday_sales['day_of_week'].map(lambda x: WEEKDAY_NAMES[x])
+    
+    monthly_pattern = daily_sales.groupby('month')['total_amount'].mean().reset_index()
+    monthly_pattern['month_name'] = monthly_pattern['month'].map(lambda x: MONTH_NAMES[x - 1])
+    
+    return SalesHistory(daily_sales, monthly_sales, weekday_sales, monthly_pattern)
+
+def decompose_monthly_sales(monthly_sales):
+    """
+    对月度销售额做加法季节性分解
+    
+    Args:
+        monthly_sales (pd.DataFrame): SalesHistory.monthly
+    
+    Returns:
+        pd.DataFrame: 以日期为索引的 observed、trend、seasonal、resid 列；
+                      缺少 statsmodels 或不足12个月时返回None
+    """
+    if not ADVANCED_MODELS_AVAILABLE or len(monthly_sales) < 12:
+        return None
+    from statsmodels.tsa.seasonal import seasonal_decompose
+    
+    decomposition = seasonal_decompose(monthly_sales.set_index('date')['total_amount'], model='additive', period=12)
+    return pd.DataFrame({
+        'observed': decomposition.observed,
+        'trend': decomposition.trend,
+        'seasonal': decomposition.seasonal,
+        'resid': decomposition.resid,
+    })
+
+def compute_campaign_effect(daily_sales, marketing_df):
+    """
+    比较有营销活动和无营销活动的日子的平均销售额
+    
+    Args:
+        daily_sales (pd.DataFrame): SalesHistory.daily
+        marketing_df (pd.DataFrame): 营销活动数据，包含 start_date、end_date
+    
+    Returns:
+        CampaignEffect: 营销活动对日销售额的影响
+    """
+    dates = daily_sales['date'].to_numpy()
+    has_campaign = np.zeros(len(dates), dtype=int)
+    starts = pd.to_datetime(marketing_df['start_date']).to_numpy()
+    ends = pd.to_datetime(marketing_df['end_date']).to_numpy()
+    for start, end in zip(starts, ends):
+        has_campaign[(dates >= start) & (dates <= end)] = 1
+    
+    sales_with_campaigns = daily_sales.assign(has_campaign=has_campaign)
+    effect = sales_with_campaigns.groupby('has_campaign')['total_amount'].mean().reset_index()
+    effect['status'] = effect['has_campaign'].map(lambda x: '有营销活动' if x == 1 else '无营销活动')
+    
+    means = effect.set_index('has_campaign')['total_amount']
+    no_campaign, with_campaign = means.get(0, 0), means.get(1, 0)
+    lift = (with_campaign - no_campaign) / no_campaign * 100 if no_campaign > 0 else 0
+    return CampaignEffect(effect, lift)
+
+def forecast_monthly_sales(monthly_sales, method, periods, window_size=3, alpha=0.3):
+    """
+    预测未来若干个月的销售额，并计算历史部分的预测误差
+    
+    SARIMA 和 Prophet 失败或不可用时回退到窗口为3的简单移动平均，回退原因记录在 notes 中。
+    
+    Args:
+        monthly_sales (pd.DataFrame): SalesHistory.monthly
+        method (str): FORECAST_METHODS 中的预测方法
+        periods (int): 预测的月数
+        window_size (int): 简单移动平均的窗口大小
+        alpha (float): 指数平滑的平滑因子
+    
+    Returns:
+        ForecastResult: 预测结果
+    """
+    forecast_data = monthly_sales[['date', 'total_amount']].copy()
+    future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=periods, freq='MS')
+    notes = []
+    
+    if method == "简单移动平均":
+        forecast_result = _moving_average(forecast_data, future_dates, window_size)
+    elif method == "加权移动平均":
+        forecast_result = _weighted_moving_average(forecast_data, future_dates)
+    elif method == "指数平滑":
+        forecast_result = _exponential_smoothing(forecast_data, future_dates, alpha)
+    elif method in ("SARIMA", "Prophet") and ADVANCED_MODELS_AVAILABLE:
+        try:
+            if method == "SARIMA":
+                forecast_result = _sarima(forecast_data, future_dates, notes)
+            else:
+                forecast_result = _prophet(forecast_data, periods)
+        except Exception as e:
+            notes.append(('error', f"{method}预测出错: {str(e)}"))
+            notes.append(('warning', "回退到简单移动平均方法"))
+            method = "简单移动平均"
+            forecast_result = _moving_average(forecast_data, future_dates, 3)
+    else:
+        notes.append(('warning', "所选方法不可用，回退到简单移动平均"))
+        method = "简单移动平均"
+        forecast_result = _moving_average(forecast_data, future_dates, 3)
+    
+    forecast_result['month_name'] = forecast_result['date'].dt.strftime('%Y-%m')
+    for col in ['total_amount', 'forecast']:
+        forecast_result[col] = pd.to_numeric(forecast_result[col], errors='coerce')
+    
+    result = ForecastResult(table=forecast_result, method=method,
+                            last_history_date=forecast_data['date'].iloc[-1], notes=notes)
+    
+    # 预测表现指标（仅对历史部分）
+    historical_data = forecast_result[~forecast_result['total_amount'].isna()]
+    if len(historical_data) > 0:
+        actual = historical_data['total_amount'].values
+        predicted = historical_data['forecast'].dropna().values
+        if len(actual) == len(predicted):
+            result.mae = np.mean(np.abs(actual - predicted))
+            # 避免除零错误
+            result.mape = np.mean(np.abs((actual - predicted) / np.maximum(actual, 0.0001))) * 100
+            result.rmse = np.sqrt(np.mean((actual - predicted) ** 2))
+    
+    result.predicted_total = forecast_result[forecast_result['total_amount'].isna()]['forecast'].sum()
+    last_periods_total = forecast_data['total_amount'].iloc[-periods:].sum()
+    result.growth_rate = (result.predicted_total - last_periods_total) / last_periods_total * 100 if last_periods_total > 0 else 0
+    return result
+
+def _with_future(forecast_data, future_dates, predictions):
+    future_df = pd.DataFrame({
+        'date': future_dates,
+        'total_amount': [None] * len(future_dates),
+        'forecast': predictions
+    })
+    return pd.concat([forecast_data, future_df])
+
+def _moving_average(forecast_data, future_dates, window_size):
+    forecast_data = forecast_data.copy()
+    forecast_data['forecast'] = forecast_data['total_amount'].rolling(window=window_size).mean()
+    
+    # 逐月预测，每个预测值进入下一个月的窗口
+    last_window = forecast_data['total_amount'].iloc[-window_size:].values.astype(float)
+    predictions = []
+    for _ in range(len(future_dates)):
+        next_value = last_window.mean()
+        predictions.append(next_value)
+        last_window = np.roll(last_window, -1)
+        last_window[-1] = next_value
+    return _with_future(forecast_data, future_dates, predictions)
+
+def _weighted_moving_average(forecast_data, future_dates):
+    forecast_data = forecast_data.copy()
+    weights = np.array(WEIGHTED_MA_WEIGHTS)
+    values = forecast_data['total_amount'].to_numpy(dtype=float)
+    
+    # 第 i 个月的拟合值为之前 len(weights) 个月的加权和，与原页面的计算一致：
+    # 权重从最近的观测值开始依次作用（iloc[i-j-1] * weights[j]），即最近的月份权重为 0.2；
+    # 未来预测中最近的观测值权重最高
+    fitted = np.full(len(values), np.nan)
+    for i in range(len(weights), len(values)):
+        fitted[i] = values[i - len(weights):i][::-1] @ weights
+    forecast_data['forecast'] = fitted
+    
+    last_values = values[-len(weights):].copy()
+    predictions = []
+    for _ in range(len(future_dates)):
+        next_value = last_values @ weights
+        predictions.append(next_value)
+        last_values = np.roll(last_values, -1)
+        last_values[-1] = next_value
+    return _with_future(forecast_data, future_dates, predictions)
+
+def _exponential_smoothing(forecast_data, future_dates, alpha):
+    forecast_data = forecast_data.copy()
+    values = forecast_data['total_amount'].to_numpy(dtype=float)
+    smoothed = np.empty(len(values))
+    smoothed[0] = values[0]
+    for i in range(1, len(values)):
+        smoothed[i] = alpha * values[i - 1] + (1 - alpha) * smoothed[i - 1]
+    forecast_data['forecast'] = smoothed
+    
+    # 对于简单指数平滑，所有未来预测值都等于最后的平滑值
+    return _with_future(forecast_data, future_dates, [smoothed[-1]] * len(future_dates))
+
+def _sarima(forecast_data, future_dates, notes):
+    import pmdarima as pm
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    
+    ts_data = forecast_data.set_index('date')['total_amount']
+    
+    # 自动选择最佳SARIMA参数
+    auto_model = pm.auto_arima(
+        ts_data,
+        seasonal=True,
+        m=12,  # 月度数据的季节性周期
+        d=None,  # 自动确定差分阶数
+        D=None,  # 自动确定季节性差分阶数
+        start_p=0, max_p=3,
+        start_q=0, max_q=3,
+        start_P=0, max_P=2,
+        start_Q=0, max_Q=2,
+        information_criterion='aic',
+        trace=False,
+        error_action='ignore',
+        suppress_warnings=True,
+        stepwise=True
+    )
+    notes.append(('info', f"最佳SARIMA模型: SARIMA{auto_model.order}{auto_model.seasonal_order}"))
+    
+    model_fit = SARIMAX(
+        ts_data,
+        order=auto_model.order,
+        seasonal_order=auto_model.seasonal_order,
+        enforce_stationarity=False,
+        enforce_invertibility=False
+    ).fit(disp=False)
+    
+    forecast_data = forecast_data.copy()
+    forecast_data['forecast'] = model_fit.fittedvalues.values
+    return _with_future(forecast_data, future_dates, model_fit.forecast(steps=len(future_dates)).values)
+
+def _prophet(forecast_data, periods):
+    from prophet import Prophet
+    
+    prophet_data = forecast_data[['date', 'total_amount']].rename(columns={'date': 'ds', 'total_amount': 'y'})
+    
+    model = Prophet(
+        yearly_seasonality=True,
+        weekly_seasonality=False,
+        daily_seasonality=False,
+        seasonality_mode='additive',
+        interval_width=0.95
+    )
+    # 添加月度季节性
+    model.add_seasonality(name='monthly', period=30.5, fourier_order=5)
+    model.fit(prophet_data)
+    
+    forecast = model.predict(model.make_future_dataframe(periods=periods, freq='MS'))
+    return pd.DataFrame({
+        'date': forecast['ds'],
+        'total_amount': prophet_data['y'].reindex(prophet_data.index.union(forecast.index[-periods:])),
+        'forecast': forecast['yhat']
+    })
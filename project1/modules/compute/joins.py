@@ -0,0 +1,165 @@
+import math
+import os
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# 连接结果的内存预算（MB），估计的连接结果超过预算时改为分区连接，分区写入磁盘后逐个处理
+JOIN_MEMORY_ENV = "GLOBALMART_JOIN_MEMORY_MB"
+DEFAULT_JOIN_MEMORY_BYTES = 512 * 1024 * 1024
+
+# 分区数上限
+MAX_PARTITIONS = 256
+
+# 可以先按分区汇总再合并的聚合函数
+PARTIAL_AGGREGATIONS = ('sum', 'size', 'count', 'min', 'max', 'mean')
+
+@dataclass
+class JoinPlan:
+    """
+    连接的执行计划
+    
+    Attributes:
+        estimated_bytes: 估计的连接结果大小（字节）
+        memory_budget: 内存预算（字节）
+        partitions: 分区数，1 表示在内存中直接连接
+    """
+    estimated_bytes: int
+    memory_budget: int
+    partitions: int = 1
+    
+    @property
+    def spills(self):
+        return self.partitions > 1
+
+def get_memory_budget():
+    """返回连接结果的内存预算（字节），由环境变量 GLOBALMART_JOIN_MEMORY_MB 配置"""
+    value = os.environ.get(JOIN_MEMORY_ENV)
+    return int(float(value) * 1024 * 1024) if value else DEFAULT_JOIN_MEMORY_BYTES
+
+def estimate_join_bytes(left, right, on):
+    """
+    估计左连接结果的大小
+    
+    结果行数为左表行数乘以右表每个键的平均行数，每行大小为左表每行和右表每行（不含连接键）
+    的平均内存占用之和。
+    
+    Args:
+        left (pd.DataFrame): 左表
+        right (pd.DataFrame): 右表
+        on (str): 连接键
+    
+    Returns:
+        int: 估计的字节数
+    """
+    if len(left) == 0:
+        return 0
+    left_row = left.memory_usage(index=False, deep=True).sum() / len(left)
+    right_row = right.drop(columns=on).memory_usage(index=False, deep=True).sum() / len(right) if len(right) else 0
+    keys = right[on].nunique()
+    fanout = max(1.0, len(right) / keys) if keys else 1.0
+    return int(len(left) * fanout * (left_row + right_row))
+
+def plan_join(left, right, on, memory_budget=None):
+    """
+    按估计的连接结果大小选择执行方式
+    
+    Args:
+        left (pd.DataFrame): 左表
+        right (pd.DataFrame): 右表
+        on (str): 连接键
+        memory_budget (int): 内存预算（字节），默认见 get_memory_budget
+    
+    Returns:
+        JoinPlan: 执行计划，超过预算时每个分区的连接结果约在预算之内
+    """
+    memory_budget = get_memory_budget() if memory_budget is None else memory_budget
+    estimated = estimate_join_bytes(left, right, on)
+    partitions = min(MAX_PARTITIONS, max(1, math.ceil(estimated / max(memory_budget, 1))))
+    return JoinPlan(estimated_bytes=estimated, memory_budget=memory_budget, partitions=partitions)
+
+def join_aggregate(left, right, on, groupings, prepare=None, plan=None, spill_dir=None):
+    """
+    左连接两张表，并按一组或多组分组列汇总连接结果
+    
+    连接结果估计不超过内存预算时直接在内存中连接；超过预算时按连接键的哈希把两张表
+    分区并写入磁盘，逐个分区读回、连接和汇总，内存中只保留一个分区的连接结果，最后
+    合并各分区的部分汇总。调用方只传入汇总需要的列。
+    
+    Args:
+        left (pd.DataFrame): 左表
+        right (pd.DataFrame): 右表，包含连接键
+        on (str): 连接键
+        groupings (dict): 名称 -> (分组列列表, {结果列: (列, 聚合函数)})，聚合函数见 PARTIAL_AGGREGATIONS
+        prepare (callable): 汇总前对连接结果（或每个分区的连接结果）调用，返回增加派生列后的表
+        plan (JoinPlan): 执行计划，默认由 plan_join 生成
+        spill_dir (str): 分区文件所在目录，默认为系统临时目录
+    
+    Returns:
+        dict: 名称 -> 汇总表，与 连接结果.groupby(分组列).agg(**聚合).reset_index() 相同
+    """
+    plan = plan or plan_join(left, right, on)
+    if not plan.spills:
+        merged = left.merge(right, on=on, how='left')
+        if prepare is not None:
+            merged = prepare(merged)
+        return {name: merged.groupby(keys).agg(**spec).reset_index() for name, (keys, spec) in groupings.items()}
+    
+    partial_specs = {name: _partial_spec(spec) for name, (_, spec) in groupings.items()}
+    partials = {name: [] for name in groupings}
+    with tempfile.TemporaryDirectory(prefix='globalmart-join-', dir=spill_dir) as directory:
+        left_paths = _spill_partitions(left, on, plan.partitions, directory, 'left')
+        right_paths = _spill_partitions(right, on, plan.partitions, directory, 'right')
+        for left_path, right_path in zip(left_paths, right_paths):
+            merged = pd.read_pickle(left_path).merge(pd.read_pickle(right_path), on=on, how='left')
+            if prepare is not None:
+                merged = prepare(merged)
+            for name, (keys, _) in groupings.items():
+                partials[name].append(merged.groupby(keys).agg(**partial_specs[name]).reset_index())
+            del merged
+    return {name: _combine_partials(pd.concat(partials[name], ignore_index=True), keys, spec)
+            for name, (keys, spec) in groupings.items()}
+
+def _spill_partitions(frame, on, partitions, directory, prefix):
+    """按连接键的哈希把表分区，每个分区写入一个文件，分区内保持原来的行顺序"""
+    # 只对不同的键计算哈希，空值（编码为-1）放在第0个分区
+    keys, uniques = pd.factorize(frame[on])
+    codes = np.append(pd.util.hash_array(np.asarray(uniques, dtype=object)) % partitions, 0)[keys]
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(partitions + 1))
+    paths = []
+    for i in range(partitions):
+        path = os.path.join(directory, f"{prefix}-{i}.pkl")
+        frame.iloc[order[bounds[i]:bounds[i + 1]]].to_pickle(path)
+        paths.append(path)
+    return paths
+
+def _partial_spec(spec):
+    """每个分区的部分汇总：平均值拆成总和与计数"""
+    partial = {}
+    for output, (column, func) in spec.items():
+        if func not in PARTIAL_AGGREGATIONS:
+            raise ValueError(f"分区汇总不支持聚合函数: {func}，可选: {', '.join(PARTIAL_AGGREGATIONS)}")
+        if func == 'mean':
+            partial[f"{output}__sum"] = (column, 'sum')
+            partial[f"{output}__count"] = (column, 'count')
+        else:
+            partial[output] = (column, func)
+    return partial
+
+def _combine_partials(partials, keys, spec):
+    """合并各分区的部分汇总"""
+    combine = {}
+    for output, (_, func) in spec.items():
+        if func == 'mean':
+            combine[f"{output}__sum"] = (f"{output}__sum", 'sum')
+            combine[f"{output}__count"] = (f"{output}__count", 'sum')
+        else:
+            combine[output] = (output, func if func in ('min', 'max') else 'sum')
+    combined = partials.groupby(keys).agg(**combine)
+    for output, (_, func) in spec.items():
+        if func == 'mean':
+            combined[output] = combined.pop(f"{output}__sum") / combined.pop(f"{output}__count")
+    return combined[list(spec)].reset_index()
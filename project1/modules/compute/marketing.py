@@ -0,0 +1,297 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from modules.compute.roi import normalize_roi
+
+# 活动效果评估中活动前后各取的天数
+CAMPAIGN_WINDOW_DAYS = 7
+
+# 渠道效率分数中点击率、转化率和获客成本的权重
+EFFICIENCY_WEIGHTS = {'ctr_score': 0.2, 'conv_score': 0.5, 'cpa_score': 0.3}
+
+@dataclass
+class MarketingSummary:
+    """
+    营销基础指标的汇总结果
+    
+    Attributes:
+        objective_summary: 各营销目标的活动数量、总预算、总支出、总转化和转化成本(CPA)
+        region_summary: 各目标区域的活动数量、总预算、总支出、总转化和转化成本(CPA)
+        category_summary: 各目标类别的活动数量、总预算、总支出、总转化和转化成本(CPA)
+        monthly_summary: 按开始月份统计的活动数量和总支出
+    """
+    objective_summary: pd.DataFrame
+    region_summary: pd.DataFrame
+    category_summary: pd.DataFrame
+    monthly_summary: pd.DataFrame
+
+@dataclass
+class CampaignLift:
+    """
+    单个营销活动前后的销售和流量对比
+    
+    Attributes:
+        daily_metrics: 活动前后每日的销售额和访问量，is_campaign_period 标记活动期间
+        avg_sales_during: 活动期间平均日销售额
+        avg_sales_outside: 非活动期间平均日销售额
+        avg_traffic_during: 活动期间平均日访问量
+        avg_traffic_outside: 非活动期间平均日访问量
+        sales_growth: 活动期间平均日销售额相对非活动期间的变化（%）
+        traffic_growth: 活动期间平均日访问量相对非活动期间的变化（%）
+        campaign_days: 活动天数
+        baseline_sales: 按非活动期间水平估算的活动期间销售额
+        actual_sales: 活动期间的实际销售额
+        incremental_sales: 实际销售额与基线销售额之差
+        campaign_roi: 每单位支出带来的增量销售额
+    """
+    daily_metrics: pd.DataFrame
+    avg_sales_during: float
+    avg_sales_outside: float
+    avg_traffic_during: float
+    avg_traffic_outside: float
+    sales_growth: float
+    traffic_growth: float
+    campaign_days: int
+    baseline_sales: float
+    actual_sales: float
+    incremental_sales: float
+    campaign_roi: float
+
+@dataclass
+class ChannelPerformance:
+    """
+    营销渠道效果分析结果
+    
+    Attributes:
+        campaigns: 营销活动数据加上 month、ctr、conversion_rate、cpa 列
+        channel_summary: 各渠道的汇总指标，包括点击率、转化率和每次获客成本(CPA)
+        channel_roi: 各渠道的平均ROI（%），数据中没有ROI字段时为None
+        monthly_spend: 各月各渠道的支出（month、channel、spend）
+        monthly_conversions: 各月各渠道的转化次数（month、channel、conversions）
+        channel_efficiency: 按效率得分排列的渠道及当前预算占比、建议预算占比和预算调整建议
+    """
+    campaigns: pd.DataFrame
+    channel_summary: pd.DataFrame
+    channel_roi: pd.DataFrame
+    monthly_spend: pd.DataFrame
+    monthly_conversions: pd.DataFrame
+    channel_efficiency: pd.DataFrame
+
+@dataclass
+class MarketingOverview:
+    """
+    营销效果仪表板的汇总结果，数据中缺少所需字段的部分为None
+    
+    Attributes:
+        channel_counts: 各渠道的活动数量（channel、count）
+        channel_metrics: 各渠道的支出和转化（channel、spend、conversions）
+        channel_roi: 各渠道的支出、收入和ROI（channel、spend、revenue、roi）
+        time_trend: 每日的支出和转化（date、spend、conversions）
+    """
+    channel_counts: pd.DataFrame = None
+    channel_metrics: pd.DataFrame = None
+    channel_roi: pd.DataFrame = None
+    time_trend: pd.DataFrame = None
+
+def compute_marketing_summary(marketing_df):
+    """
+    按营销目标、目标区域、目标类别和开始月份汇总营销活动
+    
+    Args:
+        marketing_df (pd.DataFrame): 营销活动数据，start_date 为日期类型，不会被修改
+    
+    Returns:
+        MarketingSummary: 汇总结果
+    """
+    monthly_summary = marketing_df.groupby(marketing_df['start_date'].dt.strftime('%Y-%m')).agg(
+        活动数量=('spend', 'size'),
+        总支出=('spend', 'sum')
+    ).rename_axis('月份').reset_index()
+    
+    return MarketingSummary(
+        objective_summary=_summary_by(marketing_df, 'objective', '营销目标'),
+        region_summary=_summary_by(marketing_df, 'target_region', '目标区域'),
+        category_summary=_summary_by(marketing_df, 'target_category', '目标类别'),
+        monthly_summary=monthly_summary,
+    )
+
+def _summary_by(marketing_df, column, label):
+    summary = marketing_df.groupby(column).agg({
+        'campaign_id': 'count',
+        'budget': 'sum',
+        'spend': 'sum',
+        'conversions': 'sum'
+    }).reset_index()
+    summary.columns = [label, '活动数量', '总预算', '总支出', '总转化']
+    summary['转化成本(CPA)'] = summary['总支出'] / summary['总转化']
+    return summary
+
+def compute_campaign_lift(campaign, daily_sales, daily_traffic):
+    """
+    比较营销活动期间与活动前后的每日销售额和访问量，估算活动带来的增量销售额
+    
+    Args:
+        campaign (pd.Series): 营销活动，包含 start_date、end_date 和 spend
+        daily_sales (pd.DataFrame): 活动前后每日的销售额（date、total_amount）
+        daily_traffic (pd.DataFrame): 每日访问量（date、total_visits），可以超出活动前后的范围
+    
+    Returns:
+        CampaignLift: 活动前后的对比结果
+    """
+    window_start = campaign['start_date'] - pd.Timedelta(days=CAMPAIGN_WINDOW_DAYS)
+    window_end = campaign['end_date'] + pd.Timedelta(days=CAMPAIGN_WINDOW_DAYS)
+    daily_traffic = daily_traffic[(daily_traffic['date'] >= window_start) & (daily_traffic['date'] <= window_end)]
+    
+    daily_metrics = pd.merge(daily_sales, daily_traffic, on='date', how='outer').fillna(0)
+    daily_metrics['is_campaign_period'] = (daily_metrics['date'] >= campaign['start_date']) & (daily_metrics['date'] <= campaign['end_date'])
+    
+    campaign_period = daily_metrics[daily_metrics['is_campaign_period']]
+    non_campaign_period = daily_metrics[~daily_metrics['is_campaign_period']]
+    
+    avg_sales_during = campaign_period['total_amount'].mean()
+    avg_sales_outside = non_campaign_period['total_amount'].mean()
+    avg_traffic_during = campaign_period['total_visits'].mean()
+    avg_traffic_outside = non_campaign_period['total_visits'].mean()
+    
+    # 按非活动期间的日均销售额估算活动期间的基线销售额
+    campaign_days = (campaign['end_date'] - campaign['start_date']).days + 1
+    baseline_sales = avg_sales_outside * campaign_days
+    actual_sales = campaign_period['total_amount'].sum()
+    incremental_sales = actual_sales - baseline_sales
+    
+    return CampaignLift(
+        daily_metrics=daily_metrics,
+        avg_sales_during=avg_sales_during,
+        avg_sales_outside=avg_sales_outside,
+        avg_traffic_during=avg_traffic_during,
+        avg_traffic_outside=avg_traffic_outside,
+        sales_growth=((avg_sales_during / avg_sales_outside) - 1) * 100 if avg_sales_outside > 0 else 0,
+        traffic_growth=((avg_traffic_during / avg_traffic_outside) - 1) * 100 if avg_traffic_outside > 0 else 0,
+        campaign_days=campaign_days,
+        baseline_sales=baseline_sales,
+        actual_sales=actual_sales,
+        incremental_sales=incremental_sales,
+        campaign_roi=incremental_sales / campaign['spend'] if campaign['spend'] > 0 else 0,
+    )
+
+def compute_channel_performance(marketing_df):
+    """
+    计算各营销渠道的汇总指标、平均ROI、月度趋势和效率得分
+    
+    Args:
+        marketing_df (pd.DataFrame): 营销活动数据，start_date 为日期类型，不会被修改
+    
+    Returns:
+        ChannelPerformance: 渠道效果分析结果
+    """
+    campaigns = marketing_df.copy()
+    campaigns['month'] = campaigns['start_date'].dt.strftime('%Y-%m')
+    campaigns['ctr'] = (campaigns['clicks'] / campaigns['impressions'] * 100).fillna(0)
+    campaigns['conversion_rate'] = (campaigns['conversions'] / campaigns['clicks'] * 100).fillna(0)
+    campaigns['cpa'] = (campaigns['spend'] / campaigns['conversions']).fillna(0)
+    
+    channel_summary = campaigns.groupby('channel').agg({
+        'campaign_id': 'count',
+        'budget': 'sum',
+        'spend': 'sum',
+        'impressions': 'sum',
+        'clicks': 'sum',
+        'conversions': 'sum'
+    }).reset_index()
+    channel_summary.columns = ['渠道', '活动数量', '总预算', '总支出', '总展示次数', '总点击次数', '总转化次数']
+    
+    # 计算渠道效果指标，无限值和NaN记为0
+    channel_summary['点击率(CTR)'] = (channel_summary['总点击次数'] / channel_summary['总展示次数'] * 100).round(2)
+    channel_summary['转化率'] = (channel_summary['总转化次数'] / channel_summary['总点击次数'] * 100).round(2)
+    channel_summary['每次获客成本(CPA)'] = (channel_summary['总支出'] / channel_summary['总转化次数']).round(2)
+    for column in ['点击率(CTR)', '转化率', '每次获客成本(CPA)']:
+        channel_summary[column] = channel_summary[column].replace([np.inf, -np.inf, np.nan], 0)
+    
+    # 各渠道的平均ROI，以百分比表示
+    channel_roi = None
+    if 'roi' in campaigns.columns:
+        channel_roi = normalize_roi(campaigns).groupby(campaigns['channel']).mean().reset_index()
+        channel_roi.columns = ['渠道', '平均ROI']
+        channel_roi['平均ROI'] = (channel_roi['平均ROI'] * 100).round(2)
+    
+    return ChannelPerformance(
+        campaigns=campaigns,
+        channel_summary=channel_summary,
+        channel_roi=channel_roi,
+        monthly_spend=campaigns.groupby(['month', 'channel'])['spend'].sum().reset_index(),
+        monthly_conversions=campaigns.groupby(['month', 'channel'])['conversions'].sum().reset_index(),
+        channel_efficiency=_channel_efficiency(channel_summary),
+    )
+
+def _channel_efficiency(channel_summary):
+    """按点击率、转化率和获客成本计算渠道效率得分，并按得分给出建议预算占比"""
+    channel_efficiency = channel_summary.copy()
+    
+    # 将CTR和转化率归一化（越高越好），将CPA归一化（越低越好）
+    max_ctr = channel_efficiency['点击率(CTR)'].max()
+    max_conv = channel_efficiency['转化率'].max()
+    max_cpa = channel_efficiency['每次获客成本(CPA)'].max()
+    channel_efficiency['ctr_score'] = channel_efficiency['点击率(CTR)'] / max_ctr if max_ctr > 0 else 0
+    channel_efficiency['conv_score'] = channel_efficiency['转化率'] / max_conv if max_conv > 0 else 0
+    channel_efficiency['cpa_score'] = 1 - (channel_efficiency['每次获客成本(CPA)'] / max_cpa) if max_cpa > 0 else 0
+    
+    channel_efficiency['efficiency_score'] = sum(
+        channel_efficiency[score] * weight for score, weight in EFFICIENCY_WEIGHTS.items()
+    ).round(2)
+    channel_efficiency = channel_efficiency.sort_values('efficiency_score', ascending=False)
+    
+    total_score = channel_efficiency['efficiency_score'].sum()
+    if total_score > 0:
+        channel_efficiency['建议预算占比'] = (channel_efficiency['efficiency_score'] / total_score * 100).round(1)
+    else:
+        channel_efficiency['建议预算占比'] = 100 / len(channel_efficiency)
+    
+    total_budget = channel_efficiency['总预算'].sum()
+    if total_budget > 0:
+        channel_efficiency['当前预算占比'] = (channel_efficiency['总预算'] / total_budget * 100).round(1)
+    else:
+        channel_efficiency['当前预算占比'] = 100 / len(channel_efficiency)
+    
+    channel_efficiency['预算调整建议'] = (channel_efficiency['建议预算占比'] - channel_efficiency['当前预算占比']).round(1)
+    return channel_efficiency
+
+def compute_marketing_overview(marketing_df):
+    """
+    汇总营销效果仪表板所需的渠道分布、支出和转化、ROI和时间趋势
+    
+    Args:
+        marketing_df (pd.DataFrame): 营销活动数据，不会被修改
+    
+    Returns:
+        MarketingOverview: 仪表板的汇总结果
+    """
+    columns = set(marketing_df.columns)
+    overview = MarketingOverview()
+    
+    if 'channel' in columns:
+        overview.channel_counts = marketing_df['channel'].value_counts().reset_index()
+        overview.channel_counts.columns = ['channel', 'count']
+    
+    if {'spend', 'conversions', 'channel'} <= columns:
+        overview.channel_metrics = marketing_df.groupby('channel').agg({
+            'spend': 'sum',
+            'conversions': 'sum'
+        }).reset_index()
+    
+    if {'spend', 'revenue', 'channel'} <= columns:
+        channel_roi = marketing_df.groupby('channel').agg({
+            'spend': 'sum',
+            'revenue': 'sum'
+        }).reset_index()
+        channel_roi['roi'] = (channel_roi['revenue'] - channel_roi['spend']) / channel_roi['spend']
+        overview.channel_roi = channel_roi
+    
+    if {'date', 'spend', 'conversions'} <= columns:
+        overview.time_trend = marketing_df.groupby('date').agg({
+            'spend': 'sum',
+            'conversions': 'sum'
+        }).reset_index()
+    
+    return overview
@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+from modules.compute.customers import add_recency_features
+
+# RFM总分从低到高划分的客户分群
+RFM_TIERS = ['低价值客户', '一般价值客户', '高价值客户', '顶级价值客户']
+
+@dataclass
+class RFMResult:
+    """
+    RFM分析结果
+    
+    Attributes:
+        customers: 每位客户一行，Customer-360 的列加上 recency、frequency、r/f/m 得分、
+                   rfm_score 和 customer_segment
+        segment_counts: 各分群的客户数量（客户分群、客户数量）
+        characteristics: 各分群的平均最近消费天数、购买次数、消费金额和RFM总分
+        scores: 各分群的平均 r/f/m 得分
+        region_segments: 各区域各分群的客户数量，缺少区域数据时为None
+        gender_segments: 各性别各分群的客户数量，缺少性别数据时为None
+    """
+    customers: pd.DataFrame
+    segment_counts: pd.DataFrame
+    characteristics: pd.DataFrame
+    scores: pd.DataFrame
+    region_segments: pd.DataFrame = None
+    gender_segments: pd.DataFrame = None
+
+def compute_rfm(customer_360, today=None):
+    """
+    计算RFM得分并按总分划分客户分群
+    
+    最近消费(R)按五分位打分，越近得分越高；购买次数(F)和消费金额(M)按排名五分位打分。
+    三项得分之和按四分位划分为 RFM_TIERS。
+    
+    Args:
+        customer_360 (pd.DataFrame): Customer-360 表
+        today (pd.Timestamp): 计算最近消费天数的基准日期，默认今天
+    
+    Returns:
+        RFMResult: RFM分析结果
+    """
+    rfm = add_recency_features(customer_360, today).rename(columns={'order_count': 'frequency'})
+    
+    rfm['r_score'] = pd.qcut(rfm['recency'], 5, labels=[5, 4, 3, 2, 1]).astype(int)
+    rfm['f_score'] = pd.qcut(rfm['frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    rfm['m_score'] = pd.qcut(rfm['total_amount'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    rfm['rfm_score'] = rfm['r_score'] + rfm['f_score'] + rfm['m_score']
+    rfm['customer_segment'] = pd.qcut(rfm['rfm_score'], 4, labels=RFM_TIERS)
+    
+    segment_counts = rfm['customer_segment'].value_counts().reset_index()
+    segment_counts.columns = ['客户分群', '客户数量']
+    
+    characteristics = rfm.groupby('customer_segment', observed=True).agg({
+        'recency': 'mean',
+        'frequency': 'mean',
+        'total_amount': 'mean',
+        'rfm_score': 'mean'
+    }).reset_index()
+    
+    scores = rfm.groupby('customer_segment', observed=True)[['r_score', 'f_score', 'm_score']].mean().reset_index()
+    
+    return RFMResult(
+        customers=rfm,
+        segment_counts=segment_counts,
+        characteristics=characteristics,
+        scores=scores,
+        region_segments=_segment_breakdown(rfm, 'region', '区域'),
+        gender_segments=_segment_breakdown(rfm, 'gender', '性别'),
+    )
+
+def _segment_breakdown(rfm, column, label):
+    if column not in rfm.columns:
+        return None
+    breakdown = rfm.groupby(['customer_segment', column], observed=True).size().reset_index()
+    breakdown.columns = ['客户分群', label, '客户数量']
+    return breakdown
@@ -0,0 +1,212 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# 活动持续时间的分组
+DURATION_BINS = [0, 7, 14, 30, 60, 90, float('inf')]
+DURATION_LABELS = ['1周内', '1-2周', '2-4周', '1-2个月', '2-3个月', '3个月以上']
+
+# 按平均ROI从高到低排列的渠道的建议预算占比（%）
+ALLOCATION_PERCENTAGES = {1: [100], 2: [70, 30], 3: [50, 30, 20]}
+LARGE_ALLOCATION_PERCENTAGES = [50, 30, 15, 5]
+
+@dataclass
+class ROIResult:
+    """
+    营销活动ROI分析结果
+    
+    Attributes:
+        campaigns: 营销活动数据加上 roi_numeric、conversion_rate、month、duration_days、duration_group 列
+        roi_estimated: 数据中没有ROI字段、roi_numeric 由转化和支出估算时为True
+        distribution: 正ROI和负ROI的活动数量（ROI类型、活动数量）
+        median_roi: ROI中位数
+        channel_roi: 各渠道的平均ROI、总支出、总转化和活动数量
+        audience_roi: 各目标受众的平均ROI、总支出、总转化和活动数量
+        objective_channel_roi: 各目标和渠道组合的平均ROI和总支出
+        monthly_roi: 各月的平均ROI、支出、转化、估算回报和净收益
+        duration_roi: 各持续时间分组的平均ROI、总支出、总转化和活动数量
+        top_campaigns: ROI最高的5个活动
+        bottom_campaigns: ROI最低的5个活动
+        top_channels: ROI最高的活动中出现最多的渠道，按出现次数排列
+        top_objectives: ROI最高的活动中出现最多的营销目标
+        top_audiences: ROI最高的活动中出现最多的目标受众
+        best_duration: 平均ROI最高的持续时间分组
+        optimal_allocation: 按平均ROI排列的渠道及建议占比和当前占比，渠道数不支持时为None
+        total_spend: 各渠道的总支出之和
+    """
+    campaigns: pd.DataFrame
+    roi_estimated: bool
+    distribution: pd.DataFrame
+    median_roi: float
+    channel_roi: pd.DataFrame
+    audience_roi: pd.DataFrame
+    objective_channel_roi: pd.DataFrame
+    monthly_roi: pd.DataFrame
+    duration_roi: pd.DataFrame
+    top_campaigns: pd.DataFrame
+    bottom_campaigns: pd.DataFrame
+    top_channels: list = field(default_factory=list)
+    top_objectives: list = field(default_factory=list)
+    top_audiences: list = field(default_factory=list)
+    best_duration: str = None
+    optimal_allocation: pd.DataFrame = None
+    total_spend: float = 0.0
+
+@dataclass
+class BudgetScenario:
+    """
+    预算情景的计算结果
+    
+    Attributes:
+        allocation: 各渠道的优化后投资、预计转化、预计回报和预计ROI
+        current_return: 当前估算总回报
+        optimized_return: 按建议占比投入预算后的预计总回报
+        improvement: 预计回报相对当前回报的变化（%）
+    """
+    allocation: pd.DataFrame
+    current_return: float
+    optimized_return: float
+    improvement: float
+
+def normalize_roi(marketing_df):
+    """
+    将ROI字段转为数值：百分比字符串（如 "35%"）转为小数，无法解析的值为NaN
+    
+    Args:
+        marketing_df (pd.DataFrame): 营销活动数据，包含 roi 列
+    
+    Returns:
+        pd.Series: 数值ROI
+    """
+    roi = marketing_df['roi']
+    if roi.dtype == 'object':
+        roi = roi.apply(lambda x: float(str(x).replace('%', '')) / 100 if isinstance(x, str) and '%' in str(x) else x)
+    return pd.to_numeric(roi, errors='coerce')
+
+def compute_roi(marketing_df, avg_conversion_value):
+    """
+    计算营销活动的多维度ROI分析
+    
+    Args:
+        marketing_df (pd.DataFrame): 营销活动数据，不会被修改
+        avg_conversion_value (float): 每次转化的平均价值，用于估算月度回报
+    
+    Returns:
+        ROIResult: ROI分析结果
+    """
+    campaigns = marketing_df.copy()
+    campaigns['start_date'] = pd.to_datetime(campaigns['start_date'])
+    campaigns['end_date'] = pd.to_datetime(campaigns['end_date'])
+    
+    # 标准化ROI值，没有ROI字段时基于转化和支出估算
+    roi_estimated = 'roi' not in campaigns.columns
+    if roi_estimated:
+        campaigns['roi_numeric'] = (campaigns['conversions'] * 100 - campaigns['spend']) / campaigns['spend']
+    else:
+        campaigns['roi_numeric'] = normalize_roi(campaigns)
+    
+    distribution = pd.DataFrame({
+        'ROI类型': ['正ROI', '负ROI'],
+        '活动数量': [(campaigns['roi_numeric'] > 0).sum(), (campaigns['roi_numeric'] <= 0).sum()]
+    })
+    
+    channel_roi = _roi_by(campaigns, 'channel', '渠道')
+    audience_roi = _roi_by(campaigns, 'target_audience', '目标受众')
+    objective_channel_roi = campaigns.groupby(['objective', 'channel']).agg({
+        'roi_numeric': 'mean',
+        'spend': 'sum'
+    }).reset_index()
+    
+    campaigns['conversion_rate'] = (campaigns['conversions'] / campaigns['clicks'] * 100).fillna(0)
+    
+    # 按月统计ROI，计算月度回报和净收益
+    campaigns['month'] = campaigns['start_date'].dt.strftime('%Y-%m')
+    monthly_roi = campaigns.groupby('month').agg({
+        'roi_numeric': 'mean',
+        'spend': 'sum',
+        'conversions': 'sum'
+    }).reset_index()
+    monthly_roi['return'] = monthly_roi['conversions'] * avg_conversion_value
+    monthly_roi['net_profit'] = monthly_roi['return'] - monthly_roi['spend']
+    
+    # 按活动持续天数分组统计ROI
+    campaigns['duration_days'] = (campaigns['end_date'] - campaigns['start_date']).dt.days + 1
+    campaigns['duration_group'] = pd.cut(campaigns['duration_days'], bins=DURATION_BINS, labels=DURATION_LABELS)
+    duration_roi = _roi_by(campaigns, 'duration_group', '持续时间')
+    
+    top_campaigns = campaigns.sort_values('roi_numeric', ascending=False).head(5)
+    bottom_campaigns = campaigns.sort_values('roi_numeric').head(5)
+    
+    optimal_allocation, total_spend = _optimal_allocation(channel_roi)
+    
+    return ROIResult(
+        campaigns=campaigns,
+        roi_estimated=roi_estimated,
+        distribution=distribution,
+        median_roi=campaigns['roi_numeric'].median(),
+        channel_roi=channel_roi,
+        audience_roi=audience_roi,
+        objective_channel_roi=objective_channel_roi,
+        monthly_roi=monthly_roi,
+        duration_roi=duration_roi,
+        top_campaigns=top_campaigns,
+        bottom_campaigns=bottom_campaigns,
+        top_channels=top_campaigns['channel'].value_counts().index.tolist(),
+        top_objectives=top_campaigns['objective'].value_counts().index.tolist(),
+        top_audiences=top_campaigns['target_audience'].value_counts().index.tolist(),
+        best_duration=duration_roi.iloc[duration_roi['平均ROI'].argmax()]['持续时间'] if len(duration_roi) else None,
+        optimal_allocation=optimal_allocation,
+        total_spend=total_spend,
+    )
+
+def _roi_by(campaigns, column, label):
+    grouped = campaigns.groupby(column, observed=True).agg({
+        'roi_numeric': 'mean',
+        'spend': 'sum',
+        'conversions': 'sum',
+        'campaign_id': 'count'
+    }).reset_index()
+    grouped.columns = [label, '平均ROI', '总支出', '总转化', '活动数量']
+    return grouped
+
+def _optimal_allocation(channel_roi):
+    """按平均ROI从高到低给渠道分配建议占比，并计算当前占比"""
+    optimal_allocation = channel_roi.sort_values('平均ROI', ascending=False).reset_index(drop=True)
+    num_channels = len(optimal_allocation)
+    if num_channels >= 4:
+        percentages = LARGE_ALLOCATION_PERCENTAGES + [0] * (num_channels - 4)
+    else:
+        percentages = ALLOCATION_PERCENTAGES.get(num_channels)
+    total_spend = channel_roi['总支出'].sum()
+    if not percentages:
+        return None, total_spend
+    
+    optimal_allocation['建议占比'] = np.array(percentages) / 100
+    optimal_allocation['当前占比'] = optimal_allocation['总支出'] / total_spend if total_spend > 0 else 0
+    return optimal_allocation, total_spend
+
+def compute_budget_scenario(optimal_allocation, budget, current_return, avg_conversion_value):
+    """
+    按建议占比投入预算，估算各渠道的转化、回报和ROI
+    
+    各渠道的单位支出转化数保持历史水平。
+    
+    Args:
+        optimal_allocation (pd.DataFrame): ROIResult.optimal_allocation
+        budget (float): 总预算
+        current_return (float): 当前估算总回报
+        avg_conversion_value (float): 每次转化的平均价值
+    
+    Returns:
+        BudgetScenario: 预算情景的计算结果
+    """
+    allocation = optimal_allocation.copy()
+    allocation['优化后投资'] = allocation['建议占比'] * budget
+    allocation['预计转化'] = allocation['优化后投资'] * allocation['总转化'] / allocation['总支出']
+    allocation['预计回报'] = allocation['预计转化'] * avg_conversion_value
+    allocation['预计ROI'] = (allocation['预计回报'] - allocation['优化后投资']) / allocation['优化后投资']
+    
+    optimized_return = allocation['预计回报'].sum()
+    improvement = (optimized_return - current_return) / current_return * 100 if current_return > 0 else 0
+    return BudgetScenario(allocation, current_return, optimized_return, improvement)
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import streamlit as st
+
+from modules.instrumentation import track
+
+# 计算进程数和排队上限；未设置进程数时在应用进程内直接计算
+COMPUTE_WORKERS_ENV = "GLOBALMART_COMPUTE_WORKERS"
+COMPUTE_QUEUE_ENV = "GLOBALMART_COMPUTE_QUEUE"
+
+# 队列已满时等待空位的秒数，超时后提示用户稍后重试
+QUEUE_WAIT_SECONDS = 5
+
+# 单个计算任务的最长耗时
+TASK_TIMEOUT_SECONDS = 300
+
+class ComputePoolBusy(RuntimeError):
+    """计算队列已满"""
+
+class ComputePool:
+    """
+    CPU密集型计算的进程池
+    
+    SARIMA拟合、K-means聚类等耗时计算在独立的进程中运行，不占用应用进程处理其他会话
+    重新运行所需的CPU和GIL。正在运行和排队的任务总数不超过 workers + queue_size，
+    队列已满时新任务等待 QUEUE_WAIT_SECONDS 秒后被拒绝。
+    """
+    
+    def __init__(self, workers, queue_size):
+        """
+        Args:
+            workers (int): 计算进程数
+            queue_size (int): 等待空闲进程的任务数上限
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        # 应用进程中有多个线程，使用 spawn 启动计算进程，避免 fork 复制其他线程持有的锁
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'pending': 0}
+    
+    def submit(self, func, *args, **kwargs):
+        """
+        提交任务，队列已满时等待空位
+        
+        Args:
+            func (callable): 模块级函数，参数和返回值需要可以 pickle
+            *args, **kwargs: 函数参数
+        
+        Returns:
+            concurrent.futures.Future: 任务结果
+        
+        Raises:
+            ComputePoolBusy: 等待 QUEUE_WAIT_SECONDS 秒后仍没有空位
+        """
+        if not self._slots.acquire(timeout=QUEUE_WAIT_SECONDS):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise ComputePoolBusy(f"计算队列已满（{self.workers} 个进程，最多 {self.queue_size} 个排队任务）")
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['pending'] += 1
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+    
+    def _release(self, future):
+        with self._lock:
+            self._stats['pending'] -= 1
+            failed = future is None or future.cancelled() or future.exception() is not None
+            self._stats['failed' if failed else 'completed'] += 1
+        self._slots.release()
+    
+    def run(self, func, *args, **kwargs):
+        """提交任务并等待结果，参数同 submit"""
+        return self.submit(func, *args, **kwargs).result(timeout=TASK_TIMEOUT_SECONDS)
+    
+    def get_stats(self):
+        """返回进程数、排队上限以及提交、完成、失败、拒绝和未完成的任务数"""
+        with self._lock:
+            return {'workers': self.workers, 'queue_size': self.queue_size, **self._stats}
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+@st.cache_resource
+def get_compute_pool():
+    """
+    返回应用进程中所有会话共享的计算进程池
+    
+    Returns:
+        ComputePool: 进程池，未设置 GLOBALMART_COMPUTE_WORKERS 或设置为0时返回None
+    """
+    workers = int(os.environ.get(COMPUTE_WORKERS_ENV, 0))
+    if workers <= 0:
+        return None
+    queue_size = int(os.environ.get(COMPUTE_QUEUE_ENV, workers * 2))
+    return ComputePool(workers, queue_size)
+
+def run_heavy(name, func, *args, **kwargs):
+    """
+    运行CPU密集型计算：配置了计算进程池时在池中运行，否则在当前进程中直接运行
+    
+    Args:
+        name (str): 性能统计中使用的名称
+        func (callable): 模块级函数，参数和返回值需要可以 pickle
+        *args, **kwargs: 函数参数
+    
+    Returns:
+        函数的返回值
+    
+    Raises:
+        ComputePoolBusy: 计算队列已满
+    """
+    pool = get_compute_pool()
+    with track('compute', name, offloaded=pool is not None):
+        if pool is None:
+            return func(*args, **kwargs)
+        return pool.run(func, *args, **kwargs)
@@ -0,0 +1,147 @@
+import inspect
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.data_loader import get_data_version
+from modules.instrumentation import track
+from modules.sales_cube import get_sales_cube
+
+# 支持交叉筛选的维度，month 用于趋势图
+CROSS_FILTER_DIMENSIONS = ['month', 'payment_method', 'device', 'product_category', 'region', 'segment', 'status']
+
+# 图表选择事件需要 Streamlit 1.35 及以上版本，旧版本只显示图表不支持点击筛选
+PLOTLY_SELECTION_AVAILABLE = 'on_select' in inspect.signature(st.plotly_chart).parameters
+
+# 可以汇总的度量
+CROSS_FILTER_MEASURES = ['revenue', 'quantity', 'line_items']
+
+class CrossFilterIndex:
+    """
+    基于位图的交叉筛选索引
+    
+    建立在销售立方体的明细汇总表上（每个维度组合一行）。每个维度的每个取值对应一个
+    用 np.packbits 压缩的位图，标记包含该取值的行。任意筛选组合都转为位图的按位或
+    （同一维度的多个取值）和按位与（不同维度），再对剩余的行按维度编码做一次
+    np.bincount 加权汇总，不需要重新扫描交易数据。
+    """
+    
+    def __init__(self, items, dimensions=None, measures=None):
+        """
+        Args:
+            items (pd.DataFrame): 销售立方体的明细汇总表
+            dimensions (list): 建立位图的维度，默认 CROSS_FILTER_DIMENSIONS
+            measures (list): 可汇总的度量列，默认 CROSS_FILTER_MEASURES
+        """
+        dimensions = dimensions or CROSS_FILTER_DIMENSIONS
+        measures = measures or CROSS_FILTER_MEASURES
+        self.dimensions = [dim for dim in dimensions if dim in items.columns]
+        self._rows = len(items)
+        self._codes = {}
+        self._values = {}
+        self._bitmaps = {}
+        for dim in self.dimensions:
+            # 按取值排序编码，图表中的类别顺序固定
+            codes, values = pd.factorize(items[dim], sort=True)
+            self._codes[dim] = codes
+            self._values[dim] = pd.Index(np.asarray(values))
+            self._bitmaps[dim] = [np.packbits(codes == i) for i in range(len(values))]
+        self._measures = {measure: items[measure].to_numpy(dtype=float)
+                          for measure in measures if measure in items.columns}
+    
+    def get_values(self, dim):
+        """返回维度的所有取值"""
+        return list(self._values[dim])
+    
+    def get_mask(self, selections, exclude=None):
+        """
+        计算筛选条件对应的位图
+        
+        Args:
+            selections (dict): 维度到所选取值列表的映射
+            exclude (str): 不参与筛选的维度（交叉筛选时图表不按自身的选择筛选）
+        
+        Returns:
+            np.ndarray: 压缩的位图，没有筛选条件时返回None
+        """
+        packed = None
+        for dim, selected in selections.items():
+            if dim == exclude or not selected or dim not in self._bitmaps:
+                continue
+            positions = self._values[dim].get_indexer(list(selected))
+            dim_bitmap = np.zeros((self._rows + 7) // 8, dtype=np.uint8)
+            for position in positions[positions >= 0]:
+                np.bitwise_or(dim_bitmap, self._bitmaps[dim][position], out=dim_bitmap)
+            packed = dim_bitmap if packed is None else np.bitwise_and(packed, dim_bitmap, out=packed)
+        return packed
+    
+    def aggregate(self, by, selections=None, measure='revenue'):
+        """
+        按维度汇总度量，筛选条件为其他维度的选择
+        
+        Args:
+            by (str): 分组维度
+            selections (dict): 维度到所选取值列表的映射
+            measure (str): 度量列
+        
+        Returns:
+            pd.DataFrame: 每个取值一行，包含分组维度列和度量列
+        """
+        codes = self._codes[by]
+        values = self._measures[measure]
+        packed = self.get_mask(selections or {}, exclude=by)
+        # 编码为-1的空值不参与分组
+        valid = codes >= 0
+        if packed is not None:
+            valid &= np.unpackbits(packed, count=self._rows).view(bool)
+        totals = np.bincount(codes[valid], weights=values[valid], minlength=len(self._values[by]))
+        return pd.DataFrame({by: self._values[by], measure: totals})
+    
+    def totals(self, selections=None):
+        """
+        计算所有筛选条件下的度量总计
+        
+        Returns:
+            dict: 度量名称到总计的映射
+        """
+        packed = self.get_mask(selections or {})
+        if packed is None:
+            return {measure: values.sum() for measure, values in self._measures.items()}
+        mask = np.unpackbits(packed, count=self._rows).view(bool)
+        return {measure: values[mask].sum() for measure, values in self._measures.items()}
+
+# 索引只读，使用 cache_resource 在会话之间共享同一个对象
+@st.cache_resource(ttl=3600, show_spinner="正在构建交叉筛选索引...")
+def _cached_cross_filter_index(data_version, _items):
+    with track('compute', 'cross_filter_index', rows=len(_items)):
+        return CrossFilterIndex(_items)
+
+def get_cross_filter_index(data):
+    """
+    获取销售数据的交叉筛选索引，按交易和客户数据的版本缓存
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        CrossFilterIndex: 交叉筛选索引
+    """
+    version = get_data_version({'transactions': data["transactions"], 'customers': data["customers"]})
+    return _cached_cross_filter_index(version, get_sales_cube(data)['items'])
+
+def selected_values(event):
+    """
+    从 st.plotly_chart 的选择事件中取出所选的类别
+    
+    柱状图和折线图的类别在 x 中，其他图表类型使用 label。
+    """
+    if not event:
+        return []
+    points = event.get('selection', {}).get('points', [])
+    values = []
+    for point in points:
+        value = point.get('x', point.get('label'))
+        if value is not None and value not in values:
+            values.append(value)
+    return values
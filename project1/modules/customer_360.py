@@ -0,0 +1,120 @@
+import threading
+
+import streamlit as st
+
+from modules.compute.customers import aggregate_customers, build_customer_360, merge_customer_aggregates
+from modules.data_loader import get_data_version, get_sample_fingerprint
+from modules.instrumentation import track
+
+class AppendTracker:
+    """
+    判断交易数据相对上次处理时是否只追加了新行
+    
+    记录已处理的行数、这些行的抽样指纹、已处理的订单ID和客户数据版本。只有客户数据
+    未变、已处理的行未被修改（指纹相同），且新增的行中没有已处理过的订单（订单明细跨越
+    两批数据时增量汇总会把它计为两个订单）时，才可以只处理新增的行。
+    """
+    
+    def __init__(self):
+        self._rows_processed = 0
+        self._prefix_fingerprint = None
+        self._order_ids = set()
+        self._customers_version = None
+    
+    def appended_rows(self, transactions_df, customers_version):
+        """
+        返回自上次处理以来追加的交易
+        
+        Args:
+            transactions_df (pd.DataFrame): 当前的交易明细数据
+            customers_version (str): 当前客户数据的版本
+        
+        Returns:
+            pd.DataFrame: 追加的交易，不能增量处理时返回None
+        """
+        if (self._prefix_fingerprint is None or customers_version != self._customers_version
+                or len(transactions_df) <= self._rows_processed
+                or get_sample_fingerprint(transactions_df.iloc[:self._rows_processed]) != self._prefix_fingerprint):
+            return None
+        new_rows = transactions_df.iloc[self._rows_processed:]
+        if not self._order_ids.isdisjoint(new_rows['transaction_id'].dropna().unique()):
+            return None
+        return new_rows
+    
+    def commit(self, transactions_df, customers_version, new_rows=None):
+        """
+        记录已处理到的位置
+        
+        Args:
+            transactions_df (pd.DataFrame): 已处理的交易明细数据
+            customers_version (str): 客户数据的版本
+            new_rows (pd.DataFrame): 本次增量处理的交易，为空表示完整处理了 transactions_df
+        """
+        if new_rows is None:
+            self._order_ids = set(transactions_df['transaction_id'].dropna().unique())
+        else:
+            self._order_ids.update(new_rows['transaction_id'].dropna().unique())
+        self._rows_processed = len(transactions_df)
+        self._prefix_fingerprint = get_sample_fingerprint(transactions_df)
+        self._customers_version = customers_version
+
+class Customer360Store:
+    """
+    按数据版本维护 Customer-360 表
+    
+    数据版本变化时，如果交易数据只是追加了新行（见 AppendTracker），只汇总新增的交易并
+    合并到已有的表中；否则完整重建。返回的表在会话之间共享，调用方不能原地修改。
+    """
+    
+    def __init__(self):
+        self._table = None
+        self._version = None
+        self._tracker = AppendTracker()
+        self._lock = threading.RLock()
+    
+    def get(self, transactions_df, customers_df):
+        """
+        返回当前数据版本的 Customer-360 表
+        
+        Args:
+            transactions_df (pd.DataFrame): 交易明细数据
+            customers_df (pd.DataFrame): 客户数据
+        
+        Returns:
+            pd.DataFrame: Customer-360 表
+        """
+        version = get_data_version({'transactions': transactions_df, 'customers': customers_df})
+        customers_version = get_data_version(customers_df)
+        with self._lock:
+            if version == self._version:
+                return self._table
+            
+            new_rows = self._tracker.appended_rows(transactions_df, customers_version)
+            if new_rows is not None:
+                with track('compute', 'customer_360_update', rows=len(new_rows)):
+                    table = merge_customer_aggregates(self._table, aggregate_customers(new_rows), customers_df)
+            else:
+                with track('compute', 'customer_360_build', rows=len(transactions_df)):
+                    table = build_customer_360(transactions_df, customers_df)
+            
+            self._table = table
+            self._version = version
+            self._tracker.commit(transactions_df, customers_version, new_rows)
+            return table
+
+@st.cache_resource
+def get_customer_360_store():
+    """返回所有会话共享的 Customer-360 存储"""
+    return Customer360Store()
+
+def get_customer_360(data):
+    """
+    获取当前数据版本的 Customer-360 表，客户页面共用
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        pd.DataFrame: Customer-360 表，只读
+    """
+    return get_customer_360_store().get(data["transactions"], data["customers"])
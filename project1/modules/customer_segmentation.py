@@ -3,10 +3,20 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
 
+from modules.compute.clustering import (CLUSTERING_FEATURES, DEFAULT_CLUSTERING_FEATURES, compute_kmeans,
+                                       prepare_clustering_data)
+from modules.compute.behavior import compute_segment_behavior
+from modules.compute.rfm import compute_rfm
+from modules.compute_pool import run_heavy
+from modules.customer_360 import get_customer_360
+from modules.data_loader import get_data_version
+from modules.figure_cache import plotly_chart
+from modules.instrumentation import instrument, track
+from modules.job_runner import NOT_READY, display_job, submit_job
+from modules.result_cache import memoize
+
+@instrument('page')
 def perform_customer_segmentation(data):
     """
     执行客户细分分析
@@ -22,12 +32,43 @@ def perform_customer_segmentation(data):
     )
     
     # 根据选择执行不同的分析
-    if analysis_type == "RFM分析":
-        perform_rfm_analysis(data)
-    elif analysis_type == "K-means聚类":
-        perform_kmeans_clustering(data)
-    elif analysis_type == "消费行为分析":
-        perform_behavioral_analysis(data)
+    with track('section', f"perform_customer_segmentation/{analysis_type}"):
+        if analysis_type == "RFM分析":
+            perform_rfm_analysis(data)
+        elif analysis_type == "K-means聚类":
+            perform_kmeans_clustering(data)
+        elif analysis_type == "消费行为分析":
+            perform_behavioral_analysis(data)
+
+# 计算结果只依赖交易和客户数据以及当天日期，按两者缓存
+@memoize('rfm', datasets=['transactions', 'customers'])
+def _rfm_result(data, today):
+    return compute_rfm(get_customer_360(data), today)
+
+def get_rfm_result(data):
+    """
+    获取当前数据的RFM分析结果
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        RFMResult: RFM分析结果
+    """
+    return _rfm_result(data, pd.to_datetime('today').normalize())
+
+@memoize('segment_behavior', datasets=['transactions', 'customers'])
+def get_behavior_result(data):
+    """
+    获取当前数据各客户细分的消费行为汇总
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        BehaviorResult: 消费行为汇总
+    """
+    return compute_segment_behavior(data["transactions"], get_customer_360(data))
 
 def perform_rfm_analysis(data):
     """
@@ -45,90 +86,37 @@ def perform_rfm_analysis(data):
     - **消费金额(Monetary)**: 客户消费的金额
     """)
     
-    # 准备数据
-    customers_df = data["customers"]
-    transactions_df = data["transactions"]
-    
-    # 确保日期格式正确
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-    
-    # 计算RFM指标
-    # 最近消费(R): 计算最后一次购买距今的天数
-    latest_purchase = transactions_df.groupby('customer_id')['date'].max().reset_index()
-    latest_purchase.columns = ['customer_id', 'latest_purchase']
-    latest_purchase['recency'] = (pd.to_datetime('today') - latest_purchase['latest_purchase']).dt.days
-    
-    # 消费频率(F): 计算购买次数
-    purchase_frequency = transactions_df.groupby('customer_id')['transaction_id'].nunique().reset_index()
-    purchase_frequency.columns = ['customer_id', 'frequency']
-    
-    # 消费金额(M): 计算总消费金额
-    purchase_monetary = transactions_df.groupby('customer_id')['total_amount'].sum().reset_index()
-    
-    # 合并RFM数据
-    rfm_df = latest_purchase.merge(purchase_frequency, on='customer_id')
-    rfm_df = rfm_df.merge(purchase_monetary, on='customer_id')
-    
-    # 添加客户信息
-    rfm_df = rfm_df.merge(customers_df[['customer_id', 'name', 'segment', 'region', 'gender']], on='customer_id', how='left')
+    # 计算RFM得分和分群（见 modules/compute/rfm.py），指标和客户属性都来自 Customer-360 表
+    # 最近消费(R): 最后一次购买距今的天数
+    # 消费频率(F): 购买次数（订单数）
+    # 消费金额(M): 总消费金额
+    result = get_rfm_result(data)
+    rfm_df = result.customers
     
     # 显示RFM数据样本
     st.write("RFM数据样本：")
-    st.dataframe(rfm_df.head())
-    
-    # 创建RFM得分
-    # 逆序转换最近消费(R)，使较小的值(更近的购买)获得更高的分数
-    rfm_df['r_score'] = pd.qcut(rfm_df['recency'], 5, labels=[5, 4, 3, 2, 1])
-    # 频率(F)和金额(M)转换
-    rfm_df['f_score'] = pd.qcut(rfm_df['frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5])
-    rfm_df['m_score'] = pd.qcut(rfm_df['total_amount'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5])
-    
-    # 计算RFM总分
-    rfm_df['rfm_score'] = rfm_df['r_score'].astype(int) + rfm_df['f_score'].astype(int) + rfm_df['m_score'].astype(int)
-    
-    # 进行客户分群
-    rfm_df['customer_segment'] = pd.qcut(rfm_df['rfm_score'], 4, 
-                                         labels=['低价值客户', '一般价值客户', '高价值客户', '顶级价值客户'])
+    sample_columns = ['customer_id', 'latest_purchase', 'recency', 'frequency', 'total_amount',
+                      'name', 'segment', 'region', 'gender']
+    st.dataframe(rfm_df[[col for col in sample_columns if col in rfm_df.columns]].head())
     
     # 显示分群结果
     st.subheader("RFM客户分群结果")
     
-    # 各分群的客户数量
-    segment_counts = rfm_df['customer_segment'].value_counts().reset_index()
-    segment_counts.columns = ['客户分群', '客户数量']
-    
     # 分群分布
-    fig1 = px.pie(segment_counts, values='客户数量', names='客户分群', 
+    fig1 = px.pie(result.segment_counts, values='客户数量', names='客户分群', 
                   title='客户分群分布',
                   color_discrete_sequence=px.colors.qualitative.Set3)
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, 'rfm/segment_distribution', use_container_width=True)
     
     # 显示各分群的RFM特征
-    segment_characteristics = rfm_df.groupby('customer_segment').agg({
-        'recency': 'mean',
-        'frequency': 'mean',
-        'total_amount': 'mean',
-        'rfm_score': 'mean'
-    }).reset_index()
-    
     st.write("各客户分群的平均特征：")
-    st.dataframe(segment_characteristics)
+    st.dataframe(result.characteristics)
     
     # 创建雷达图展示各分群的RFM特征
     st.subheader("各客户群RFM特征对比")
     
-    # 准备雷达图数据 - 确保数值类型
     try:
-        # 确保r_score, f_score, m_score为数值类型
-        for col in ['r_score', 'f_score', 'm_score']:
-            if rfm_df[col].dtype.name == 'category':
-                rfm_df[col] = rfm_df[col].astype(float)
-        
-        radar_df = rfm_df.groupby('customer_segment').agg({
-            'r_score': 'mean',
-            'f_score': 'mean',
-            'm_score': 'mean'
-        }).reset_index()
+        radar_df = result.scores
         
         # 创建雷达图
         fig2 = go.Figure()
@@ -154,68 +142,49 @@ def perform_rfm_analysis(data):
             title="客户分群RFM特征雷达图"
         )
         
-        st.plotly_chart(fig2, use_container_width=True)
+        plotly_chart(fig2, 'rfm/segment_radar', use_container_width=True)
     except Exception as e:
         st.error(f"创建雷达图时发生错误: {e}")
     
     # 分析各群体的消费行为和特征
     st.subheader("客户群体特征分析")
     
-    # 合并更多客户特征
-    segment_analysis = rfm_df.merge(
-        customers_df[['customer_id', 'age', 'gender', 'region', 'income', 'preferred_payment', 'preferred_device']], 
-        on='customer_id', 
-        how='left'
-    )
-    
     # 按分群和区域分析
-    try:
-        if 'region' in segment_analysis.columns:
-            region_segment = segment_analysis.groupby(['customer_segment', 'region']).size().reset_index()
-            region_segment.columns = ['客户分群', '区域', '客户数量']
-            
-            fig3 = px.bar(region_segment, x='区域', y='客户数量', color='客户分群', 
-                         barmode='group', 
-                         title='各区域客户分群分布')
-            st.plotly_chart(fig3, use_container_width=True)
-        else:
-            st.warning("数据中缺少'region'列，无法进行区域分析")
-    except Exception as e:
-        st.error(f"区域分析出错: {e}")
+    if result.region_segments is not None:
+        fig3 = px.bar(result.region_segments, x='区域', y='客户数量', color='客户分群', 
+                     barmode='group', 
+                     title='各区域客户分群分布')
+        plotly_chart(fig3, 'rfm/segment_by_region', use_container_width=True)
+    else:
+        st.warning("数据中缺少'region'列，无法进行区域分析")
     
     # 按分群和性别分析
-    try:
-        if 'gender' in segment_analysis.columns:
-            gender_segment = segment_analysis.groupby(['customer_segment', 'gender']).size().reset_index()
-            gender_segment.columns = ['客户分群', '性别', '客户数量']
-            
-            fig4 = px.bar(gender_segment, x='性别', y='客户数量', color='客户分群',
-                         barmode='group',
-                         title='各性别的客户分群分布')
-            st.plotly_chart(fig4, use_container_width=True)
-        else:
-            st.warning("数据中缺少'gender'列，无法进行性别分析")
-    except Exception as e:
-        st.error(f"性别分析出错: {e}")
+    if result.gender_segments is not None:
+        fig4 = px.bar(result.gender_segments, x='性别', y='客户数量', color='客户分群',
+                     barmode='group',
+                     title='各性别的客户分群分布')
+        plotly_chart(fig4, 'rfm/segment_by_gender', use_container_width=True)
+    else:
+        st.warning("数据中缺少'gender'列，无法进行性别分析")
     
     # 分析顶级价值客户
     st.subheader("顶级价值客户特征")
     
-    top_customers = segment_analysis[segment_analysis['customer_segment'] == '顶级价值客户']
+    top_customers = rfm_df[rfm_df['customer_segment'] == '顶级价值客户']
     
     # 顶级客户年龄分布
     fig5 = px.histogram(top_customers, x='age', 
                        title='顶级价值客户年龄分布',
                        labels={'age': '年龄', 'count': '客户数量'},
                        nbins=20)
-    st.plotly_chart(fig5, use_container_width=True)
+    plotly_chart(fig5, 'rfm/top_customer_age', use_container_width=True)
     
     # 按收入分析顶级客户
     if 'income' in top_customers.columns:
-        fig6 = px.box(segment_analysis, x='customer_segment', y='income', 
+        fig6 = px.box(rfm_df, x='customer_segment', y='income', 
                      title='各客户群收入分布',
                      labels={'customer_segment': '客户分群', 'income': '收入'})
-        st.plotly_chart(fig6, use_container_width=True)
+        plotly_chart(fig6, 'rfm/income_by_segment', use_container_width=True)
     
     # 营销建议
     st.subheader("客户分群营销建议")
@@ -244,6 +213,49 @@ def perform_rfm_analysis(data):
     - **了解需求**: 发送调查了解其需求和偏好
     """)
 
+@memoize('kmeans', datasets=['transactions', 'customers'])
+def _kmeans_result(data, today, features, n_clusters):
+    # 聚类在计算进程池中运行（如已配置），不阻塞其他会话
+    return run_heavy('kmeans', compute_kmeans, prepare_clustering_data(get_customer_360(data), today), features, n_clusters)
+
+def get_kmeans_result(data, features, n_clusters):
+    """
+    获取当前数据的K-means聚类结果，按数据版本、日期、特征和聚类数量缓存
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        features (list): 参与聚类的特征列
+        n_clusters (int): 聚类数量
+    
+    Returns:
+        KMeansResult: 聚类结果
+    """
+    return _kmeans_result(data, pd.to_datetime('today').normalize(), tuple(features), n_clusters)
+
+def _kmeans_job(customer_360, today, features, n_clusters, progress):
+    progress(0.1, "准备客户特征")
+    clustering_data = prepare_clustering_data(customer_360, today)
+    progress(0.3, "执行K-means聚类")
+    return run_heavy('kmeans', compute_kmeans, clustering_data, features, n_clusters)
+
+def submit_kmeans_job(data, features, n_clusters):
+    """
+    在后台执行K-means聚类，相同的数据版本、日期、特征和聚类数量共用一个任务
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        features (list): 参与聚类的特征列
+        n_clusters (int): 聚类数量
+    
+    Returns:
+        Job: 后台任务，完成后 display_job 返回 KMeansResult
+    """
+    version = get_data_version({'transactions': data["transactions"], 'customers': data["customers"]})
+    today = pd.to_datetime('today').normalize()
+    features = tuple(features)
+    return submit_job('kmeans', (version, today, features, n_clusters),
+                      _kmeans_job, get_customer_360(data), today, features, n_clusters)
+
 def perform_kmeans_clustering(data):
     """
     使用K-means聚类进行客户细分
@@ -258,68 +270,15 @@ def perform_kmeans_clustering(data):
     与RFM分析不同，K-means可以考虑更多的客户特征。
     """)
     
-    # 准备数据
-    customers_df = data["customers"]
-    transactions_df = data["transactions"]
-    
-    # 合并交易数据，计算每个客户的购买行为
-    customer_purchase = transactions_df.groupby('customer_id').agg({
-        'transaction_id': 'nunique',  # 购买次数
-        'total_amount': 'sum',  # 总消费金额
-        'quantity': 'sum',  # 总购买数量
-        'date': 'max'  # 最近购买日期
-    }).reset_index()
-    
-    customer_purchase.columns = ['customer_id', 'purchase_count', 'total_spend', 'total_items', 'last_purchase']
-    
-    # 计算最近购买天数
-    customer_purchase['last_purchase'] = pd.to_datetime(customer_purchase['last_purchase'])
-    customer_purchase['recency'] = (pd.to_datetime('today') - customer_purchase['last_purchase']).dt.days
-    
-    # 计算平均订单金额
-    customer_purchase['avg_order_value'] = customer_purchase['total_spend'] / customer_purchase['purchase_count']
-    
-    # 合并客户信息
-    clustering_data = customer_purchase.merge(
-        customers_df[['customer_id', 'age', 'gender', 'region', 'income', 'registration_date']], 
-        on='customer_id', 
-        how='left'
-    )
-    
-    # 处理收入字段 - 清理货币符号和K/M等后缀
-    try:
-        # 如果income是字符串类型，进行清理
-        if clustering_data['income'].dtype == 'object':
-            # 移除货币符号($)
-            clustering_data['income'] = clustering_data['income'].astype(str).str.replace('$', '')
-            # 处理K/M后缀
-            clustering_data['income'] = clustering_data['income'].apply(lambda x: 
-                float(x.replace('K', '')) * 1000 if 'K' in str(x) 
-                else (float(x.replace('M', '')) * 1000000 if 'M' in str(x) 
-                     else float(x) if str(x).replace('.', '', 1).isdigit() else 0))
-    except Exception as e:
-        st.warning(f"处理收入数据时出错: {e}")
-        # 遇到错误时，将income设为0
-        clustering_data['income'] = 0
-    
-    # 处理缺失值
-    clustering_data = clustering_data.fillna({
-        'age': clustering_data['age'].median(),
-        'income': clustering_data['income'].median()
-    })
-    
-    # 计算客户的忠诚度（注册时间）
-    clustering_data['registration_date'] = pd.to_datetime(clustering_data['registration_date'])
-    clustering_data['loyalty_days'] = (pd.to_datetime('today') - clustering_data['registration_date']).dt.days
-    
-    # 准备聚类特征
+    # 准备聚类特征：购买行为和客户信息来自各客户页面共用的 Customer-360 表
+    # recency 为最近购买天数，loyalty_days 为客户的忠诚度（注册时间）
     # 允许用户选择要包含的特征
     st.subheader("选择用于聚类的特征")
     
     clustering_features = st.multiselect(
         "选择要包含在聚类分析中的特征",
-        ['recency', 'purchase_count', 'total_spend', 'avg_order_value', 'age', 'income', 'loyalty_days', 'total_items'],
-        default=['recency', 'purchase_count', 'total_spend', 'age']
+        CLUSTERING_FEATURES,
+        default=DEFAULT_CLUSTERING_FEATURES
     )
     
     if not clustering_features:
@@ -329,44 +288,32 @@ def perform_kmeans_clustering(data):
     # 选择聚类数量
     n_clusters = st.slider("选择客户群体数量", min_value=2, max_value=10, value=4)
     
-    # 准备特征数据
-    X = clustering_data[clustering_features].copy()
-    
-    # 标准化特征
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    # 执行K-means聚类
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    clustering_data['cluster'] = kmeans.fit_predict(X_scaled)
+    # 标准化特征并执行K-means聚类（见 modules/compute/clustering.py），相同的特征和聚类数量直接使用缓存的结果
+    # 聚类在后台任务中运行，完成前显示进度，结果保存在计算结果缓存中
+    job = submit_kmeans_job(data, clustering_features, n_clusters)
+    result = display_job(job, "K-means聚类")
+    if result is NOT_READY:
+        return
+    cluster_characteristics = result.characteristics
     
     # 显示聚类结果
     st.subheader("K-means聚类结果")
     
     # 聚类分布
-    cluster_counts = clustering_data['cluster'].value_counts().reset_index()
-    cluster_counts.columns = ['聚类', '客户数量']
-    
-    fig1 = px.pie(cluster_counts, values='客户数量', names='聚类', 
+    fig1 = px.pie(result.cluster_counts, values='客户数量', names='聚类', 
                  title='聚类分布',
                  color_discrete_sequence=px.colors.qualitative.Set1)
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, 'kmeans/cluster_distribution', use_container_width=True)
     
     # 显示各聚类的特征
-    cluster_characteristics = clustering_data.groupby('cluster')[clustering_features].mean().reset_index()
-    
     st.write("各聚类的平均特征：")
     st.dataframe(cluster_characteristics)
     
     # 使用雷达图显示聚类特征
     st.subheader("聚类特征对比")
     
-    # 准备雷达图数据
-    radar_data = cluster_characteristics.copy()
-    
-    # 标准化雷达图数据，使其范围在0-1之间
-    for feature in clustering_features:
-        radar_data[feature] = (radar_data[feature] - radar_data[feature].min()) / (radar_data[feature].max() - radar_data[feature].min())
+    # 雷达图数据已标准化到0-1之间
+    radar_data = result.radar
     
     # 创建雷达图
     fig2 = go.Figure()
@@ -390,74 +337,47 @@ def perform_kmeans_clustering(data):
         title="聚类特征雷达图"
     )
     
-    st.plotly_chart(fig2, use_container_width=True)
+    plotly_chart(fig2, 'kmeans/cluster_radar', use_container_width=True)
     
     # 使用PCA降维并可视化聚类
     st.subheader("聚类可视化 (PCA降维)")
     
-    pca = PCA(n_components=2)
-    X_pca = pca.fit_transform(X_scaled)
-    
-    pca_df = pd.DataFrame(X_pca, columns=['PCA1', 'PCA2'])
-    pca_df['cluster'] = clustering_data['cluster']
-    
-    fig3 = px.scatter(pca_df, x='PCA1', y='PCA2', color='cluster',
+    fig3 = px.scatter(result.pca, x='PCA1', y='PCA2', color='cluster',
                      title='客户聚类PCA可视化',
                      labels={'PCA1': '主成分1', 'PCA2': '主成分2', 'cluster': '聚类'},
                      color_discrete_sequence=px.colors.qualitative.Set1)
     
-    st.plotly_chart(fig3, use_container_width=True)
+    plotly_chart(fig3, 'kmeans/pca', use_container_width=True)
     
     # 分析各聚类的其他特征
     st.subheader("聚类的额外特征分析")
     
-    # 合并更多客户特征
-    extended_cluster_data = clustering_data.merge(
-        customers_df[['customer_id', 'gender', 'region', 'preferred_payment', 'preferred_device', 'segment']], 
-        on='customer_id', 
-        how='left'
-    )
-    
     # 按聚类和原始客户细分分析
-    segment_cluster = extended_cluster_data.groupby(['cluster', 'segment']).size().reset_index()
-    segment_cluster.columns = ['聚类', '客户细分', '客户数量']
-    
-    fig4 = px.bar(segment_cluster, x='聚类', y='客户数量', color='客户细分', 
-                 barmode='stack', 
-                 title='聚类与原始客户细分的关系')
-    st.plotly_chart(fig4, use_container_width=True)
+    if result.segment_clusters is not None:
+        fig4 = px.bar(result.segment_clusters, x='聚类', y='客户数量', color='客户细分', 
+                     barmode='stack', 
+                     title='聚类与原始客户细分的关系')
+        plotly_chart(fig4, 'kmeans/cluster_vs_segment', use_container_width=True)
     
     # 按集群和区域分析
-    try:
-        if 'region' in extended_cluster_data.columns:
-            region_cluster = extended_cluster_data.groupby(['cluster', 'region']).size().reset_index()
-            region_cluster.columns = ['集群', '区域', '客户数量']
-            
-            fig3 = px.bar(region_cluster, x='区域', y='客户数量', color='集群',
-                        barmode='group',
-                        title='各区域客户集群分布')
-            
-            st.plotly_chart(fig3, use_container_width=True)
-        else:
-            st.warning("数据中缺少'region'列，无法进行区域分析")
-    except Exception as e:
-        st.error(f"区域分析出错: {e}")
+    if result.region_clusters is not None:
+        fig5 = px.bar(result.region_clusters, x='区域', y='客户数量', color='集群',
+                    barmode='group',
+                    title='各区域客户集群分布')
+        
+        plotly_chart(fig5, 'kmeans/cluster_by_region', use_container_width=True)
+    else:
+        st.warning("数据中缺少'region'列，无法进行区域分析")
         
     # 按集群和性别分析
-    try:
-        if 'gender' in extended_cluster_data.columns:
-            gender_cluster = extended_cluster_data.groupby(['cluster', 'gender']).size().reset_index()
-            gender_cluster.columns = ['集群', '性别', '客户数量']
-            
-            fig4 = px.bar(gender_cluster, x='性别', y='客户数量', color='集群',
-                        barmode='group',
-                        title='各性别客户集群分布')
-            
-            st.plotly_chart(fig4, use_container_width=True)
-        else:
-            st.warning("数据中缺少'gender'列，无法进行性别分析")
-    except Exception as e:
-        st.error(f"性别分析出错: {e}")
+    if result.gender_clusters is not None:
+        fig6 = px.bar(result.gender_clusters, x='性别', y='客户数量', color='集群',
+                    barmode='group',
+                    title='各性别客户集群分布')
+        
+        plotly_chart(fig6, 'kmeans/cluster_by_gender', use_container_width=True)
+    else:
+        st.warning("数据中缺少'gender'列，无法进行性别分析")
     
     # 聚类解释和营销建议
     st.subheader("聚类解释和营销建议")
@@ -547,118 +467,72 @@ def perform_behavioral_analysis(data):
     通过这些维度，我们可以更全面地了解客户行为模式。
     """)
     
-    # 准备数据
+    # 准备数据：各细分的行为汇总由 modules/compute/behavior.py 计算，按数据版本缓存
     customers_df = data["customers"]
-    transactions_df = data["transactions"]
-    products_df = data["products"]
-    
-    # 合并数据
-    merged_data = transactions_df.merge(
-        customers_df[['customer_id', 'segment', 'region', 'gender', 'age']], 
-        on='customer_id', 
-        how='left'
-    )
-    
-    # 添加产品类别信息
-    if 'category' in products_df.columns:
-        product_categories = products_df[['product_id', 'category', 'subcategory']]
-        merged_data = merged_data.merge(product_categories, on='product_id', how='left')
+    behavior = get_behavior_result(data)
     
     # 分析品类偏好
     st.subheader("客户品类偏好分析")
     
     # 按客户细分和产品类别分析
-    if 'product_category' in merged_data.columns:
-        segment_category = merged_data.groupby(['segment', 'product_category'])['total_amount'].sum().reset_index()
-        
-        fig1 = px.bar(segment_category, x='segment', y='total_amount', color='product_category',
+    if behavior.segment_category is not None:
+        fig1 = px.bar(behavior.segment_category, x='segment', y='total_amount', color='product_category',
                      title='各客户细分的品类偏好',
                      labels={'segment': '客户细分', 'total_amount': '消费金额', 'product_category': '产品类别'})
         
-        st.plotly_chart(fig1, use_container_width=True)
+        plotly_chart(fig1, 'behavior/category_preference', use_container_width=True)
     
     # 分析购买时段分布
     st.subheader("购买时段分析")
     
-    # 提取小时信息
-    if 'time' in merged_data.columns:
-        merged_data['hour'] = pd.to_datetime(merged_data['time']).dt.hour
-        
-        # 定义时段
-        def get_time_period(hour):
-            if 5 <= hour < 12:
-                return '上午 (5-12点)'
-            elif 12 <= hour < 18:
-                return '下午 (12-18点)'
-            elif 18 <= hour < 22:
-                return '晚上 (18-22点)'
-            else:
-                return '夜间 (22-5点)'
-        
-        merged_data['time_period'] = merged_data['hour'].apply(get_time_period)
-        
+    if behavior.segment_time is not None:
         # 按客户细分和时段分析
-        segment_time = merged_data.groupby(['segment', 'time_period']).size().reset_index()
-        segment_time.columns = ['客户细分', '时段', '订单数量']
-        
-        fig2 = px.bar(segment_time, x='客户细分', y='订单数量', color='时段',
+        fig2 = px.bar(behavior.segment_time, x='客户细分', y='订单数量', color='时段',
                      title='各客户细分的购买时段分布',
                      barmode='group')
         
-        st.plotly_chart(fig2, use_container_width=True)
+        plotly_chart(fig2, 'behavior/purchase_hour', use_container_width=True)
     
     # 分析支付方式
     st.subheader("支付方式偏好分析")
     
-    if 'payment_method' in merged_data.columns:
+    if behavior.segment_payment is not None:
         # 按客户细分和支付方式分析
-        segment_payment = merged_data.groupby(['segment', 'payment_method']).size().reset_index()
-        segment_payment.columns = ['客户细分', '支付方式', '订单数量']
-        
-        fig3 = px.bar(segment_payment, x='客户细分', y='订单数量', color='支付方式',
+        fig3 = px.bar(behavior.segment_payment, x='客户细分', y='订单数量', color='支付方式',
                      title='各客户细分的支付方式偏好',
                      barmode='stack')
         
-        st.plotly_chart(fig3, use_container_width=True)
+        plotly_chart(fig3, 'behavior/payment_method', use_container_width=True)
     
     # 分析设备使用
     st.subheader("设备使用偏好分析")
     
-    if 'device' in merged_data.columns:
+    if behavior.segment_device is not None:
         # 按客户细分和设备分析
-        segment_device = merged_data.groupby(['segment', 'device']).size().reset_index()
-        segment_device.columns = ['客户细分', '设备', '订单数量']
-        
-        fig4 = px.bar(segment_device, x='客户细分', y='订单数量', color='设备',
+        fig4 = px.bar(behavior.segment_device, x='客户细分', y='订单数量', color='设备',
                      title='各客户细分的设备使用偏好',
                      barmode='stack')
         
-        st.plotly_chart(fig4, use_container_width=True)
+        plotly_chart(fig4, 'behavior/device', use_container_width=True)
     
     # 分析优惠券使用
     st.subheader("优惠券使用分析")
     
-    if 'coupon_used' in merged_data.columns:
-        # 计算各细分的优惠券使用率
-        coupon_usage = merged_data.groupby('segment')['coupon_used'].mean().reset_index()
-        coupon_usage.columns = ['客户细分', '优惠券使用率']
-        
-        fig5 = px.bar(coupon_usage, x='客户细分', y='优惠券使用率',
+    if behavior.coupon_usage is not None:
+        # 各细分的优惠券使用率
+        fig5 = px.bar(behavior.coupon_usage, x='客户细分', y='优惠券使用率',
                      title='各客户细分的优惠券使用率',
                      labels={'优惠券使用率': '使用率 (0-1)'})
         
-        st.plotly_chart(fig5, use_container_width=True)
+        plotly_chart(fig5, 'behavior/coupon_rate', use_container_width=True)
         
         # 分析使用优惠券的订单金额变化
-        coupon_amount = merged_data.groupby(['segment', 'coupon_used'])['total_amount'].mean().reset_index()
-        coupon_amount.columns = ['客户细分', '是否使用优惠券', '平均订单金额']
-        
-        fig6 = px.bar(coupon_amount, x='客户细分', y='平均订单金额', color='是否使用优惠券',
+        fig6 = px.bar(behavior.coupon_amount, x='客户细分', y='平均订单金额', color='是否使用优惠券',
                      title='优惠券对订单金额的影响',
                      labels={'平均订单金额': '金额', '是否使用优惠券': '优惠券使用'},
                      barmode='group')
         
-        st.plotly_chart(fig6, use_container_width=True)
+        plotly_chart(fig6, 'behavior/coupon_order_value', use_container_width=True)
     
     # 行为画像总结
     st.subheader("客户行为画像总结")
@@ -677,19 +551,6 @@ def perform_behavioral_analysis(data):
             except:
                 customers_df['age'] = 0
                 
-        # 处理收入字段
-        if 'income' in customers_df.columns and customers_df['income'].dtype == 'object':
-            try:
-                # 移除货币符号($)
-                customers_df['income'] = customers_df['income'].astype(str).str.replace('$', '')
-                # 处理K/M后缀
-                customers_df['income'] = customers_df['income'].apply(lambda x: 
-                    float(x.replace('K', '')) * 1000 if 'K' in str(x) 
-                    else (float(x.replace('M', '')) * 1000000 if 'M' in str(x) 
-                         else float(x) if str(x).replace('.', '', 1).isdigit() else 0))
-            except:
-                customers_df['income'] = 0
-        
         # 获取各细分的基本信息
         segment_summary = customers_df.groupby('segment').agg({
             'customer_id': 'count',
@@ -713,18 +574,16 @@ def perform_behavioral_analysis(data):
     for segment in segments:
         st.markdown(f"### {segment}类客户")
         
-        # 提取该细分的数据
-        segment_data = merged_data[merged_data['segment'] == segment]
-        
         # 获取该细分的主要特征
         segment_info = customers_df[customers_df['segment'] == segment]
+        portrait_values = behavior.portraits.get(segment, {})
         
         # 计算该细分的特征
         avg_age = segment_info['age'].mean()
         top_regions = segment_info['region'].value_counts().head(2).index.tolist()
-        top_devices = segment_data['device'].value_counts().head(1).index.tolist() if 'device' in segment_data.columns else []
-        top_payments = segment_data['payment_method'].value_counts().head(2).index.tolist() if 'payment_method' in segment_data.columns else []
-        top_categories = segment_data['product_category'].value_counts().head(3).index.tolist() if 'product_category' in segment_data.columns else []
+        top_devices = portrait_values.get('devices', [])
+        top_payments = portrait_values.get('payments', [])
+        top_categories = portrait_values.get('categories', [])
         
         # 构建客户画像
         portrait = f"""
@@ -2,13 +2,16 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 
-def clean_data(df, dataset_type):
+from modules.traffic_imputation import TRAFFIC_CHANNELS, impute_channel_shares
+
+def clean_data(df, dataset_type, progress=None):
     """
     根据数据集类型进行数据清理
     
     Args:
         df (pd.DataFrame): 要清理的数据集
         dataset_type (str): 数据集类型 (customers, products, transactions, marketing, traffic)
+        progress (callable): 可选的进度回调 progress(比例, 说明)，在后台任务中运行时使用
     
     Returns:
         tuple: (清理后的数据集, 清理报告)
@@ -17,7 +20,11 @@ def clean_data(df, dataset_type):
     cleaning_report = {}
     
     # 复制数据集以避免修改原始数据
+    if progress:
+        progress(0.05, f"复制{len(df):,}行数据")
     cleaned_df = df.copy()
+    if progress:
+        progress(0.2, "执行清理步骤")
     
     # 根据数据集类型调用相应的清理函数
     if dataset_type == 'customers':
@@ -31,8 +38,39 @@ def clean_data(df, dataset_type):
     elif dataset_type == 'traffic':
         cleaned_df, cleaning_report = clean_traffic_data(cleaned_df)
     
+    # 清理后的数据内容已改变，使用派生的数据版本
+    if 'data_version' in df.attrs:
+        cleaned_df.attrs['data_version'] = f"{df.attrs['data_version']}-cleaned"
+    
     return cleaned_df, cleaning_report
 
+# 收入字符串格式，如"$92K"、"1.2M"、"45,000"
+INCOME_PATTERN = r'^\s*\$?\s*(?P<value>\d[\d,]*(?:\.\d+)?|\.\d+)\s*(?P<unit>[KkMm]?)\s*$'
+INCOME_MULTIPLIERS = {'': 1, 'K': 1e3, 'M': 1e6}
+
+def parse_income(income):
+    """
+    向量化解析收入列，支持货币符号、千分位和K/M单位后缀
+    
+    Args:
+        income (pd.Series): 原始收入列，可以混合数值和字符串
+    
+    Returns:
+        tuple: (解析后的浮点数收入列, 无法解析的原始值)
+    """
+    parsed = pd.to_numeric(income, errors='coerce').astype(float)
+    
+    # 只对无法直接转换为数值的字符串做正则解析
+    text_mask = parsed.isna() & income.notna()
+    if text_mask.any():
+        parts = income[text_mask].astype(str).str.extract(INCOME_PATTERN)
+        values = pd.to_numeric(parts['value'].str.replace(',', '', regex=False), errors='coerce')
+        multipliers = parts['unit'].str.upper().map(INCOME_MULTIPLIERS)
+        parsed.loc[text_mask] = values * multipliers
+    
+    unparseable = income[income.notna() & parsed.isna()]
+    return parsed, unparseable
+
 def clean_customer_data(df):
     """清理客户数据"""
     report = {}
@@ -103,28 +141,22 @@ def clean_customer_data(df):
         'description': '将不同格式的收入值转换为统一的数字格式。'
     }
     
-    # 记录清理前的数据
-    sample_incomes = df_copy['income'].sample(10).to_dict()
-    report[step]['before'] = pd.DataFrame({'收入样本': [f"{k}: {v}" for k, v in sample_incomes.items()]})
+    # 记录清理前的数据：加载时收入已转换为数值，文本格式的原始值记录在attrs中，
+    # 样本优先包含这些行以显示转换前的值
+    raw_incomes = dict(df_copy.attrs.get('raw_income', []))
+    text_rows = [k for k in raw_incomes if k in df_copy.index][:5]
+    other_incomes = df_copy['income'].drop(text_rows)
+    sample_incomes = {**df_copy.loc[text_rows, 'income'].to_dict(),
+                      **other_incomes.sample(min(10 - len(text_rows), len(other_incomes))).to_dict()}
+    report[step]['before'] = pd.DataFrame({'收入样本': [f"{k}: {raw_incomes.get(k, v)}" for k, v in sample_incomes.items()]})
     
-    # 处理收入格式
-    def clean_income(income):
-        if pd.isna(income):
-            return np.nan
-        if isinstance(income, (int, float)):
-            return income
-        # 处理字符串格式，如"$50K"
-        try:
-            income_str = str(income).strip()
-            if income_str.startswith('$'):
-                income_str = income_str[1:]
-            if income_str.upper().endswith('K'):
-                return float(income_str[:-1]) * 1000
-            return float(income_str)
-        except:
-            return np.nan
+    # 处理收入格式（向量化解析"$50K"、"1.2M"等格式）
+    df_copy['income'], unparseable_income = parse_income(df_copy['income'])
     
-    df_copy['income'] = df_copy['income'].apply(clean_income)
+    # 加载数据时已解析过收入，无法解析的原始值记录在attrs中
+    unparseable_values = list(df_copy.attrs.get('unparseable_income', [])) + unparseable_income.tolist()
+    if unparseable_values:
+        report[step]['description'] += f" 共有{len(unparseable_values)}个无法解析的收入值被设为空值: {unparseable_values[:10]}"
     
     # 处理异常高收入（根据分位数）
     q3 = df_copy['income'].quantile(0.75)
@@ -422,32 +454,19 @@ def clean_traffic_data(df):
     step = 1
     report[step] = {
         'title': '处理缺失的渠道数据',
-        'description': '使用同一天其他渠道的平均分布填充缺失的渠道流量数据。'
+        'description': '按各渠道在之前28条记录（有站点列时为同一站点内）中的平均流量占比分配缺失的渠道流量（总访问量减去已知渠道之和）；每日数据即过去28天，每小时数据即过去28小时。'
     }
     
     # 查找有缺失渠道数据的行
-    channels = ['organic_search', 'paid_search', 'social_media', 'email', 'direct', 'referral']
+    channels = TRAFFIC_CHANNELS
     missing_channels = df_copy[df_copy[channels].isna().any(axis=1)][['date', 'total_visits'] + channels].head(10)
     
     # 记录清理前的数据
     report[step]['before'] = missing_channels
     
-    # 填充缺失的渠道数据
-    for idx, row in df_copy[df_copy[channels].isna().any(axis=1)].iterrows():
-        # 计算已知渠道流量的总和
-        known_channels_sum = row[channels].sum(skipna=True)
-        # 计算缺失的流量总量
-        missing_traffic = row['total_visits'] - known_channels_sum
-        
-        # 计算缺失的渠道数量
-        missing_channels_mask = row[channels].isna()
-        missing_channels_count = missing_channels_mask.sum()
-        
-        if missing_channels_count > 0:
-            # 平均分配缺失流量到缺失的渠道
-            for channel in channels:
-                if pd.isna(row[channel]):
-                    df_copy.at[idx, channel] = missing_traffic / missing_channels_count
+    # 一次矩阵运算填充所有缺失的渠道数据，有站点列时在站点内计算占比
+    group_column = 'site' if 'site' in df_copy.columns else None
+    df_copy, _ = impute_channel_shares(df_copy, channels, group_column=group_column)
     
     # 记录清理后的数据
     report[step]['after'] = df_copy.loc[missing_channels.index][['date', 'total_visits'] + channels]
@@ -0,0 +1,102 @@
+import glob
+import gzip
+import importlib.util
+import os
+import tempfile
+import time
+
+# Parquet导出依赖pyarrow，如果不可用则只提供CSV格式；pyarrow 在导出Parquet时才导入
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# 每次写入的行数，控制导出过程中的内存占用
+DEFAULT_CHUNK_SIZE = 50000
+
+# 临时导出文件的名称前缀；超过保留时间的导出文件（例如会话中断后遗留的）在下一次导出时删除
+EXPORT_PREFIX = "globalmart_export_"
+EXPORT_MAX_AGE_SECONDS = 3600
+
+# 支持的导出格式
+EXPORT_FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "CSV (gzip压缩)": {"extension": "csv.gz", "mime": "application/gzip"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+def get_available_formats():
+    """返回当前环境可用的导出格式列表"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "Parquet" or PARQUET_AVAILABLE]
+
+def export_dataframe(df, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    将数据集分块写入临时文件，避免在内存中生成完整的导出字符串
+
+    Args:
+        df (pd.DataFrame): 要导出的数据集
+        export_format (str): 导出格式，取值见 EXPORT_FORMATS
+        chunk_size (int): 每块写入的行数
+
+    Returns:
+        str: 临时导出文件的路径
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}")
+    if export_format == "Parquet" and not PARQUET_AVAILABLE:
+        raise ValueError("导出Parquet格式需要安装pyarrow")
+
+    remove_stale_exports()
+    extension = EXPORT_FORMATS[export_format]["extension"]
+    fd, path = tempfile.mkstemp(suffix=f".{extension}", prefix=EXPORT_PREFIX)
+    os.close(fd)
+
+    try:
+        if export_format == "Parquet":
+            _write_parquet(df, path, chunk_size)
+        elif export_format == "CSV (gzip压缩)":
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+                _write_csv(df, f, chunk_size)
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                _write_csv(df, f, chunk_size)
+    except Exception:
+        # 导出失败时删除不完整的临时文件
+        os.remove(path)
+        raise
+
+    return path
+
+def _write_csv(df, f, chunk_size):
+    """按块写入CSV，只在第一块写入表头"""
+    if df.empty:
+        df.to_csv(f, index=False)
+        return
+    for start in range(0, len(df), chunk_size):
+        df.iloc[start:start + chunk_size].to_csv(f, header=(start == 0), index=False)
+
+def _write_parquet(df, path, chunk_size):
+    """按块写入Parquet，每块作为一个row group"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, max(len(df), 1), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def remove_export(path):
+    """删除之前生成的临时导出文件"""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def remove_stale_exports(max_age_seconds=EXPORT_MAX_AGE_SECONDS):
+    """删除临时目录中超过保留时间的导出文件"""
+    cutoff = time.time() - max_age_seconds
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), f"{EXPORT_PREFIX}*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
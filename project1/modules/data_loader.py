@@ -1,25 +1,33 @@
 import pandas as pd
+import numpy as np
 import streamlit as st
 import os
+import hashlib
+
+from modules.data_cleaner import parse_income
 
 @st.cache_data(ttl=3600, show_spinner=True)
-def load_data():
+def load_data(data_dir=None):
     """
     加载所有数据集并缓存，避免重复加载
     
+    Args:
+        data_dir (str): 数据文件目录，默认为项目的 data 目录
+    
     Returns:
         dict: 包含所有数据集的字典
     """
     try:
         # 获取当前脚本的绝对路径
         current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        data_dir = data_dir or os.path.join(current_dir, "data")
         
         # 数据文件路径
-        customers_path = os.path.join(current_dir, "data", "customers.csv")
-        products_path = os.path.join(current_dir, "data", "products.csv")
-        transactions_path = os.path.join(current_dir, "data", "transactions.csv")
-        marketing_path = os.path.join(current_dir, "data", "marketing_campaigns.csv")
-        traffic_path = os.path.join(current_dir, "data", "website_traffic.csv")
+        customers_path = os.path.join(data_dir, "customers.csv")
+        products_path = os.path.join(data_dir, "products.csv")
+        transactions_path = os.path.join(data_dir, "transactions.csv")
+        marketing_path = os.path.join(data_dir, "marketing_campaigns.csv")
+        traffic_path = os.path.join(data_dir, "website_traffic.csv")
         
         # 加载数据
         with st.spinner("正在加载数据..."):
@@ -55,6 +63,26 @@ def load_data():
                         except:
                             pass
             
+            # 统一收入格式，只在加载时解析一次，分析页面直接使用数值收入
+            if 'income' in customers_df.columns:
+                raw_income = customers_df['income']
+                customers_df['income'], unparseable_income = parse_income(raw_income)
+                customers_df.attrs['unparseable_income'] = unparseable_income.tolist()
+                # 以文本格式（如"$92K"）保存的原始收入记为 [行号, 原始值]，清理报告据此显示清理前的值
+                text_income = raw_income[raw_income.notna() & pd.to_numeric(raw_income, errors='coerce').isna()]
+                customers_df.attrs['raw_income'] = list(zip(text_income.index.tolist(), text_income.astype(str).tolist()))
+            
+            # 根据源文件的大小和修改时间为每个数据集标记数据版本
+            for df, path in [
+                (customers_df, customers_path),
+                (products_df, products_path),
+                (transactions_df, transactions_path),
+                (marketing_df, marketing_path),
+                (traffic_df, traffic_path)
+            ]:
+                file_stat = os.stat(path)
+                df.attrs['data_version'] = _short_hash(f"{path}:{file_stat.st_size}:{file_stat.st_mtime_ns}")
+            
             # 返回数据集字典
             return {
                 "customers": customers_df,
@@ -96,4 +124,53 @@ def load_single_dataset(dataset_name):
             return None
     except Exception as e:
         st.error(f"加载 {dataset_name} 数据时出错: {str(e)}")
-        return None 
\ No newline at end of file
+        return None 
+
+# 获取数据版本
+def get_data_version(data):
+    """
+    获取数据集的版本标识，用于缓存和增量计算
+    
+    Args:
+        data (pd.DataFrame | dict): 单个数据集或包含多个数据集的字典
+    
+    Returns:
+        str: 数据版本标识
+    """
+    if isinstance(data, dict):
+        return _short_hash("|".join(f"{key}={get_data_version(df)}" for key, df in sorted(data.items())))
+    
+    # 加载时已标记版本的数据集直接使用，否则根据内容计算
+    version = data.attrs.get('data_version')
+    if version is None:
+        content_hash = pd.util.hash_pandas_object(data, index=False).values
+        version = _short_hash(f"{list(data.columns)}:{hashlib.md5(content_hash.tobytes()).hexdigest()}")
+    return version
+
+def get_sample_fingerprint(df, rows=256):
+    """
+    按等间隔抽取的若干行（包含第一行和最后一行）计算内容指纹
+    
+    只读取抽取的行，开销与数据量无关，用于廉价地判断数据是否被修改，例如派生的数据
+    或追加前的部分是否与之前相同；不能发现未被抽到的行的修改。
+    
+    Args:
+        df (pd.DataFrame): 数据集
+        rows (int): 抽取的行数
+    
+    Returns:
+        str: 内容指纹，包含行数和列名
+    """
+    positions = np.linspace(0, len(df) - 1, min(len(df), rows)).astype(int)
+    sample_hash = pd.util.hash_pandas_object(df.iloc[positions], index=False, categorize=False).values
+    return _short_hash(f"{len(df)}:{list(df.columns)}:{hashlib.md5(sample_hash.tobytes()).hexdigest()}")
+
+def month_labels(dates):
+    """返回日期对应的 'YYYY-MM' 月份标签，只对不同的日期格式化一次"""
+    codes, uniques = pd.factorize(dates)
+    labels = pd.Index(uniques).strftime('%Y-%m').to_numpy(dtype=object)
+    # 空日期的编码为-1，对应空标签
+    return np.where(codes >= 0, labels[codes] if len(labels) else None, None)
+
+def _short_hash(text):
+    return hashlib.md5(text.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,280 @@
+import re
+import threading
+
+import pandas as pd
+
+from modules.data_loader import get_data_version
+
+# 数据集的检查顺序，被外键引用的数据集需要先检查
+DATASET_ORDER = ['customers', 'products', 'transactions', 'marketing', 'traffic']
+
+ISO_DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}$'
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+TRAFFIC_CHANNELS = ['organic_search', 'paid_search', 'social_media', 'email', 'direct', 'referral']
+
+# 各数据集的声明式质量规则
+# type 取值:
+#   not_null    - 列不能为空
+#   range       - 数值在 [min, max] 范围内
+#   format      - 字符串匹配正则表达式（日期类型的列检查是否成功解析）
+#   numeric     - 值可以直接转换为数值
+#   unique      - 列值唯一（跨批次累计检查）
+#   foreign_key - 列值必须存在于被引用数据集的列中
+#   expression  - 跨列表达式，使用 DataFrame.eval 计算，结果为True表示通过
+DEFAULT_EXPECTATIONS = {
+    'customers': [
+        {'name': '客户ID唯一', 'type': 'unique', 'column': 'customer_id'},
+        {'name': '年龄在合理范围', 'type': 'range', 'column': 'age', 'min': 0, 'max': 100},
+        {'name': '年龄不为空', 'type': 'not_null', 'column': 'age'},
+        {'name': '收入为正数', 'type': 'range', 'column': 'income', 'min': 0},
+        {'name': '邮箱格式正确', 'type': 'format', 'column': 'email', 'pattern': EMAIL_PATTERN},
+    ],
+    'products': [
+        {'name': '产品ID唯一', 'type': 'unique', 'column': 'product_id'},
+        {'name': '产品ID格式', 'type': 'format', 'column': 'product_id', 'pattern': r'^PROD\d{5}$'},
+        {'name': '价格非负', 'type': 'range', 'column': 'current_price', 'min': 0},
+        {'name': '评分不为空', 'type': 'not_null', 'column': 'rating'},
+        {'name': '重量不为空', 'type': 'not_null', 'column': 'weight_kg'},
+    ],
+    'transactions': [
+        {'name': '交易ID格式', 'type': 'format', 'column': 'transaction_id', 'pattern': r'^TRX\d{6}$'},
+        {'name': '交易日期格式', 'type': 'format', 'column': 'date', 'pattern': ISO_DATE_PATTERN},
+        {'name': '单价非负', 'type': 'range', 'column': 'unit_price', 'min': 0},
+        {'name': '客户ID存在', 'type': 'foreign_key', 'column': 'customer_id',
+         'reference': ('customers', 'customer_id')},
+        {'name': '产品ID存在', 'type': 'foreign_key', 'column': 'product_id',
+         'reference': ('products', 'product_id')},
+    ],
+    'marketing': [
+        {'name': '活动ID唯一', 'type': 'unique', 'column': 'campaign_id'},
+        {'name': 'ROI为数值', 'type': 'numeric', 'column': 'roi'},
+        {'name': '渠道不为空', 'type': 'not_null', 'column': 'channel'},
+        {'name': '支出不超过预算110%', 'type': 'expression', 'expression': 'spend <= budget * 1.1'},
+    ],
+    'traffic': [
+        {'name': '渠道数据完整', 'type': 'not_null', 'column': TRAFFIC_CHANNELS},
+        {'name': '总访问量等于各渠道之和', 'type': 'expression',
+         'expression': 'abs(total_visits - (' + ' + '.join(TRAFFIC_CHANNELS) + ')) <= 1'},
+        {'name': '跳出率在0-1之间', 'type': 'range', 'column': 'bounce_rate', 'min': 0, 'max': 1},
+    ],
+}
+
+class DataQualityMonitor:
+    """
+    增量数据质量监控
+    
+    每个数据集记录已检查的行数，新版本的数据只检查新增的行（假设数据只追加），
+    并按数据版本累计各规则的违规数量。唯一性和外键规则在内存中保存已见过的键值，
+    因此每次检查的开销只和新增行数成正比。
+    """
+    
+    def __init__(self, expectations=None):
+        self.expectations = expectations if expectations is not None else DEFAULT_EXPECTATIONS
+        self._state = {}
+        # 监控器可能被多个会话共享
+        self._lock = threading.RLock()
+    
+    def _get_state(self, dataset):
+        if dataset not in self._state:
+            self._state[dataset] = {
+                'rows_checked': 0,
+                'last_version': None,
+                'totals': {exp['name']: 0 for exp in self.expectations.get(dataset, [])},
+                'history': [],
+                'seen_keys': {},
+            }
+        return self._state[dataset]
+    
+    def reset(self, dataset):
+        """清空数据集的检查状态，数据被整体替换时使用"""
+        self._state.pop(dataset, None)
+    
+    def observe(self, dataset, df, data_version=None):
+        """
+        检查数据集中自上次检查以来新增的行
+        
+        Args:
+            dataset (str): 数据集名称
+            df (pd.DataFrame): 当前版本的完整数据集
+            data_version (str): 数据版本，默认从数据集中读取
+        
+        Returns:
+            dict: 本次新增行的各规则违规数量
+        """
+        data_version = data_version or get_data_version(df)
+        with self._lock:
+            state = self._get_state(dataset)
+            
+            if state['last_version'] == data_version:
+                return {}
+            
+            # 数据行数变少说明数据被替换而不是追加，需要重新检查全部数据
+            if len(df) < state['rows_checked']:
+                self.reset(dataset)
+                state = self._get_state(dataset)
+            
+            new_rows = df.iloc[state['rows_checked']:]
+            return self.observe_batch(dataset, new_rows, data_version)
+    
+    def observe_batch(self, dataset, new_rows, data_version):
+        """
+        检查一批新增的行并累计违规数量
+        
+        Args:
+            dataset (str): 数据集名称
+            new_rows (pd.DataFrame): 新增的行
+            data_version (str): 加入这批数据后的数据版本
+        
+        Returns:
+            dict: 这批数据的各规则违规数量
+        """
+        with self._lock:
+            return self._observe_batch(dataset, new_rows, data_version)
+    
+    def _observe_batch(self, dataset, new_rows, data_version):
+        state = self._get_state(dataset)
+        violations = {}
+        
+        for expectation in self.expectations.get(dataset, []):
+            mask = self._evaluate(dataset, expectation, new_rows)
+            violations[expectation['name']] = int(mask.sum())
+            state['totals'][expectation['name']] += violations[expectation['name']]
+        
+        # 记录被其他数据集外键引用的键值
+        for column in self._referenced_columns(dataset):
+            if column in new_rows.columns:
+                self._add_seen_keys(dataset, column, new_rows[column])
+        
+        state['rows_checked'] += len(new_rows)
+        state['last_version'] = data_version
+        state['history'].append({
+            'data_version': data_version,
+            'new_rows': len(new_rows),
+            'total_rows': state['rows_checked'],
+            'violations': violations,
+            'cumulative': dict(state['totals']),
+        })
+        return violations
+    
+    def _seen_keys(self, dataset, column):
+        state = self._get_state(dataset)
+        return state['seen_keys'].get(column, pd.Index([]))
+    
+    def _add_seen_keys(self, dataset, column, values):
+        """把一批值中没有见过的键追加到已见键值的索引中"""
+        state = self._get_state(dataset)
+        keys = pd.Index(values.dropna().unique())
+        seen = state['seen_keys'].get(column)
+        state['seen_keys'][column] = keys if seen is None else seen.append(keys[~keys.isin(seen)])
+    
+    def _referenced_columns(self, dataset):
+        columns = set()
+        for expectations in self.expectations.values():
+            for expectation in expectations:
+                if expectation['type'] == 'foreign_key' and expectation['reference'][0] == dataset:
+                    columns.add(expectation['reference'][1])
+        return columns
+    
+    def _evaluate(self, dataset, expectation, df):
+        """计算单条规则的违规掩码，True表示违规"""
+        if df.empty:
+            return pd.Series(False, index=df.index)
+        
+        rule_type = expectation['type']
+        
+        if rule_type == 'expression':
+            return evaluate_expression(df, expectation['expression'])
+        
+        columns = expectation['column'] if isinstance(expectation['column'], list) else [expectation['column']]
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            # 缺少规则所需的列时，所有行都视为违规
+            return pd.Series(True, index=df.index)
+        
+        if rule_type == 'not_null':
+            return df[columns].isna().any(axis=1)
+        
+        values = df[columns[0]]
+        
+        if rule_type == 'range':
+            numeric = pd.to_numeric(values, errors='coerce')
+            mask = pd.Series(False, index=df.index)
+            if 'min' in expectation:
+                mask |= numeric < expectation['min']
+            if 'max' in expectation:
+                mask |= numeric > expectation['max']
+            return mask
+        
+        if rule_type == 'format':
+            # 日期列在加载时已经解析，无法解析的日期为NaT
+            if pd.api.types.is_datetime64_any_dtype(values):
+                return values.isna()
+            return values.notna() & ~values.astype(str).str.match(expectation['pattern'])
+        
+        if rule_type == 'numeric':
+            return values.notna() & pd.to_numeric(values, errors='coerce').isna()
+        
+        if rule_type == 'unique':
+            duplicated_in_batch = values.duplicated(keep='first') & values.notna()
+            seen_before = values.isin(self._seen_keys(dataset, columns[0]))
+            self._add_seen_keys(dataset, columns[0], values)
+            return duplicated_in_batch | seen_before
+        
+        if rule_type == 'foreign_key':
+            ref_dataset, ref_column = expectation['reference']
+            return values.notna() & ~values.isin(self._seen_keys(ref_dataset, ref_column))
+        
+        raise ValueError(f"未知的规则类型: {rule_type}")
+    
+    def get_summary(self, dataset):
+        """
+        获取数据集各规则的最新和累计违规数量
+        
+        Returns:
+            pd.DataFrame: 规则汇总表
+        """
+        state = self._get_state(dataset)
+        latest = state['history'][-1]['violations'] if state['history'] else {}
+        rows = []
+        for expectation in self.expectations.get(dataset, []):
+            name = expectation['name']
+            rows.append({
+                '规则': name,
+                '类型': expectation['type'],
+                '最新批次违规数': latest.get(name, 0),
+                '累计违规数': state['totals'][name],
+                '累计违规比例 (%)': round(state['totals'][name] / state['rows_checked'] * 100, 2) if state['rows_checked'] else 0,
+            })
+        return pd.DataFrame(rows)
+    
+    def get_history(self, dataset):
+        """
+        获取数据集按数据版本记录的检查历史
+        
+        Returns:
+            pd.DataFrame: 每个数据版本一行，包含新增行数和各规则的累计违规数量
+        """
+        state = self._get_state(dataset)
+        rows = []
+        for record in state['history']:
+            row = {'数据版本': record['data_version'], '新增行数': record['new_rows'], '总行数': record['total_rows']}
+            row.update(record['cumulative'])
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+def evaluate_expression(df, expression):
+    """
+    向量化计算跨列表达式，返回违规掩码
+    
+    表达式中引用的列存在空值的行不参与检查（空值由not_null规则负责）。
+    """
+    referenced = [col for col in set(re.findall(r'[A-Za-z_]\w*', expression)) if col in df.columns]
+    result = df.eval(expression)
+    has_null = df[referenced].isna().any(axis=1) if referenced else pd.Series(False, index=df.index)
+    return ~result.astype(bool) & ~has_null
+
+def check_all_datasets(monitor, data):
+    """按依赖顺序增量检查所有数据集"""
+    for dataset in DATASET_ORDER:
+        if dataset in data:
+            monitor.observe(dataset, data[dataset])
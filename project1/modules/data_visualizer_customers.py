@@ -4,43 +4,40 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+from modules.chart_rendering import scatter_3d_chart, scatter_chart
+from modules.compute.customers import add_recency_features
+from modules.customer_360 import get_customer_360
+from modules.figure_cache import cached_figure
+from modules.sales_cube import get_sales_cube, query_cube
+from modules.top_k import CUSTOMER_RANK_METRICS, get_customer_top_k
+from modules.utils import fragment
+
 def create_customer_dashboard(data):
     """客户分析仪表板"""
     st.subheader("客户分析")
     
-    # 准备数据
-    customers_df = data["customers"]
-    transactions_df = data["transactions"]
-    
-    # 合并交易数据和客户数据
-    customer_transactions = transactions_df.merge(
-        customers_df[['customer_id', 'region', 'country', 'segment']], 
-        on='customer_id', 
-        how='left'
-    )
-    
-    # 计算每个客户的消费金额
-    customer_spending = customer_transactions.groupby('customer_id')['total_amount'].sum().reset_index()
-    customer_spending = customer_spending.merge(
-        customers_df[['customer_id', 'segment', 'region', 'age', 'gender', 'income']], 
-        on='customer_id', 
-        how='left'
-    )
+    # 准备数据：分组汇总从预先汇总的销售立方体中查询，每位客户的汇总使用各客户页面共用的 Customer-360 表
+    cube = get_sales_cube(data)
+    customer_metrics = get_customer_360(data)
     
-    # 计算区域消费分布
-    region_spending = customer_transactions.groupby('region')['total_amount'].sum().reset_index()
-    
-    # 计算客户细分消费分布
-    segment_spending = customer_transactions.groupby('segment')['total_amount'].sum().reset_index()
+    # 图表只依赖交易和客户数据，数据版本不变时直接使用缓存的图表
+    chart_data = {'transactions': data["transactions"], 'customers': data["customers"]}
     
     # 图表1: 按区域的消费分布
-    fig1 = px.pie(region_spending, values='total_amount', names='region',
-                 title='按区域的消费分布')
+    def build_region_chart():
+        region_spending = query_cube(cube, ['region']).rename(columns={'revenue': 'total_amount'})
+        return px.pie(region_spending, values='total_amount', names='region',
+                     title='按区域的消费分布')
     
     # 图表2: 按客户细分的消费分布
-    fig2 = px.bar(segment_spending, x='segment', y='total_amount',
-                 title='按客户细分的消费分布',
-                 labels={'segment': '客户细分', 'total_amount': '消费金额'})
+    def build_segment_chart():
+        segment_spending = query_cube(cube, ['segment']).rename(columns={'revenue': 'total_amount'})
+        return px.bar(segment_spending, x='segment', y='total_amount',
+                     title='按客户细分的消费分布',
+                     labels={'segment': '客户细分', 'total_amount': '消费金额'})
+    
+    fig1 = cached_figure('customers/region_spending', chart_data, build_region_chart)
+    fig2 = cached_figure('customers/segment_spending', chart_data, build_segment_chart)
     
     # 布局
     col1, col2 = st.columns(2)
@@ -50,15 +47,17 @@ def create_customer_dashboard(data):
     with col2:
         st.plotly_chart(fig2, use_container_width=True)
     
-    # 图表3: 消费金额与年龄的关系
-    fig3 = px.scatter(customer_spending, x='age', y='total_amount', color='gender',
-                     title='消费金额与年龄的关系',
-                     labels={'age': '年龄', 'total_amount': '消费金额', 'gender': '性别'})
+    # 图表3: 消费金额与年龄的关系（客户数量较多时使用WebGL或密度图）
+    fig3 = cached_figure('customers/spending_by_age', chart_data, lambda: scatter_chart(
+        customer_metrics, x='age', y='total_amount', color='gender',
+        title='消费金额与年龄的关系',
+        labels={'age': '年龄', 'total_amount': '消费金额', 'gender': '性别'}))
     
     # 图表4: 消费金额与收入的关系
-    fig4 = px.scatter(customer_spending, x='income', y='total_amount', color='segment',
-                     title='消费金额与收入的关系',
-                     labels={'income': '收入', 'total_amount': '消费金额', 'segment': '客户细分'})
+    fig4 = cached_figure('customers/spending_by_income', chart_data, lambda: scatter_chart(
+        customer_metrics, x='income', y='total_amount', color='segment',
+        title='消费金额与收入的关系',
+        labels={'income': '收入', 'total_amount': '消费金额', 'segment': '客户细分'}))
     
     col1, col2 = st.columns(2)
     with col1:
@@ -70,25 +69,8 @@ def create_customer_dashboard(data):
     # 添加客户互动部分
     st.subheader("客户消费分布")
     
-    # 计算每个客户的消费金额
-    customer_order_counts = customer_transactions.groupby('customer_id')['transaction_id'].nunique().reset_index()
-    customer_order_counts.columns = ['customer_id', 'order_count']
-    
-    # 合并消费金额和订单数量
-    customer_metrics = customer_spending.merge(customer_order_counts, on='customer_id', how='left')
-    
-    # 添加平均订单金额
-    customer_metrics['avg_order_value'] = customer_metrics['total_amount'] / customer_metrics['order_count']
-    
-    # 顶部和底部客户
-    top_customers = customer_metrics.sort_values('total_amount', ascending=False).head(10)
-    bottom_customers = customer_metrics.sort_values('total_amount').head(10)
-    
-    st.subheader("消费最高的10位客户")
-    st.dataframe(top_customers[['customer_id', 'total_amount', 'order_count', 'avg_order_value', 'segment']])
-    
-    st.subheader("消费最低的10位客户")
-    st.dataframe(bottom_customers[['customer_id', 'total_amount', 'order_count', 'avg_order_value', 'segment']])
+    # 客户排名部分包含控件，放在独立的片段中，切换排名指标或细分时只重新运行该部分
+    _render_customer_ranking(data, customer_metrics)
     
     # RFM分析图
     st.subheader("客户RFM分析")
@@ -97,21 +79,50 @@ def create_customer_dashboard(data):
     # R (Recency): 最近一次购买的时间
     # F (Frequency): 购买频率
     # M (Monetary): 消费金额
+    today = pd.to_datetime('today').normalize()
+    
+    def build_rfm_chart():
+        # 计算最近一次购买距今的天数
+        rfm_data = add_recency_features(customer_metrics, today)
+        
+        # 创建RFM散点图，客户数量超过上限时按细分抽样
+        return scatter_3d_chart(rfm_data, x='recency', y='order_count', z='total_amount',
+                                color='segment', size='total_amount',
+                                title='RFM客户分析',
+                                labels={'recency': '最近购买天数', 'order_count': '购买频率', 'total_amount': '消费金额'},
+                                opacity=0.7)
+    
+    # 最近购买天数随日期变化，每天重新构建一次
+    fig5 = cached_figure('customers/rfm', chart_data, build_rfm_chart, params={'today': today})
+    
+    st.plotly_chart(fig5, use_container_width=True) 
+
+@fragment
+def _render_customer_ranking(data, customer_metrics):
+    """
+    消费最高和最低的客户排名，依赖客户汇总表
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        customer_metrics (pd.DataFrame): Customer-360 表
+    """
+    # 在客户汇总上部分选择前K名，不对全部客户排序
+    top_k = get_customer_top_k(data)
+    col1, col2 = st.columns(2)
+    with col1:
+        rank_metric = st.selectbox("排名指标", options=list(CUSTOMER_RANK_METRICS),
+                                   format_func=CUSTOMER_RANK_METRICS.get, key="customer_rank_metric")
+    with col2:
+        segments = sorted(customer_metrics['segment'].dropna().unique()) if 'segment' in customer_metrics.columns else []
+        rank_segments = st.multiselect("客户细分（不选表示全部）", segments, key="customer_rank_segments")
     
-    # 计算最近一次购买时间
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-    latest_purchase = transactions_df.groupby('customer_id')['date'].max().reset_index()
-    latest_purchase.columns = ['customer_id', 'latest_purchase']
-    latest_purchase['recency'] = (pd.to_datetime('today') - latest_purchase['latest_purchase']).dt.days
-    
-    # 合并RFM数据
-    rfm_data = customer_metrics.merge(latest_purchase[['customer_id', 'recency']], on='customer_id', how='left')
+    rank_filters = {'segment': rank_segments} if rank_segments else None
+    top_customers = top_k.top(10, rank_metric, rank_filters)
+    bottom_customers = top_k.top(10, rank_metric, rank_filters, ascending=True)
+    metric_label = CUSTOMER_RANK_METRICS[rank_metric]
     
-    # 创建RFM散点图
-    fig5 = px.scatter_3d(rfm_data, x='recency', y='order_count', z='total_amount',
-                        color='segment', size='total_amount',
-                        title='RFM客户分析',
-                        labels={'recency': '最近购买天数', 'order_count': '购买频率', 'total_amount': '消费金额'},
-                        opacity=0.7)
+    st.subheader(f"{metric_label}最高的10位客户")
+    st.dataframe(top_customers[['customer_id', 'total_amount', 'order_count', 'avg_order_value', 'segment']])
     
-    st.plotly_chart(fig5, use_container_width=True) 
\ No newline at end of file
+    st.subheader(f"{metric_label}最低的10位客户")
+    st.dataframe(bottom_customers[['customer_id', 'total_amount', 'order_count', 'avg_order_value', 'segment']])
@@ -1,71 +1,64 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from modules.compute.marketing import compute_marketing_overview
+from modules.figure_cache import plotly_chart
+from modules.result_cache import memoize
+
+@memoize('marketing_overview', datasets=['marketing'])
+def _marketing_overview(data):
+    return compute_marketing_overview(data["marketing"])
+
 def create_marketing_dashboard(data):
     """创建营销效果仪表板"""
     st.subheader("营销效果分析")
     
     # 准备数据
-    marketing_df = data["marketing"]
+    try:
+        overview = _marketing_overview(data)
+    except Exception as e:
+        st.error(f"汇总营销数据时出错: {str(e)}")
+        return None
     
     try:
         # 创建渠道分布图
-        if 'channel' in marketing_df.columns:
-            channel_counts = marketing_df['channel'].value_counts().reset_index()
-            channel_counts.columns = ['channel', 'count']
-            
-            fig = px.pie(channel_counts, values='count', names='channel',
+        if overview.channel_counts is not None:
+            fig = px.pie(overview.channel_counts, values='count', names='channel',
                         title='营销渠道分布')
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'marketing/channel_distribution', use_container_width=True)
     except Exception as e:
         st.error(f"创建营销渠道分布图时出错: {str(e)}")
     
     try:
         # 创建支出和转化图
-        if all(col in marketing_df.columns for col in ['spend', 'conversions', 'channel']):
-            channel_metrics = marketing_df.groupby('channel').agg({
-                'spend': 'sum',
-                'conversions': 'sum'
-            }).reset_index()
-            
-            fig = px.bar(channel_metrics, x='channel', y=['spend', 'conversions'],
+        if overview.channel_metrics is not None:
+            fig = px.bar(overview.channel_metrics, x='channel', y=['spend', 'conversions'],
                         title='各渠道支出和转化',
                         barmode='group',
                         labels={'channel': '渠道', 'value': '数值', 'variable': '指标'})
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'marketing/channel_spend_conversions', use_container_width=True)
     except Exception as e:
         st.error(f"创建营销支出和转化图时出错: {str(e)}")
     
     try:
-        # 计算ROI
-        if all(col in marketing_df.columns for col in ['spend', 'revenue', 'channel']):
-            roi_df = marketing_df.groupby('channel').agg({
-                'spend': 'sum',
-                'revenue': 'sum'
-            }).reset_index()
-            
-            roi_df['roi'] = (roi_df['revenue'] - roi_df['spend']) / roi_df['spend']
-            
-            fig = px.bar(roi_df, x='channel', y='roi',
+        # 各渠道ROI
+        if overview.channel_roi is not None:
+            fig = px.bar(overview.channel_roi, x='channel', y='roi',
                         title='各渠道营销ROI',
                         labels={'channel': '渠道', 'roi': 'ROI'})
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'marketing/channel_roi', use_container_width=True)
     except Exception as e:
         st.error(f"创建营销ROI图时出错: {str(e)}")
     
     try:
         # 时间趋势分析
-        if all(col in marketing_df.columns for col in ['date', 'spend', 'conversions']):
-            time_trend = marketing_df.groupby('date').agg({
-                'spend': 'sum',
-                'conversions': 'sum'
-            }).reset_index()
+        if overview.time_trend is not None:
+            time_trend = overview.time_trend
             
             fig = make_subplots(specs=[[{"secondary_y": True}]])
             
@@ -84,7 +77,7 @@ def create_marketing_dashboard(data):
             fig.update_yaxes(title_text="支出", secondary_y=False)
             fig.update_yaxes(title_text="转化", secondary_y=True)
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'marketing/spend_conversion_trend', use_container_width=True)
     except Exception as e:
         st.error(f"创建营销趋势图时出错: {str(e)}")
     
@@ -4,6 +4,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from modules.figure_cache import plotly_chart
+
 def create_product_dashboard(data):
     """创建产品分析仪表板"""
     st.subheader("产品分析")
@@ -21,7 +23,7 @@ def create_product_dashboard(data):
                         title='产品类别分布',
                         labels={'category': '类别', 'count': '产品数量'})
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'products/category_distribution', use_container_width=True)
     except Exception as e:
         st.error(f"创建产品类别分布图时出错: {str(e)}")
     
@@ -32,7 +34,7 @@ def create_product_dashboard(data):
                               title='产品价格分布',
                               labels={'current_price': '价格', 'count': '产品数量'})
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'products/price_distribution', use_container_width=True)
     except Exception as e:
         st.error(f"创建产品价格分布图时出错: {str(e)}")
     
@@ -43,7 +45,7 @@ def create_product_dashboard(data):
                              title='产品库存分布',
                              labels={'inventory': '库存量', 'count': '产品数量'})
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'products/stock_distribution', use_container_width=True)
     except Exception as e:
         st.error(f"创建产品库存分布图时出错: {str(e)}")
     
@@ -54,7 +56,7 @@ def create_product_dashboard(data):
                        title='各类别产品评分分布',
                        labels={'category': '类别', 'rating': '评分'})
             
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'products/rating_by_category', use_container_width=True)
     except Exception as e:
         st.error(f"创建产品评分分析图时出错: {str(e)}")
     
@@ -5,82 +5,144 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from modules.chart_rendering import line_chart
+from modules.cross_filter import PLOTLY_SELECTION_AVAILABLE, get_cross_filter_index, selected_values
+from modules.data_loader import get_data_version
+from modules.figure_cache import cached_figure, plotly_chart
+from modules.metrics import METRICS, display_metrics
+from modules.sales_cube import daily_series, get_sales_cube, query_date_range
+from modules.sampling import format_interval, get_approximate_fraction, get_stratified_sample
+from modules.utils import fragment
+
 def create_sales_dashboard(data):
     """销售概览仪表板"""
     st.subheader("销售概览")
     
-    # 准备数据
-    transactions_df = data["transactions"]
+    # 近似查询模式：基于分层样本估计，不构建销售立方体；需要时再计算精确结果
+    if not render_approximate_overview(data):
+        return
     
-    # 确保日期格式正确
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'])
+    # 准备数据：所有图表都从预先汇总的销售立方体中查询
+    cube = get_sales_cube(data)
     
-    # 按日期汇总销售数据
-    daily_sales = transactions_df.groupby('date')['total_amount'].sum().reset_index()
-    daily_sales['month'] = daily_sales['date'].dt.strftime('%Y-%m')
+    # 图表只依赖交易和客户数据，数据版本不变时直接使用缓存的图表
+    chart_data = {'transactions': data["transactions"], 'customers': data["customers"]}
     
-    # 月度销售趋势
-    monthly_sales = daily_sales.groupby('month')['total_amount'].sum().reset_index()
+    # 页面分为三个部分，交叉筛选图表和日期筛选部分包含控件，分别放在独立的片段中：
+    # 点击图表或修改日期范围时只重新运行对应的片段，其他部分不会重新计算
+    _render_sales_overview(data, chart_data)
+    _render_sales_kpis(data)
+    _render_date_range_section(data, cube['daily'], chart_data)
+
+# 交叉筛选图表：(维度, 图表ID, 标题, 坐标轴名称)
+CROSS_FILTER_CHARTS = [
+    ('month', 'sales/xf_monthly_sales', '月度销售趋势', '月份'),
+    ('payment_method', 'sales/xf_payment_sales', '按支付方式的销售额', '支付方式'),
+    ('device', 'sales/xf_device_sales', '按设备类型的销售额', '设备类型'),
+    ('product_category', 'sales/xf_category_sales', '按产品类别的销售额', '产品类别'),
+]
+
+# 交叉筛选的选择保存在会话状态中
+CROSS_FILTER_STATE_KEY = 'sales_cross_filter'
+
+@fragment
+def _render_sales_overview(data, chart_data):
+    """
+    可交叉筛选的销售概览图表
     
-    # 创建时间序列图表
-    fig1 = px.line(monthly_sales, x='month', y='total_amount', 
-                  title='月度销售趋势',
-                  labels={'month': '月份', 'total_amount': '销售额'})
+    点击（或框选）任一图表中的类别后，其他图表只汇总所选类别的数据；每个图表不按
+    自身的选择筛选，以便继续切换。筛选由位图索引计算，点击时只重新运行本片段。
     
-    # 创建按支付方式的销售额饼图
-    payment_sales = transactions_df.groupby('payment_method')['total_amount'].sum().reset_index()
-    fig2 = px.pie(payment_sales, values='total_amount', names='payment_method', 
-                 title='按支付方式的销售额分布')
+    Args:
+        data (dict): 包含所有数据集的字典
+        chart_data (dict): 确定图表数据版本的数据集
+    """
+    index = get_cross_filter_index(data)
+    selections = st.session_state.setdefault(CROSS_FILTER_STATE_KEY, {})
     
-    # 创建按设备类型的销售额柱状图
-    device_sales = transactions_df.groupby('device')['total_amount'].sum().reset_index()
-    fig3 = px.bar(device_sales, x='device', y='total_amount', 
-                 title='按设备类型的销售额',
-                 labels={'device': '设备类型', 'total_amount': '销售额'})
+    if PLOTLY_SELECTION_AVAILABLE:
+        st.caption("点击图表中的类别可以筛选其他图表，双击图表空白处取消该图表的选择")
+    if selections:
+        labels = {dim: axis_title for dim, _, _, axis_title in CROSS_FILTER_CHARTS}
+        active = "；".join(f"{labels.get(dim, dim)}: {', '.join(map(str, values))}" for dim, values in selections.items())
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            totals = index.totals(selections)
+            st.write(f"**当前筛选** {active}（销售额 ¥{totals['revenue']:,.2f}）")
+        with col2:
+            st.button("清除筛选", on_click=selections.clear, key="sales_cross_filter_clear")
     
-    # 创建按产品类别的销售额柱状图
-    category_sales = transactions_df.groupby('product_category')['total_amount'].sum().reset_index()
-    fig4 = px.bar(category_sales, x='product_category', y='total_amount', 
-                 title='按产品类别的销售额',
-                 labels={'product_category': '产品类别', 'total_amount': '销售额'})
+    figures = []
+    for dim, chart_id, title, axis_title in CROSS_FILTER_CHARTS:
+        def build(dim=dim, title=title, axis_title=axis_title):
+            aggregated = index.aggregate(dim, selections).rename(columns={'revenue': 'total_amount'})
+            return _cross_filter_figure(aggregated, dim, title, axis_title, selections.get(dim, []))
+        
+        # 同一筛选组合的图表只构建一次
+        figures.append((dim, cached_figure(chart_id, chart_data, build, params={'selections': selections})))
     
-    # 布局
+    # 布局：左列为趋势和设备，右列为支付方式和产品类别
     col1, col2 = st.columns(2)
-    with col1:
-        st.plotly_chart(fig1, use_container_width=True)
-        st.plotly_chart(fig3, use_container_width=True)
+    for position, (dim, fig) in zip((0, 1, 0, 1), figures):
+        with (col1 if position == 0 else col2):
+            _plotly_chart_with_selection(fig, dim, selections)
+
+def _cross_filter_figure(aggregated, dim, title, axis_title, selected):
+    """绘制交叉筛选图表，所选类别高亮显示"""
+    labels = {dim: axis_title, 'total_amount': '销售额'}
+    if dim == 'month':
+        fig = px.line(aggregated, x=dim, y='total_amount', title=title, labels=labels, markers=True)
+    else:
+        fig = px.bar(aggregated, x=dim, y='total_amount', title=title, labels=labels)
+    if selected:
+        colors = ['#EF553B' if value in selected else '#636EFA' for value in aggregated[dim]]
+        fig.update_traces(marker_color=colors)
+    return fig
+
+def _plotly_chart_with_selection(fig, dim, selections):
+    """显示图表，支持选择事件时把所选类别写入交叉筛选状态"""
+    if not PLOTLY_SELECTION_AVAILABLE:
+        st.plotly_chart(fig, use_container_width=True)
+        return
+    
+    key = f"sales_cross_filter_{dim}"
     
-    with col2:
-        st.plotly_chart(fig2, use_container_width=True)
-        st.plotly_chart(fig4, use_container_width=True)
+    def on_select():
+        values = selected_values(st.session_state.get(key))
+        if values:
+            selections[dim] = values
+        else:
+            selections.pop(dim, None)
     
-    # 添加关键指标卡片
+    st.plotly_chart(fig, use_container_width=True, key=key, on_select=on_select,
+                    selection_mode=('points', 'box'))
+
+def _render_sales_kpis(data):
+    """销售关键指标卡片"""
     st.subheader("销售关键指标")
     
-    # 计算关键指标
-    total_sales = transactions_df['total_amount'].sum()
-    avg_order_value = transactions_df.groupby('transaction_id')['total_amount'].sum().mean()
-    total_orders = transactions_df['transaction_id'].nunique()
-    completed_orders = transactions_df[transactions_df['status'] == 'Completed']['transaction_id'].nunique()
-    completion_rate = completed_orders / total_orders if total_orders > 0 else 0
-    
-    # 显示指标卡片
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("总销售额", f"¥{total_sales:,.2f}")
-    with col2:
-        st.metric("平均订单金额", f"¥{avg_order_value:,.2f}")
-    with col3:
-        st.metric("订单总数", f"{total_orders:,}")
-    with col4:
-        st.metric("订单完成率", f"{completion_rate:.1%}")
-    
-    # 增加交互式日期筛选器
+    # 计算并显示指标卡片，指标定义见 modules/metrics.py
+    display_metrics(data, ['total_sales', 'avg_order_value', 'total_orders', 'completion_rate'])
+
+@fragment
+def _render_date_range_section(data, date_index, chart_data):
+    """
+    按日期范围筛选的销售趋势和指标，依赖日期前缀和索引
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        date_index (dict): 销售立方体的日期前缀和索引
+        chart_data (dict): 确定图表数据版本的数据集
+    """
     st.subheader("按日期范围筛选销售数据")
     
-    # 计算日期范围
-    min_date = transactions_df['date'].min()
-    max_date = transactions_df['date'].max()
+    if len(date_index['dates']) == 0:
+        st.info("没有带有效日期的交易数据，无法按日期范围筛选")
+        return
+    
+    # 计算日期范围（日期索引按日期升序排列）
+    min_date = pd.Timestamp(date_index['dates'][0])
+    max_date = pd.Timestamp(date_index['dates'][-1])
     
     # 创建日期选择器
     date_range = st.date_input(
@@ -95,29 +157,108 @@ def create_sales_dashboard(data):
         start_date = pd.to_datetime(start_date)
         end_date = pd.to_datetime(end_date)
         
-        # 筛选数据
-        filtered_transactions = transactions_df[(transactions_df['date'] >= start_date) & 
-                                               (transactions_df['date'] <= end_date)]
+        # 在日期前缀和索引上二分查找，不需要扫描交易数据
+        filtered_totals = query_date_range(date_index, start_date, end_date)
         
-        # 计算筛选后的销售数据
-        filtered_daily_sales = filtered_transactions.groupby('date')['total_amount'].sum().reset_index()
-        
-        # 显示筛选后的销售趋势
-        fig5 = px.line(filtered_daily_sales, x='date', y='total_amount',
-                      title=f'从 {start_date.strftime("%Y-%m-%d")} 到 {end_date.strftime("%Y-%m-%d")} 的日销售额',
-                      labels={'date': '日期', 'total_amount': '销售额'})
+        # 显示筛选后的销售趋势，同一日期范围的图表只构建一次，天数较多时做LTTB降采样
+        fig5 = cached_figure('sales/filtered_daily_sales', chart_data, lambda: line_chart(
+            daily_series(date_index, filtered_totals['start'], filtered_totals['end']), x='date', y='total_amount',
+            title=f'从 {start_date.strftime("%Y-%m-%d")} 到 {end_date.strftime("%Y-%m-%d")} 的日销售额',
+            labels={'date': '日期', 'total_amount': '销售额'}),
+            params={'start_date': start_date, 'end_date': end_date})
         st.plotly_chart(fig5, use_container_width=True)
         
         # 显示筛选后的关键指标
-        filtered_total_sales = filtered_transactions['total_amount'].sum()
-        filtered_avg_order_value = filtered_transactions.groupby('transaction_id')['total_amount'].sum().mean()
-        filtered_total_orders = filtered_transactions['transaction_id'].nunique()
-        
         st.subheader("所选日期范围的关键指标")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("筛选后总销售额", f"¥{filtered_total_sales:,.2f}")
-        with col2:
-            st.metric("筛选后平均订单金额", f"¥{filtered_avg_order_value:,.2f}")
-        with col3:
-            st.metric("筛选后订单总数", f"{filtered_total_orders:,}") 
\ No newline at end of file
+        display_metrics(
+            data, ['total_sales', 'avg_order_value', 'total_orders'],
+            filters={'date': (start_date, end_date)},
+            labels={'total_sales': '筛选后总销售额', 'avg_order_value': '筛选后平均订单金额',
+                    'total_orders': '筛选后订单总数'}
+        ) 
+
+# 近似模式下估计的KPI：指标名称 -> 总量度量，或 (分子度量, 分母度量) 表示比率
+APPROXIMATE_KPIS = {
+    'total_sales': 'revenue',
+    'avg_order_value': ('revenue', 'orders'),
+    'total_orders': 'orders',
+    'completion_rate': ('completed_orders', 'orders'),
+}
+
+# 近似模式下选择显示精确结果的 (数据版本, 样本比例)，数据或样本比例变化前一直显示精确结果
+EXACT_RESULTS_STATE_KEY = 'sales_exact_result_choices'
+
+def render_approximate_overview(data):
+    """
+    近似查询模式的销售概览：KPI和图表基于分层样本估计，并显示95%置信区间
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        bool: 是否需要继续渲染精确结果（未开启近似模式，或选择了"计算精确结果"）
+    """
+    fraction = get_approximate_fraction()
+    if not fraction:
+        return True
+    
+    sample = get_stratified_sample(data, fraction)
+    st.info(f"近似查询模式：基于 {sample.sample_rows:,} 行交易明细的分层样本（{fraction:.0%}，按月份和产品类别分层），"
+            "以下数值为估计值，悬停指标可查看95%置信区间，图表中的误差线为置信区间。")
+    
+    st.subheader("销售关键指标（估计）")
+    _approximate_metrics(sample, ['total_sales', 'avg_order_value', 'total_orders', 'completion_rate'])
+    
+    # 图表与交叉筛选图表的维度相同
+    col1, col2 = st.columns(2)
+    for position, (dim, _, title, axis_title) in zip((0, 1, 0, 1), CROSS_FILTER_CHARTS):
+        estimates = sample.estimate_by(dim)
+        with (col1 if position == 0 else col2):
+            plotly_chart(_interval_figure(estimates, dim, f"{title}（估计）", axis_title), f'sales/approximate_{dim}',
+                         use_container_width=True)
+    
+    st.subheader("按日期范围筛选销售数据（估计）")
+    dates = sample.sample['date'].dropna()
+    if dates.empty:
+        st.info("样本中没有带有效日期的交易数据，无法按日期范围筛选")
+        date_range = []
+    else:
+        min_date, max_date = dates.min(), dates.max()
+        date_range = st.date_input("选择日期范围", [min_date, max_date], min_value=min_date, max_value=max_date,
+                                   key="approximate_date_range")
+    if len(date_range) == 2:
+        filters = {'date': (pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]))}
+        _approximate_metrics(sample, ['total_sales', 'avg_order_value', 'total_orders'], filters)
+    
+    # 按钮只在点击后的一次运行中为True，选择保存在会话状态中，其他控件引起的重新运行不会丢失精确结果
+    exact_key = (get_data_version({'transactions': data["transactions"], 'customers': data["customers"]}), fraction)
+    exact_choices = st.session_state.setdefault(EXACT_RESULTS_STATE_KEY, set())
+    if exact_key not in exact_choices:
+        st.button("计算精确结果", key="sales_exact_results", on_click=exact_choices.add, args=(exact_key,))
+        return False
+    st.button("隐藏精确结果", key="sales_hide_exact_results", on_click=exact_choices.discard, args=(exact_key,))
+    st.subheader("精确结果")
+    return True
+
+def _approximate_metrics(sample, names, filters=None):
+    """以 st.metric 卡片显示估计的指标，帮助文字为置信区间"""
+    cols = st.columns(len(names))
+    for col, name in zip(cols, names):
+        measure = APPROXIMATE_KPIS[name]
+        if isinstance(measure, tuple):
+            value = sample.estimate_ratio(*measure, filters=filters)
+        else:
+            value = sample.estimate(measure, filters=filters)
+        # 订单数的估计值不是整数，按整数显示
+        fmt = '{:,.0f}' if measure == 'orders' else METRICS[name]['format']
+        with col:
+            st.metric(f"{METRICS[name]['label']}（估计）", fmt.format(value['estimate']),
+                      f"± {value['margin']:.1%}", delta_color="off", help=format_interval(value, fmt))
+
+def _interval_figure(estimates, dim, title, axis_title):
+    """绘制带置信区间误差线的估计值图表"""
+    estimates = estimates.assign(error=estimates['ci_high'] - estimates['estimate'])
+    labels = {dim: axis_title, 'estimate': '销售额（估计）'}
+    if dim == 'month':
+        return px.line(estimates, x=dim, y='estimate', error_y='error', title=title, labels=labels, markers=True)
+    return px.bar(estimates, x=dim, y='estimate', error_y='error', title=title, labels=labels)
\ No newline at end of file
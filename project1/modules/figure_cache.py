@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.io as pio
+import streamlit as st
+
+from modules.data_loader import get_data_version
+from modules.instrumentation import figure_points, track
+
+# 缓存的图表JSON总大小上限
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class FigureCache:
+    """
+    Plotly图表缓存
+    
+    以 (图表ID, 数据版本, 筛选参数) 为键保存序列化后的图表JSON，按最近最少使用的顺序
+    淘汰，保证所有缓存图表的总字节数不超过上限。命中时直接从JSON恢复图表，
+    不需要重新聚合数据和构建图形。
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        # 缓存在所有会话之间共享
+        self._lock = threading.RLock()
+    
+    def get(self, key):
+        """返回缓存的图表，不存在时返回None"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        # 缓存的JSON由 plotly 生成，恢复时跳过属性校验
+        return pio.from_json(payload.decode('utf-8'), skip_invalid=True)
+    
+    def put(self, key, fig):
+        """序列化并保存图表，超出总大小上限时淘汰最久未使用的图表"""
+        payload = fig.to_json().encode('utf-8')
+        if len(payload) > self.max_bytes:
+            # 单个图表超过上限时不缓存
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = payload
+            self._total_bytes += len(payload)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+    
+    def get_or_build(self, key, build):
+        """
+        返回缓存的图表，未命中时调用 build 构建并缓存
+        
+        Args:
+            key (str): 缓存键，见 make_figure_key
+            build (callable): 无参数函数，返回 plotly 图表
+        
+        Returns:
+            plotly.graph_objects.Figure: 图表
+        """
+        fig = self.get(key)
+        if fig is None:
+            fig = build()
+            self.put(key, fig)
+        return fig
+    
+    def get_size(self, key):
+        """返回缓存的图表JSON字节数，未缓存时返回0"""
+        with self._lock:
+            payload = self._entries.get(key)
+            return len(payload) if payload is not None else 0
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+    
+    def get_stats(self):
+        """返回缓存的图表数量、总字节数和命中率"""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / requests if requests else 0,
+            }
+
+def make_figure_key(chart_id, data_version, params=None):
+    """
+    生成图表缓存键
+    
+    Args:
+        chart_id (str): 图表ID，建议使用 "页面/图表" 的形式
+        data_version (str): 图表所用数据的版本
+        params (dict): 影响图表的筛选参数，需要可以转换为JSON
+    
+    Returns:
+        str: 缓存键
+    """
+    params_text = json.dumps(params or {}, sort_keys=True, default=str, ensure_ascii=False)
+    params_hash = hashlib.md5(params_text.encode('utf-8')).hexdigest()[:12]
+    return f"{chart_id}:{data_version}:{params_hash}"
+
+@st.cache_resource
+def get_figure_cache():
+    """返回所有会话共享的图表缓存"""
+    return FigureCache()
+
+def cached_figure(chart_id, data, build, params=None):
+    """
+    从图表缓存中获取图表，数据版本或筛选参数变化时才重新构建
+    
+    Args:
+        chart_id (str): 图表ID
+        data (pd.DataFrame | dict): 图表所用的数据集，用于确定数据版本
+        build (callable): 无参数函数，负责聚合数据并返回 plotly 图表
+        params (dict): 影响图表的筛选参数
+    
+    Returns:
+        plotly.graph_objects.Figure: 图表
+    """
+    key = make_figure_key(chart_id, get_data_version(data), params)
+    cache = get_figure_cache()
+    
+    # 记录每个图表的耗时、构建耗时（仅缓存未命中时）、JSON字节数和数据点数
+    with track('chart', chart_id) as event:
+        def timed_build():
+            start = time.perf_counter()
+            fig = build()
+            event['build_seconds'] = time.perf_counter() - start
+            return fig
+        
+        fig = cache.get_or_build(key, timed_build)
+        event['cache_hit'] = 'build_seconds' not in event
+        event['payload_bytes'] = cache.get_size(key)
+        event['rows'] = figure_points(fig)
+    return fig
+
+def plotly_chart(fig, chart_id, **kwargs):
+    """
+    显示页面中直接构建（不经过图表缓存）的图表，并记录耗时、JSON字节数和数据点数
+    
+    Args:
+        fig (plotly.graph_objects.Figure): 图表
+        chart_id (str): 图表ID，建议使用 "页面/图表" 的形式
+        **kwargs: 传给 st.plotly_chart 的参数
+    
+    Returns:
+        st.plotly_chart 的返回值
+    """
+    with track('chart', chart_id) as event:
+        # 与 st.plotly_chart 相同的序列化方式，字节数即发送到浏览器的数据量
+        event['payload_bytes'] = len(pio.to_json(fig, validate=False).encode('utf-8'))
+        event['rows'] = figure_points(fig)
+        return st.plotly_chart(fig, **kwargs)
@@ -0,0 +1,307 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import streamlit as st
+
+# 滚动日志文件：每行一条JSON记录，超过大小上限后轮转
+DEFAULT_LOG_PATH = os.path.join(tempfile.gettempdir(), "globalmart_render_metrics.log")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# 设置环境变量 GLOBALMART_METRICS_PORT 后在该端口提供 Prometheus 文本格式的 /metrics
+METRICS_PORT_ENV = "GLOBALMART_METRICS_PORT"
+METRICS_LOG_ENV = "GLOBALMART_METRICS_LOG"
+
+# 耗时直方图的分桶上界（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 调试面板显示的最近记录数
+RECENT_EVENTS = 200
+
+class RenderStats:
+    """
+    页面和图表的性能统计
+    
+    每条记录包含类型（page/chart/compute）、名称、耗时，以及可选的图表构建耗时、
+    传给浏览器的数据字节数、数据行数和缓存是否命中。统计按 (类型, 名称) 累计，
+    同时保留最近的记录供调试面板显示，并写入滚动日志。
+    """
+    
+    def __init__(self, log_path=None):
+        self._series = {}
+        self._recent = deque(maxlen=RECENT_EVENTS)
+        # 统计在所有会话之间共享
+        self._lock = threading.RLock()
+        self._logger = _create_logger(log_path) if log_path else None
+    
+    def record(self, event):
+        """
+        保存一条记录
+        
+        Args:
+            event (dict): 至少包含 kind、name、seconds，可选 build_seconds、payload_bytes、
+                          rows、cache_hit、error
+        """
+        event.setdefault('timestamp', time.time())
+        key = (event['kind'], event['name'])
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'build_seconds': 0.0,
+                    'payload_bytes': 0, 'last_payload_bytes': 0, 'rows': 0,
+                    'cache_hits': 0, 'errors': 0, 'buckets': [0] * len(DURATION_BUCKETS),
+                }
+            seconds = event['seconds']
+            series['count'] += 1
+            series['seconds'] += seconds
+            series['max_seconds'] = max(series['max_seconds'], seconds)
+            series['build_seconds'] += event.get('build_seconds', 0.0)
+            series['rows'] += event.get('rows', 0)
+            series['cache_hits'] += int(bool(event.get('cache_hit')))
+            series['errors'] += int('error' in event)
+            if 'payload_bytes' in event:
+                series['payload_bytes'] += event['payload_bytes']
+                series['last_payload_bytes'] = event['payload_bytes']
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    series['buckets'][i] += 1
+            self._recent.append(event)
+        if self._logger is not None:
+            self._logger.info(json.dumps(event, ensure_ascii=False, default=str))
+    
+    def get_summary(self):
+        """返回按总耗时降序排列的统计表"""
+        with self._lock:
+            rows = [{
+                '类型': kind,
+                '名称': name,
+                '次数': series['count'],
+                '总耗时(秒)': series['seconds'],
+                '平均耗时(秒)': series['seconds'] / series['count'],
+                '最大耗时(秒)': series['max_seconds'],
+                '图表构建耗时(秒)': series['build_seconds'],
+                '最近数据量(字节)': series['last_payload_bytes'],
+                '数据行数': series['rows'],
+                '缓存命中': series['cache_hits'],
+                '错误': series['errors'],
+            } for (kind, name), series in self._series.items()]
+        summary = pd.DataFrame(rows)
+        if summary.empty:
+            return summary
+        return summary.sort_values('总耗时(秒)', ascending=False).reset_index(drop=True)
+    
+    def get_recent(self):
+        """返回最近的记录，最新的在前"""
+        with self._lock:
+            events = list(self._recent)
+        recent = pd.DataFrame(events[::-1])
+        if not recent.empty:
+            recent['timestamp'] = pd.to_datetime(recent['timestamp'], unit='s')
+        return recent
+    
+    def render_prometheus(self):
+        """
+        按 Prometheus 文本格式输出统计
+        
+        Returns:
+            str: 可直接作为 /metrics 响应的文本
+        """
+        lines = [
+            '# HELP globalmart_render_duration_seconds Time spent rendering a page, chart or computation.',
+            '# TYPE globalmart_render_duration_seconds histogram',
+        ]
+        with self._lock:
+            series_items = sorted(self._series.items())
+            for (kind, name), series in series_items:
+                labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+                for bound, count in zip(DURATION_BUCKETS, series['buckets']):
+                    lines.append(f'globalmart_render_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'globalmart_render_duration_seconds_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f'globalmart_render_duration_seconds_sum{{{labels}}} {series["seconds"]}')
+                lines.append(f'globalmart_render_duration_seconds_count{{{labels}}} {series["count"]}')
+            
+            counters = [
+                ('globalmart_figure_build_seconds_total', 'build_seconds', 'Time spent building figures on cache misses.'),
+                ('globalmart_payload_bytes_total', 'payload_bytes', 'Serialized bytes sent to the browser.'),
+                ('globalmart_rows_total', 'rows', 'Rows or points processed.'),
+                ('globalmart_cache_hits_total', 'cache_hits', 'Renders served from cache.'),
+                ('globalmart_errors_total', 'errors', 'Renders that raised an exception.'),
+            ]
+            for metric, field, help_text in counters:
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for (kind, name), series in series_items:
+                    lines.append(f'{metric}{{kind="{_escape(kind)}",name="{_escape(name)}"}} {series[field]}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _create_logger(log_path):
+    logger = logging.getLogger('globalmart.render_metrics')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        except OSError:
+            # 日志目录不可写时只在内存中统计
+            return None
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+@st.cache_resource
+def get_render_stats():
+    """返回所有会话共享的性能统计，设置了端口环境变量时同时启动 /metrics 服务"""
+    stats = RenderStats(os.environ.get(METRICS_LOG_ENV, DEFAULT_LOG_PATH))
+    port = os.environ.get(METRICS_PORT_ENV)
+    if port:
+        start_metrics_server(stats, int(port))
+    return stats
+
+def start_metrics_server(stats, port, host='0.0.0.0'):
+    """
+    在后台线程中启动 Prometheus 文本格式的 /metrics 服务
+    
+    Args:
+        stats (RenderStats): 性能统计
+        port (int): 监听端口
+        host (str): 监听地址
+    
+    Returns:
+        ThreadingHTTPServer: 服务对象，端口被占用时返回None
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = stats.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            # 不在控制台输出每次抓取的访问日志
+            pass
+    
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+@contextmanager
+def track(kind, name, **fields):
+    """
+    记录一段代码的耗时
+    
+    代码块内可以向返回的字典中补充 rows、payload_bytes、build_seconds、cache_hit 等字段。
+    
+    Args:
+        kind (str): 类型，例如 'page'、'chart'、'compute'
+        name (str): 名称
+        **fields: 附加字段
+    
+    Yields:
+        dict: 本次记录
+    """
+    event = {'kind': kind, 'name': name, **fields}
+    start = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event['error'] = type(e).__name__
+        raise
+    finally:
+        event['seconds'] = time.perf_counter() - start
+        get_render_stats().record(event)
+
+def instrument(kind, name=None):
+    """
+    记录函数每次调用耗时的装饰器
+    
+    Args:
+        kind (str): 类型，例如 'page'、'compute'
+        name (str): 名称，默认使用函数名
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(kind, name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def figure_points(fig):
+    """返回图表中所有轨迹的数据点数量"""
+    points = 0
+    for trace in fig.data:
+        for attribute in ('x', 'values', 'z', 'y', 'r', 'labels', 'locations'):
+            values = getattr(trace, attribute, None)
+            if values is not None:
+                points += len(values)
+                break
+    return points
+
+def display_debug_panel():
+    """在页面底部显示性能调试面板"""
+    stats = get_render_stats()
+    with st.expander("性能调试面板", expanded=True):
+        summary = stats.get_summary()
+        if summary.empty:
+            st.write("暂无记录")
+            return
+        st.write("按总耗时排序的页面、图表和计算：")
+        st.dataframe(summary, use_container_width=True)
+        st.write("最近的记录：")
+        st.dataframe(stats.get_recent(), use_container_width=True)
+        display_result_cache_stats()
+        display_compute_pool_stats()
+        st.caption(f"滚动日志: {os.environ.get(METRICS_LOG_ENV, DEFAULT_LOG_PATH)}；"
+                   f"设置环境变量 {METRICS_PORT_ENV} 后可通过 /metrics 抓取 Prometheus 指标")
+
+def display_result_cache_stats():
+    """显示计算结果缓存的占用、命中和淘汰情况"""
+    # result_cache 依赖本模块记录耗时，在函数内导入避免循环导入
+    from modules.result_cache import get_result_cache
+    
+    cache_stats = get_result_cache().get_stats()
+    st.write(f"计算结果缓存（{cache_stats['policy'].upper()} 淘汰）：")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("内存占用", f"{cache_stats['total_bytes'] / 1024 / 1024:.1f} MB",
+                f"上限 {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB", delta_color="off")
+    col2.metric("命中率", f"{cache_stats['hit_rate']:.1%}",
+                f"{cache_stats['entries']} 个结果", delta_color="off")
+    col3.metric("命中 / 未命中", f"{cache_stats['hits']} / {cache_stats['misses']}",
+                f"磁盘命中 {cache_stats['spill_hits']}", delta_color="off")
+    col4.metric("淘汰 / 溢出", f"{cache_stats['evictions']} / {cache_stats['spills']}",
+                f"磁盘 {cache_stats['spilled_bytes'] / 1024 / 1024:.1f} MB", delta_color="off")
+
+def display_compute_pool_stats():
+    """配置了计算进程池时，显示进程数和各状态的任务数"""
+    from modules.compute_pool import get_compute_pool
+    
+    pool = get_compute_pool()
+    if pool is None:
+        return
+    pool_stats = pool.get_stats()
+    st.caption(f"计算进程池: {pool_stats['workers']} 个进程，排队上限 {pool_stats['queue_size']}；"
+               f"已提交 {pool_stats['submitted']}，完成 {pool_stats['completed']}，失败 {pool_stats['failed']}，"
+               f"拒绝 {pool_stats['rejected']}，未完成 {pool_stats['pending']}")
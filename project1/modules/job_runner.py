@@ -0,0 +1,245 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+from modules.compute_pool import ComputePoolBusy
+from modules.instrumentation import track
+from modules.result_cache import _MISSING, get_result_cache, make_result_key
+from modules.utils import fragment
+
+# 同时运行的后台任务数
+JOB_WORKERS_ENV = "GLOBALMART_JOB_WORKERS"
+DEFAULT_JOB_WORKERS = 2
+
+# 页面显示任务进度时的刷新间隔（秒）
+JOB_POLL_SECONDS = 1.0
+
+# 计算进程池队列已满时，任务等待若干秒后重新排队，超过重试次数后记为失败
+JOB_BUSY_RETRY_SECONDS = 5
+JOB_BUSY_RETRIES = 12
+
+# 已结束的任务记录保留的秒数，结果本身保存在计算结果缓存中
+JOB_RETENTION_SECONDS = 3600
+
+# 当前会话提交过的任务键，切换页面后仍可以在侧边栏查看进度
+JOB_STATE_KEY = 'background_jobs'
+
+# display_job 在任务未完成、失败或结果已被缓存淘汰时返回的标记
+NOT_READY = _MISSING
+
+@dataclass
+class Job:
+    """
+    后台任务的状态
+    
+    Attributes:
+        key: 任务键，同时是结果在计算结果缓存中的键
+        name: 任务名称
+        status: queued、running、done 或 failed
+        progress: 进度，0-1
+        message: 当前步骤的说明
+        error: 失败原因
+        busy_retries: 因计算队列已满而重新排队的次数
+    """
+    key: str
+    name: str
+    status: str = 'queued'
+    progress: float = 0.0
+    message: str = ''
+    error: str = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    busy_retries: int = 0
+    
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+    
+    @property
+    def available(self):
+        """任务已完成且结果仍在缓存中；任务函数返回None时结果同样可用"""
+        return self.status == 'done' and get_result_cache().get(self.key, _MISSING) is not _MISSING
+
+class JobRunner:
+    """
+    后台任务执行器
+    
+    耗时的分析在后台线程中运行，Streamlit 请求只提交任务并显示进度，浏览器超时或用户
+    切换页面都不会中断计算。相同的任务（相同的键）只运行一次，完成后的结果写入计算
+    结果缓存，用户回到页面时直接显示。CPU密集的部分可以在任务内通过
+    compute_pool.run_heavy 交给计算进程池。
+    """
+    
+    def __init__(self, workers=DEFAULT_JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background-job')
+        self._jobs = {}
+        # 任务在所有会话之间共享
+        self._lock = threading.Lock()
+    
+    def submit(self, key, name, func, *args, **kwargs):
+        """
+        提交任务；相同键的任务正在运行、已失败或结果仍在缓存中时直接返回该任务
+        
+        Args:
+            key (str): 任务键
+            name (str): 任务名称
+            func (callable): 任务函数，以关键字参数 progress 接收进度回调 progress(比例, 说明)
+            *args, **kwargs: 任务函数的参数
+        
+        Returns:
+            Job: 任务
+        """
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(key)
+            if job is not None and (job.status != 'done' or job.available):
+                return job
+            # 首次提交或结果已被淘汰时运行；失败的任务由用户确认后重试，见 discard
+            job = self._jobs[key] = Job(key=key, name=name)
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+    
+    def _run(self, job, func, args, kwargs, retry_busy=True):
+        job.status = 'running'
+        job.started_at = time.time()
+        job.progress = 0.0
+        job.message = ''
+        
+        def progress(fraction, message=''):
+            job.progress = min(max(float(fraction), 0.0), 1.0)
+            job.message = message
+        
+        try:
+            with track('job', job.name):
+                result = func(*args, progress=progress, **kwargs)
+            cache = get_result_cache()
+            cache.put(job.key, result)
+            if cache.get(job.key, _MISSING) is _MISSING:
+                # 结果超过缓存上限时不会被保存，标记为失败，避免页面反复提交同一任务
+                raise RuntimeError("任务结果超过计算结果缓存的上限")
+            job.progress = 1.0
+            job.status = 'done'
+        except ComputePoolBusy as e:
+            if retry_busy and job.busy_retries < JOB_BUSY_RETRIES:
+                # 计算队列已满是暂时的，稍后重新排队，不记录为失败
+                job.busy_retries += 1
+                job.status = 'queued'
+                job.message = f"计算队列已满，{JOB_BUSY_RETRY_SECONDS} 秒后重试"
+                timer = threading.Timer(JOB_BUSY_RETRY_SECONDS, self._executor.submit, (self._run, job, func, args, kwargs))
+                timer.daemon = True
+                timer.start()
+                return
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = 'failed'
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = 'failed'
+        job.finished_at = time.time()
+    
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+    
+    def discard(self, key):
+        """删除任务记录，下一次提交相同的任务时重新运行"""
+        with self._lock:
+            self._jobs.pop(key, None)
+    
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for key in [key for key, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[key]
+
+@st.cache_resource
+def get_job_runner():
+    """返回所有会话共享的后台任务执行器"""
+    return JobRunner(int(os.environ.get(JOB_WORKERS_ENV, DEFAULT_JOB_WORKERS)))
+
+def _has_script_context():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+def submit_job(name, key_params, func, *args, **kwargs):
+    """
+    在后台运行耗时的分析
+    
+    没有 Streamlit 会话时（离线渲染报告等无界面模式）直接在当前线程中运行，返回已完成的任务。
+    
+    Args:
+        name (str): 任务名称
+        key_params (tuple): 决定结果的参数，如数据版本和分析参数，用于生成任务键
+        func (callable): 任务函数，以关键字参数 progress 接收进度回调
+        *args, **kwargs: 任务函数的参数
+    
+    Returns:
+        Job: 任务
+    """
+    key = make_result_key(f"job/{name}", key_params)
+    if not _has_script_context():
+        job = Job(key=key, name=name)
+        # 无界面模式下计算队列已满时不重新排队，直接报错
+        get_job_runner()._run(job, func, args, kwargs, retry_busy=False)
+        if job.status == 'failed':
+            raise RuntimeError(job.error)
+        return job
+    
+    job = get_job_runner().submit(key, name, func, *args, **kwargs)
+    session_jobs = st.session_state.setdefault(JOB_STATE_KEY, [])
+    if key not in session_jobs:
+        session_jobs.append(key)
+    return job
+
+@fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(key, title):
+    job = get_job_runner().get(key)
+    if job is None or job.finished:
+        # 任务结束后重新运行整个页面，显示结果或错误
+        st.rerun()
+    status = job.message or ("排队中" if job.status == 'queued' else "计算中")
+    st.progress(job.progress, text=f"{title}：{status}（{job.progress:.0%}）")
+
+def display_job(job, title):
+    """
+    显示任务状态
+    
+    任务未完成时显示每秒刷新的进度条，完成后页面自动重新运行；任务失败时显示错误和重试按钮。
+    
+    Args:
+        job (Job): submit_job 返回的任务
+        title (str): 进度条上显示的任务说明
+    
+    Returns:
+        任务结果；任务未完成、失败或结果已被缓存淘汰时返回 NOT_READY。结果只从缓存中
+        读取这一次，调用方直接使用返回值，避免两次读取之间被其他会话淘汰
+    """
+    if job.status == 'done':
+        result = get_result_cache().get(job.key, _MISSING)
+        if result is not _MISSING:
+            return result
+        # 结果已被缓存淘汰，下一次提交时会重新计算
+        st.rerun()
+    if job.status == 'failed':
+        st.error(f"{title}失败: {job.error}")
+        if st.button("重试", key=f"retry_{job.key}"):
+            get_job_runner().discard(job.key)
+            st.rerun()
+        return NOT_READY
+    st.caption("计算在后台进行，可以先浏览其他页面，回到本页面时继续显示进度和结果。")
+    _job_progress(job.key, title)
+    return NOT_READY
+
+def display_session_jobs():
+    """在侧边栏显示当前会话提交的、尚未结束的后台任务"""
+    runner = get_job_runner()
+    jobs = [runner.get(key) for key in st.session_state.get(JOB_STATE_KEY, [])]
+    active = [job for job in jobs if job is not None and not job.finished]
+    if not active:
+        return
+    st.sidebar.write("后台任务：")
+    for job in active:
+        st.sidebar.progress(job.progress, text=f"{job.name}：{job.message or '排队中'}")
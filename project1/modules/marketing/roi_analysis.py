@@ -5,6 +5,29 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from modules.compute.roi import compute_budget_scenario, compute_roi
+from modules.figure_cache import plotly_chart
+from modules.metrics import AVG_CONVERSION_VALUE, display_metrics
+from modules.result_cache import memoize
+from modules.utils import fragment
+
+# 营销活动数据较小，但ROI页面各部分都基于同一份统计，按数据版本缓存一次
+@memoize('roi', datasets=['marketing'])
+def _roi_result(data, avg_conversion_value):
+    return compute_roi(data["marketing"], avg_conversion_value)
+
+def get_roi_result(data):
+    """
+    获取当前营销数据的ROI分析结果
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        ROIResult: ROI分析结果
+    """
+    return _roi_result(data, AVG_CONVERSION_VALUE)
+
 def perform_roi_analysis(data):
     """
     执行ROI和投资回报分析
@@ -14,78 +37,29 @@ def perform_roi_analysis(data):
     """
     st.subheader("ROI和投资回报分析")
     
-    # 准备数据
-    marketing_df = data["marketing"]
-    transactions_df = data["transactions"]
-    
-    # 确保日期格式正确
-    marketing_df['start_date'] = pd.to_datetime(marketing_df['start_date'])
-    marketing_df['end_date'] = pd.to_datetime(marketing_df['end_date'])
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-    
-    # 标准化ROI值
-    if 'roi' in marketing_df.columns:
-        marketing_df['roi_numeric'] = marketing_df['roi']
-        
-        # 如果ROI是字符串类型（比如包含%），进行转换
-        if marketing_df['roi'].dtype == 'object':
-            marketing_df['roi_numeric'] = marketing_df['roi'].apply(lambda x: 
-                float(str(x).replace('%', '')) / 100 if isinstance(x, str) and '%' in str(x) 
-                else x)
-        
-        # 确保转换为数值类型
-        marketing_df['roi_numeric'] = pd.to_numeric(marketing_df['roi_numeric'], errors='coerce')
-    else:
+    # 多维度ROI统计由 modules/compute/roi.py 计算，按数据版本缓存
+    result = get_roi_result(data)
+    marketing_df = result.campaigns
+    if result.roi_estimated:
         st.warning("营销数据中缺少ROI字段，将使用估算值进行分析。")
-        # 基于其他指标估算ROI
-        marketing_df['roi_numeric'] = (marketing_df['conversions'] * 100 - marketing_df['spend']) / marketing_df['spend']
     
     # 投资回报概览
     st.write("### 投资回报概览")
     
-    # 计算总体ROI
-    total_spend = marketing_df['spend'].sum()
-    total_conversions = marketing_df['conversions'].sum()
+    # 总体ROI指标由指标注册表统一计算
+    metrics = display_metrics(data, ['total_spend', 'total_conversions', 'estimated_return', 'overall_roi'],
+                              labels={'total_spend': '总营销支出'})
+    total_return = metrics['estimated_return']
     
     # 估算每次转化的平均价值
-    avg_conversion_value = 100  # 假设每次转化的平均价值为100元
-    
-    # 计算总回报
-    total_return = total_conversions * avg_conversion_value
-    
-    # 计算总体ROI
-    overall_roi = (total_return - total_spend) / total_spend if total_spend > 0 else 0
-    
-    # 显示关键指标
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("总营销支出", f"¥{total_spend:,.2f}")
-    
-    with col2:
-        st.metric("总转化次数", f"{total_conversions:,}")
-    
-    with col3:
-        st.metric("估算总回报", f"¥{total_return:,.2f}")
-    
-    with col4:
-        st.metric("总体ROI", f"{overall_roi:.2f}x")
+    avg_conversion_value = AVG_CONVERSION_VALUE
     
     # ROI分布
     st.write("### ROI分布分析")
     
-    # 计算正ROI和负ROI的活动数量
-    positive_roi_count = (marketing_df['roi_numeric'] > 0).sum()
-    negative_roi_count = (marketing_df['roi_numeric'] <= 0).sum()
-    
     # 创建ROI分布饼图
-    roi_distribution = pd.DataFrame({
-        'ROI类型': ['正ROI', '负ROI'],
-        '活动数量': [positive_roi_count, negative_roi_count]
-    })
-    
     fig1 = px.pie(
-        roi_distribution,
+        result.distribution,
         values='活动数量',
         names='ROI类型',
         title='正ROI vs 负ROI活动数量分布',
@@ -103,7 +77,7 @@ def perform_roi_analysis(data):
     )
     
     # 添加中位数线
-    median_roi = marketing_df['roi_numeric'].median()
+    median_roi = result.median_roi
     fig2.add_vline(x=median_roi, line_dash="dash", line_color="red", annotation_text=f"中位数: {median_roi:.2f}")
     
     # 添加零线
@@ -112,23 +86,16 @@ def perform_roi_analysis(data):
     col1, col2 = st.columns(2)
     
     with col1:
-        st.plotly_chart(fig1, use_container_width=True)
+        plotly_chart(fig1, 'roi/positive_negative', use_container_width=True)
     
     with col2:
-        st.plotly_chart(fig2, use_container_width=True)
+        plotly_chart(fig2, 'roi/distribution', use_container_width=True)
     
     # 按不同维度分析ROI
     st.write("### 多维度ROI分析")
     
     # 按渠道分析ROI
-    channel_roi = marketing_df.groupby('channel').agg({
-        'roi_numeric': 'mean',
-        'spend': 'sum',
-        'conversions': 'sum',
-        'campaign_id': 'count'
-    }).reset_index()
-    
-    channel_roi.columns = ['渠道', '平均ROI', '总支出', '总转化', '活动数量']
+    channel_roi = result.channel_roi
     
     # 创建按渠道的ROI条形图
     fig3 = px.bar(
@@ -145,14 +112,7 @@ def perform_roi_analysis(data):
     fig3.update_traces(texttemplate='%{text:.2f}x', textposition='outside')
     
     # 按目标受众分析ROI
-    audience_roi = marketing_df.groupby('target_audience').agg({
-        'roi_numeric': 'mean',
-        'spend': 'sum',
-        'conversions': 'sum',
-        'campaign_id': 'count'
-    }).reset_index()
-    
-    audience_roi.columns = ['目标受众', '平均ROI', '总支出', '总转化', '活动数量']
+    audience_roi = result.audience_roi
     
     # 创建按目标受众的ROI条形图
     fig4 = px.bar(
@@ -171,16 +131,13 @@ def perform_roi_analysis(data):
     col1, col2 = st.columns(2)
     
     with col1:
-        st.plotly_chart(fig3, use_container_width=True)
+        plotly_chart(fig3, 'roi/channel_roi', use_container_width=True)
     
     with col2:
-        st.plotly_chart(fig4, use_container_width=True)
+        plotly_chart(fig4, 'roi/audience_roi', use_container_width=True)
     
     # 按目标和渠道交叉分析ROI
-    objective_channel_roi = marketing_df.groupby(['objective', 'channel']).agg({
-        'roi_numeric': 'mean',
-        'spend': 'sum'
-    }).reset_index()
+    objective_channel_roi = result.objective_channel_roi
     
     # 创建热力图
     fig5 = px.density_heatmap(
@@ -194,7 +151,7 @@ def perform_roi_analysis(data):
         color_continuous_midpoint=0
     )
     
-    st.plotly_chart(fig5, use_container_width=True)
+    plotly_chart(fig5, 'roi/objective_channel_heatmap', use_container_width=True)
     
     # 投资规模与ROI关系分析
     st.write("### 投资规模与ROI关系分析")
@@ -226,14 +183,11 @@ def perform_roi_analysis(data):
         ]
     )
     
-    st.plotly_chart(fig6, use_container_width=True)
+    plotly_chart(fig6, 'roi/spend_vs_roi', use_container_width=True)
     
     # ROI和转化率关系分析
     st.write("### ROI与转化率关系分析")
     
-    # 计算转化率
-    marketing_df['conversion_rate'] = (marketing_df['conversions'] / marketing_df['clicks'] * 100).fillna(0)
-    
     # 创建散点图
     fig7 = px.scatter(
         marketing_df,
@@ -259,23 +213,13 @@ def perform_roi_analysis(data):
         ).data[1]
     )
     
-    st.plotly_chart(fig7, use_container_width=True)
+    plotly_chart(fig7, 'roi/conversion_vs_roi', use_container_width=True)
     
     # 时间维度ROI分析
     st.write("### 时间维度ROI分析")
     
-    # 按月统计ROI
-    marketing_df['month'] = marketing_df['start_date'].dt.strftime('%Y-%m')
-    
-    monthly_roi = marketing_df.groupby('month').agg({
-        'roi_numeric': 'mean',
-        'spend': 'sum',
-        'conversions': 'sum'
-    }).reset_index()
-    
-    # 计算月度回报和净收益
-    monthly_roi['return'] = monthly_roi['conversions'] * avg_conversion_value
-    monthly_roi['net_profit'] = monthly_roi['return'] - monthly_roi['spend']
+    # 按月统计的ROI、回报和净收益
+    monthly_roi = result.monthly_roi
     
     # 创建月度ROI趋势图
     fig8 = px.line(
@@ -296,29 +240,14 @@ def perform_roi_analysis(data):
         barmode='group'
     )
     
-    st.plotly_chart(fig8, use_container_width=True)
-    st.plotly_chart(fig9, use_container_width=True)
+    plotly_chart(fig8, 'roi/monthly_roi', use_container_width=True)
+    plotly_chart(fig9, 'roi/monthly_profit', use_container_width=True)
     
     # 活动持续时间与ROI关系
     st.write("### 活动持续时间与ROI关系")
     
-    # 计算活动持续天数
-    marketing_df['duration_days'] = (marketing_df['end_date'] - marketing_df['start_date']).dt.days + 1
-    
-    # 按持续时间分组
-    duration_bins = [0, 7, 14, 30, 60, 90, float('inf')]
-    duration_labels = ['1周内', '1-2周', '2-4周', '1-2个月', '2-3个月', '3个月以上']
-    marketing_df['duration_group'] = pd.cut(marketing_df['duration_days'], bins=duration_bins, labels=duration_labels)
-    
-    # 按持续时间组统计ROI
-    duration_roi = marketing_df.groupby('duration_group').agg({
-        'roi_numeric': 'mean',
-        'spend': 'sum',
-        'conversions': 'sum',
-        'campaign_id': 'count'
-    }).reset_index()
-    
-    duration_roi.columns = ['持续时间', '平均ROI', '总支出', '总转化', '活动数量']
+    # 按持续时间分组统计的ROI
+    duration_roi = result.duration_roi
     
     # 创建按持续时间的ROI条形图
     fig10 = px.bar(
@@ -334,14 +263,14 @@ def perform_roi_analysis(data):
     
     fig10.update_traces(texttemplate='%{text:.2f}x', textposition='outside')
     
-    st.plotly_chart(fig10, use_container_width=True)
+    plotly_chart(fig10, 'roi/duration_roi', use_container_width=True)
     
     # ROI预测和优化
     st.write("### ROI优化建议")
     
-    # 提取表现最好的活动特征
-    top_roi_campaigns = marketing_df.sort_values('roi_numeric', ascending=False).head(5)
-    bottom_roi_campaigns = marketing_df.sort_values('roi_numeric').head(5)
+    # 表现最好和最差的活动
+    top_roi_campaigns = result.top_campaigns
+    bottom_roi_campaigns = result.bottom_campaigns
     
     # 显示最佳和最差活动
     st.write("#### 表现最佳的5个活动")
@@ -355,10 +284,10 @@ def perform_roi_analysis(data):
     # 优化建议
     st.write("#### ROI优化策略建议")
     
-    # 分析高ROI活动的共同特征
-    top_channels = top_roi_campaigns['channel'].value_counts().index.tolist()
-    top_objectives = top_roi_campaigns['objective'].value_counts().index.tolist()
-    top_audiences = top_roi_campaigns['target_audience'].value_counts().index.tolist()
+    # 高ROI活动的共同特征
+    top_channels = result.top_channels
+    top_objectives = result.top_objectives
+    top_audiences = result.top_audiences
     
     st.markdown(f"""
     **基于高ROI活动的特征分析，建议以下优化策略：**
@@ -369,7 +298,7 @@ def perform_roi_analysis(data):
     
     3. **受众定位**: 优先针对 {', '.join(top_audiences[:2])} 受众，这些受众对营销活动的响应更积极。
     
-    4. **优化活动持续时间**: 数据显示，{duration_roi.iloc[duration_roi['平均ROI'].argmax()]['持续时间']} 的活动平均ROI最高，
+    4. **优化活动持续时间**: 数据显示，{result.best_duration} 的活动平均ROI最高，
        建议将活动持续时间调整至这一范围。
     
     5. **重新分配预算**: 从低ROI活动转移预算到高ROI活动，特别是那些具有相似目标但ROI差异显著的活动。
@@ -385,59 +314,14 @@ def perform_roi_analysis(data):
     # 投资组合优化
     st.write("#### 营销投资组合优化")
     
-    # 展示理论上最优的投资组合
-    optimal_allocation = channel_roi.sort_values('平均ROI', ascending=False).reset_index(drop=True)
-    
-    # 确保建议占比数组长度与DataFrame行数匹配
-    num_channels = len(optimal_allocation)
-    
-    # 根据渠道数动态分配百分比
-    if num_channels >= 4:
-        allocation_percentages = [50, 30, 15, 5] + [0] * (num_channels - 4)
-    elif num_channels == 3:
-        allocation_percentages = [50, 30, 20]
-    elif num_channels == 2:
-        allocation_percentages = [70, 30]
-    elif num_channels == 1:
-        allocation_percentages = [100]
-    else:
-        allocation_percentages = []
-    
-    # 确保长度匹配
-    if len(allocation_percentages) == num_channels:
-        optimal_allocation['建议占比'] = allocation_percentages
-        optimal_allocation['建议占比'] = optimal_allocation['建议占比'] / 100
-        
-        # 计算当前分配
-        total_spend = channel_roi['总支出'].sum()
-        optimal_allocation['当前占比'] = optimal_allocation['总支出'] / total_spend if total_spend > 0 else 0
-        
-        # 计算优化后的投资和回报
-        budget_scenario = st.slider("营销预算情景分析 (元)", min_value=int(total_spend*0.5), max_value=int(total_spend*1.5), value=int(total_spend), step=10000)
-        
-        optimal_allocation['优化后投资'] = optimal_allocation['建议占比'] * budget_scenario
-        optimal_allocation['预计转化'] = optimal_allocation['优化后投资'] * optimal_allocation['总转化'] / optimal_allocation['总支出']
-        optimal_allocation['预计回报'] = optimal_allocation['预计转化'] * avg_conversion_value
-        optimal_allocation['预计ROI'] = (optimal_allocation['预计回报'] - optimal_allocation['优化后投资']) / optimal_allocation['优化后投资']
-        
-        # 显示优化结果
-        st.dataframe(optimal_allocation[['渠道', '当前占比', '建议占比', '平均ROI', '优化后投资', '预计转化', '预计回报', '预计ROI']].round(2))
-        
-        # 计算优化前后的总体回报
-        current_return = total_return
-        optimized_return = optimal_allocation['预计回报'].sum()
-        improvement = (optimized_return - current_return) / current_return * 100 if current_return > 0 else 0
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.metric("当前总回报", f"¥{current_return:,.2f}")
-        
-        with col2:
-            st.metric("优化后预计总回报", f"¥{optimized_return:,.2f}")
+    # 展示理论上最优的投资组合：按平均ROI从高到低分配建议占比
+    optimal_allocation = result.optimal_allocation
+    
+    if optimal_allocation is not None:
+        total_spend = result.total_spend
         
-        with col3:
-            st.metric("预计改进", f"{improvement:.1f}%")
+        # 预算情景分析（拖动预算时只重新运行该片段）
+        _render_budget_scenario(optimal_allocation, total_spend, total_return, avg_conversion_value)
         
         # 边际ROI分析
         st.write("#### 边际ROI分析")
@@ -468,4 +352,39 @@ def perform_roi_analysis(data):
         5. **数据驱动归因**: 使用机器学习模型基于历史数据确定各接触点的贡献
         
         建议实施数据驱动归因模型，以获得更准确的跨渠道ROI视图，并优化整体营销组合。
-        """) 
\ No newline at end of file
+        """)
+
+@fragment
+def _render_budget_scenario(optimal_allocation, total_spend, total_return, avg_conversion_value):
+    """
+    按所选预算计算优化后的投资组合和预计回报
+    
+    Args:
+        optimal_allocation (pd.DataFrame): 各渠道的建议占比和当前占比
+        total_spend (float): 当前总支出
+        total_return (float): 当前估算总回报
+        avg_conversion_value (float): 每次转化的平均价值
+    """
+    # 计算优化后的投资和回报
+    budget_scenario = st.slider("营销预算情景分析 (元)", min_value=int(total_spend*0.5), max_value=int(total_spend*1.5), value=int(total_spend), step=10000)
+    
+    scenario = compute_budget_scenario(optimal_allocation, budget_scenario, total_return, avg_conversion_value)
+    
+    # 显示优化结果
+    st.dataframe(scenario.allocation[['渠道', '当前占比', '建议占比', '平均ROI', '优化后投资', '预计转化', '预计回报', '预计ROI']].round(2))
+    
+    # 优化前后的总体回报
+    current_return = scenario.current_return
+    optimized_return = scenario.optimized_return
+    improvement = scenario.improvement
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("当前总回报", f"¥{current_return:,.2f}")
+    
+    with col2:
+        st.metric("优化后预计总回报", f"¥{optimized_return:,.2f}")
+    
+    with col3:
+        st.metric("预计改进", f"{improvement:.1f}%")
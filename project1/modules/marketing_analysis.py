@@ -6,7 +6,9 @@ import numpy as np
 from modules.marketing.basic_analysis import perform_basic_analysis
 from modules.marketing.channel_analysis import perform_channel_analysis
 from modules.marketing.roi_analysis import perform_roi_analysis
+from modules.instrumentation import instrument, track
 
+@instrument('page')
 def analyze_marketing(data):
     """
     执行营销效果分析
@@ -22,9 +24,10 @@ def analyze_marketing(data):
     )
     
     # 根据选择执行不同的分析
-    if analysis_type == "基础营销指标":
-        perform_basic_analysis(data)
-    elif analysis_type == "渠道效果分析":
-        perform_channel_analysis(data)
-    elif analysis_type == "ROI和投资回报分析":
-        perform_roi_analysis(data) 
\ No newline at end of file
+    with track('section', f"analyze_marketing/{analysis_type}"):
+        if analysis_type == "基础营销指标":
+            perform_basic_analysis(data)
+        elif analysis_type == "渠道效果分析":
+            perform_channel_analysis(data)
+        elif analysis_type == "ROI和投资回报分析":
+            perform_roi_analysis(data) 
\ No newline at end of file
@@ -0,0 +1,218 @@
+import json
+
+import numpy as np
+import streamlit as st
+
+from modules.data_loader import get_data_version
+from modules.instrumentation import track
+from modules.sales_cube import cube_table, get_sales_cube, query_date_range
+from modules.traffic_aggregates import get_traffic_rollups
+
+# 营销转化的平均价值，用于估算营销回报
+AVG_CONVERSION_VALUE = 100
+
+def _ratio(numerator, denominator, scale=1):
+    return numerator / denominator * scale if denominator else 0
+
+def _sales_pass(data, filters):
+    """
+    销售基础汇总：在销售立方体上做一次扫描
+    
+    只按日期筛选时直接使用日期前缀和索引；其他筛选条件扫描订单汇总表，筛选产品类别
+    时扫描明细汇总表。明细汇总表中同一订单的不同产品类别分别计数，类别筛选不止
+    一个取值时订单数无法精确计算，订单相关的值为 NaN。
+    """
+    cube = get_sales_cube(data)
+    if set(filters) == {'date'}:
+        totals = query_date_range(cube['daily'], *filters['date'])
+        return {key: totals[key] for key in ('revenue', 'orders', 'completed_orders')}
+    
+    # 不支持的维度由 cube_table 抛出 ValueError，不会被忽略
+    table, orders_additive = cube_table(cube, filters=filters)
+    order_counts = table['orders'].to_numpy()
+    completed = (table['status'] == 'Completed').to_numpy()
+    return {
+        'revenue': table['revenue'].sum(),
+        'orders': int(order_counts.sum()) if orders_additive else np.nan,
+        'completed_orders': int(order_counts[completed].sum()) if orders_additive else np.nan,
+    }
+
+def _marketing_pass(data, filters):
+    """营销基础汇总：一次计算所有可相加的营销指标"""
+    marketing_df = data["marketing"]
+    unknown = [column for column in filters if column not in marketing_df.columns]
+    if unknown:
+        raise ValueError(f"营销数据不支持的筛选条件: {', '.join(unknown)}")
+    for column, values in filters.items():
+        marketing_df = marketing_df[marketing_df[column].isin(values)]
+    sums = marketing_df[['budget', 'spend', 'impressions', 'clicks', 'conversions']].sum()
+    result = {key: sums[key].item() for key in sums.index}
+    result['campaigns'] = len(marketing_df)
+    return result
+
+def _traffic_pass(data, filters):
+    """流量基础汇总：在月度聚合表上汇总访问量和比率指标的加权和"""
+    monthly = get_traffic_rollups(data["traffic"])['monthly']
+    unknown = [column for column in filters if column != 'site' or column not in monthly.columns]
+    if unknown:
+        raise ValueError(f"流量数据不支持的筛选条件: {', '.join(unknown)}")
+    if 'site' in filters:
+        monthly = monthly[monthly['site'].isin(filters['site'])]
+    columns = [col for col in ('total_visits', 'conversion_rate_weighted', 'bounce_rate_weighted') if col in monthly.columns]
+    sums = monthly[columns].sum()
+    return {key: sums[key].item() for key in sums.index}
+
+# 基础汇总的数据源：每个数据源对应一次扫描，以及它依赖的数据集（决定数据版本）
+METRIC_SOURCES = {
+    'sales': {'datasets': ['transactions', 'customers'], 'compute': _sales_pass},
+    'marketing': {'datasets': ['marketing'], 'compute': _marketing_pass},
+    'traffic': {'datasets': ['traffic'], 'compute': _traffic_pass},
+}
+
+# 指标注册表
+# 基础指标通过 source 和 field 从数据源的一次扫描结果中取值；
+# 派生指标通过 depends 声明依赖的指标，compute 接收依赖指标的值
+METRICS = {
+    # 销售指标
+    'total_sales': {'label': '总销售额', 'source': 'sales', 'field': 'revenue', 'format': '¥{:,.2f}'},
+    'total_orders': {'label': '订单总数', 'source': 'sales', 'field': 'orders', 'format': '{:,}'},
+    'completed_orders': {'label': '已完成订单数', 'source': 'sales', 'field': 'completed_orders', 'format': '{:,}'},
+    'avg_order_value': {'label': '平均订单金额', 'depends': ['total_sales', 'total_orders'],
+                        'compute': lambda m: _ratio(m['total_sales'], m['total_orders']), 'format': '¥{:,.2f}'},
+    'completion_rate': {'label': '订单完成率', 'depends': ['completed_orders', 'total_orders'],
+                        'compute': lambda m: _ratio(m['completed_orders'], m['total_orders']), 'format': '{:.1%}'},
+    
+    # 营销指标
+    'total_campaigns': {'label': '营销活动总数', 'source': 'marketing', 'field': 'campaigns', 'format': '{}'},
+    'total_budget': {'label': '总预算', 'source': 'marketing', 'field': 'budget', 'format': '¥{:,.2f}'},
+    'total_spend': {'label': '总支出', 'source': 'marketing', 'field': 'spend', 'format': '¥{:,.2f}'},
+    'total_impressions': {'label': '总展示次数', 'source': 'marketing', 'field': 'impressions', 'format': '{:,}'},
+    'total_clicks': {'label': '总点击次数', 'source': 'marketing', 'field': 'clicks', 'format': '{:,}'},
+    'total_conversions': {'label': '总转化次数', 'source': 'marketing', 'field': 'conversions', 'format': '{:,}'},
+    'budget_utilization': {'label': '预算使用率', 'depends': ['total_spend', 'total_budget'],
+                           'compute': lambda m: _ratio(m['total_spend'], m['total_budget'], 100), 'format': '{:.1f}%'},
+    'avg_ctr': {'label': '平均点击率(CTR)', 'depends': ['total_clicks', 'total_impressions'],
+                'compute': lambda m: _ratio(m['total_clicks'], m['total_impressions'], 100), 'format': '{:.2f}%'},
+    'avg_conversion_rate': {'label': '平均转化率', 'depends': ['total_conversions', 'total_clicks'],
+                            'compute': lambda m: _ratio(m['total_conversions'], m['total_clicks'], 100), 'format': '{:.2f}%'},
+    'avg_cpa': {'label': '每次获客成本(CPA)', 'depends': ['total_spend', 'total_conversions'],
+                'compute': lambda m: _ratio(m['total_spend'], m['total_conversions']), 'format': '¥{:.2f}'},
+    'estimated_return': {'label': '估算总回报', 'depends': ['total_conversions'],
+                         'compute': lambda m: m['total_conversions'] * AVG_CONVERSION_VALUE, 'format': '¥{:,.2f}'},
+    'overall_roi': {'label': '总体ROI', 'depends': ['estimated_return', 'total_spend'],
+                    'compute': lambda m: _ratio(m['estimated_return'] - m['total_spend'], m['total_spend']), 'format': '{:.2f}x'},
+    
+    # 流量指标
+    'total_visits': {'label': '总访问量', 'source': 'traffic', 'field': 'total_visits', 'format': '{:,.0f}'},
+    'traffic_conversion_rate': {'label': '网站转化率', 'source': 'traffic', 'field': 'conversion_rate_weighted',
+                                'scale_by': 'total_visits', 'format': '{:.2%}'},
+    'traffic_bounce_rate': {'label': '跳出率', 'source': 'traffic', 'field': 'bounce_rate_weighted',
+                            'scale_by': 'total_visits', 'format': '{:.2%}'},
+}
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_source(source, data_version, filters_key, _data):
+    filters = json.loads(filters_key)
+    with track('compute', f'metrics/{source}'):
+        return METRIC_SOURCES[source]['compute'](_data, filters)
+
+def _filters_key(filters):
+    return json.dumps(filters or {}, sort_keys=True, default=str, ensure_ascii=False)
+
+def compute_metrics(data, names, filters=None):
+    """
+    计算一组指标
+    
+    先解析所有依赖，每个数据源只扫描一次，再按依赖顺序计算派生指标。数据源的
+    扫描结果按 (数据版本, 筛选条件) 缓存，同一页面或之后的重新运行都不会重复扫描。
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        names (list): 指标名称，见 METRICS
+        filters (dict): 筛选条件，作用于所有指标的数据源。销售指标支持立方体维度和
+                        'date': (开始日期, 结束日期)，营销指标支持营销数据的列，流量指标支持 'site'
+    
+    Returns:
+        dict: 指标名称到值的映射
+    
+    Raises:
+        ValueError: 筛选条件不被某个指标的数据源支持
+    """
+    filters = filters or {}
+    filters_key = _filters_key(filters)
+    ordered = _resolve(names)
+    
+    source_results = {}
+    for name in ordered:
+        source = METRICS[name].get('source')
+        if source and source not in source_results:
+            datasets = {key: data[key] for key in METRIC_SOURCES[source]['datasets']}
+            source_results[source] = _cached_source(source, get_data_version(datasets), filters_key, data)
+    
+    values = {}
+    for name in ordered:
+        metric = METRICS[name]
+        if 'source' in metric:
+            result = source_results[metric['source']]
+            value = result.get(metric['field'], 0)
+            if 'scale_by' in metric:
+                value = _ratio(value, result.get(metric['scale_by'], 0))
+            values[name] = value
+        else:
+            values[name] = metric['compute'](values)
+    return {name: values[name] for name in names}
+
+def metric_sources(names):
+    """返回一组指标（含依赖的指标）所用的数据源"""
+    return {METRICS[name]['source'] for name in _resolve(names) if 'source' in METRICS[name]}
+
+def _resolve(names):
+    """按依赖顺序展开指标列表（依赖在前）"""
+    ordered = []
+    visiting = set()
+    
+    def visit(name):
+        if name in ordered:
+            return
+        if name not in METRICS:
+            raise KeyError(f"未定义的指标: {name}")
+        if name in visiting:
+            raise ValueError(f"指标存在循环依赖: {name}")
+        visiting.add(name)
+        for dependency in METRICS[name].get('depends', []):
+            visit(dependency)
+        visiting.discard(name)
+        ordered.append(name)
+    
+    for name in names:
+        visit(name)
+    return ordered
+
+def format_metric(name, value):
+    """按指标注册表中的格式格式化指标值"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "N/A"
+    return METRICS[name]['format'].format(value)
+
+def display_metrics(data, names, filters=None, labels=None, columns=None):
+    """
+    计算并以 st.metric 卡片的形式显示一组指标
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        names (list): 指标名称
+        filters (dict): 筛选条件，见 compute_metrics
+        labels (dict): 覆盖默认显示名称，例如 {'total_sales': '筛选后总销售额'}
+        columns (int): 每行的列数，默认每个指标一列
+    
+    Returns:
+        dict: 指标名称到值的映射
+    """
+    labels = labels or {}
+    values = compute_metrics(data, names, filters)
+    columns = columns or len(names)
+    cols = st.columns(columns)
+    for i, name in enumerate(names):
+        with cols[i % columns]:
+            st.metric(labels.get(name, METRICS[name]['label']), format_metric(name, values[name]))
+    return values
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from modules.compute_pool import COMPUTE_QUEUE_ENV, COMPUTE_WORKERS_ENV
+from modules.data_loader import load_data
+from modules.shared_data import SHARED_DATA_ENV, publish_datasets, remove_shared_datasets
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# 等待应用进程启动的最长秒数
+STARTUP_TIMEOUT = 60
+
+# 转发数据时每次读取的字节数
+PIPE_CHUNK_BYTES = 64 * 1024
+
+def backend_order(client_host, backends):
+    """
+    按客户端地址的哈希选择应用进程
+    
+    Streamlit 的会话状态、上传文件和媒体文件保存在处理该会话的进程中，同一客户端的
+    页面请求和 WebSocket 连接需要落到同一个进程。首选进程不可用时依次尝试后面的进程。
+    
+    Args:
+        client_host (str): 客户端地址
+        backends (list): 应用进程的 (地址, 端口) 列表
+    
+    Returns:
+        list: 按尝试顺序排列的应用进程
+    """
+    index = int(hashlib.md5(client_host.encode('utf-8')).hexdigest(), 16) % len(backends)
+    return backends[index:] + backends[:index]
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            chunk = await reader.read(PIPE_CHUNK_BYTES)
+            if not chunk:
+                break
+            writer.write(chunk)
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def _handle_connection(client_reader, client_writer, backends):
+    peer = client_writer.get_extra_info('peername')
+    client_host = peer[0] if peer else ''
+    for host, port in backend_order(client_host, backends):
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(host, port)
+            break
+        except OSError:
+            continue
+    else:
+        client_writer.close()
+        return
+    # 在TCP层双向转发，HTTP请求和 WebSocket 升级后的连接都不需要解析
+    await asyncio.gather(_pipe(client_reader, backend_writer), _pipe(backend_reader, client_writer),
+                         return_exceptions=True)
+
+async def run_router(host, port, backends):
+    """
+    运行会话路由：监听对外端口，把每个连接转发到按客户端地址选择的应用进程
+    
+    Args:
+        host (str): 监听地址
+        port (int): 监听端口
+        backends (list): 应用进程的 (地址, 端口) 列表
+    """
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(reader, writer, backends), host, port)
+    async with server:
+        await server.serve_forever()
+
+def start_app_process(port, shared_dir, compute_workers, compute_queue=None):
+    """
+    启动一个只监听本机端口的应用进程
+    
+    Args:
+        port (int): 应用进程端口
+        shared_dir (str): 共享数据目录
+        compute_workers (int): 该进程的计算进程数，0 表示在应用进程内计算
+        compute_queue (int): 计算任务排队上限，默认为计算进程数的两倍
+    
+    Returns:
+        subprocess.Popen: 应用进程
+    """
+    env = dict(os.environ)
+    env[SHARED_DATA_ENV] = shared_dir
+    env[COMPUTE_WORKERS_ENV] = str(compute_workers)
+    if compute_queue is not None:
+        env[COMPUTE_QUEUE_ENV] = str(compute_queue)
+    command = [sys.executable, '-m', 'streamlit', 'run', APP_PATH,
+               '--server.address', '127.0.0.1', '--server.port', str(port), '--server.headless', 'true']
+    return subprocess.Popen(command, env=env)
+
+def wait_until_ready(backends, processes, timeout=STARTUP_TIMEOUT):
+    """等待所有应用进程的健康检查通过，超时或进程退出时抛出 RuntimeError"""
+    deadline = time.monotonic() + timeout
+    pending = list(backends)
+    while pending:
+        for process in processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"应用进程异常退出，退出码 {process.returncode}")
+        host, port = pending[0]
+        try:
+            with urllib.request.urlopen(f"http://{host}:{port}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    pending.pop(0)
+                    continue
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"等待应用进程 {host}:{port} 启动超时")
+        time.sleep(0.5)
+
+def run_multiprocess_server(host, port, workers, backend_port, shared_dir, data_dir=None,
+                            compute_workers=1, compute_queue=None):
+    """
+    多进程部署：发布共享数据，启动多个应用进程，并在对外端口上按会话路由
+    
+    Args:
+        host (str): 对外监听地址
+        port (int): 对外监听端口
+        workers (int): 应用进程数
+        backend_port (int): 第一个应用进程的端口，其余进程依次递增
+        shared_dir (str): 共享数据目录
+        data_dir (str): 数据文件目录，默认为项目的 data 目录
+        compute_workers (int): 每个应用进程的计算进程数
+        compute_queue (int): 每个应用进程的计算任务排队上限
+    """
+    data = load_data(data_dir)
+    if not data:
+        raise RuntimeError("无法加载数据。请确保数据文件存在。")
+    publish_datasets(data, shared_dir)
+    
+    backends = [('127.0.0.1', backend_port + i) for i in range(workers)]
+    processes = [start_app_process(backend, shared_dir, compute_workers, compute_queue) for _, backend in backends]
+    try:
+        wait_until_ready(backends, processes)
+        print(f"{workers} 个应用进程已启动，访问 http://{host}:{port}", flush=True)
+        asyncio.run(run_router(host, port, backends))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        remove_shared_datasets(shared_dir)
@@ -0,0 +1,365 @@
+import functools
+import html
+import logging
+import os
+import re
+import textwrap
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from importlib import import_module
+
+import pandas as pd
+import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+
+# 导出PNG需要 kaleido
+try:
+    import kaleido  # noqa: F401
+    PNG_EXPORT_AVAILABLE = True
+except ImportError:
+    PNG_EXPORT_AVAILABLE = False
+
+# 可以离线渲染的页面：页面标识 -> (标题, 模块, 函数)
+# 带选项的页面（仪表板类型、细分方法、营销分析类型）拆成各自的页面，控件使用默认值
+REPORT_PAGES = {
+    'sales_dashboard': ('销售概览', 'modules.data_visualizer_sales', 'create_sales_dashboard'),
+    'customer_dashboard': ('客户分析', 'modules.data_visualizer_customers', 'create_customer_dashboard'),
+    'product_dashboard': ('产品分析', 'modules.data_visualizer_products', 'create_product_dashboard'),
+    'marketing_dashboard': ('营销效果', 'modules.data_visualizer_marketing', 'create_marketing_dashboard'),
+    'channel_dashboard': ('渠道分析', 'modules.data_visualizer_channels', 'create_channel_dashboard'),
+    'rfm_analysis': ('RFM客户细分分析', 'modules.customer_segmentation', 'perform_rfm_analysis'),
+    'kmeans_clustering': ('K-means客户聚类分析', 'modules.customer_segmentation', 'perform_kmeans_clustering'),
+    'behavioral_analysis': ('消费行为客户细分分析', 'modules.customer_segmentation', 'perform_behavioral_analysis'),
+    'marketing_basic': ('基础营销指标', 'modules.marketing.basic_analysis', 'perform_basic_analysis'),
+    'marketing_channel': ('渠道效果分析', 'modules.marketing.channel_analysis', 'perform_channel_analysis'),
+    'marketing_roi': ('ROI和投资回报分析', 'modules.marketing.roi_analysis', 'perform_roi_analysis'),
+    'sales_forecast': ('销售预测', 'modules.sales_forecasting', 'forecast_sales'),
+}
+
+REPORT_FORMATS = ['html', 'png']
+
+# 报告中表格最多显示的行数
+MAX_TABLE_ROWS = 200
+
+# 记录到报告中的页面元素，其他元素（控件、布局）在无界面模式下不输出任何内容
+RECORDED_ELEMENTS = ['title', 'header', 'subheader', 'markdown', 'write', 'text', 'caption',
+                     'info', 'warning', 'error', 'success', 'metric', 'plotly_chart', 'dataframe', 'table']
+
+class ReportRecorder:
+    """
+    把页面函数对 st.* 的输出记录为报告内容
+    
+    页面函数不需要修改：记录期间 st 模块和所有容器（列、展开区域等）的输出方法被替换为
+    记录函数，控件在无界面模式下返回默认值。同一进程内同一时间只能有一个记录器。
+    """
+    
+    def __init__(self):
+        self.blocks = []
+    
+    @contextmanager
+    def capture(self):
+        """在代码块内记录页面输出"""
+        originals = {}
+        for name in RECORDED_ELEMENTS:
+            originals[name] = (getattr(DeltaGenerator, name), getattr(st, name))
+            recorder = self._make_recorder(name)
+            setattr(DeltaGenerator, name, recorder)
+            setattr(st, name, functools.partial(recorder, None))
+        try:
+            yield self
+        finally:
+            for name, (method, function) in originals.items():
+                setattr(DeltaGenerator, name, method)
+                setattr(st, name, function)
+    
+    def _make_recorder(self, element):
+        def record(_container, *args, **kwargs):
+            if element == 'write':
+                for arg in args:
+                    self._record_value(arg)
+            else:
+                self.blocks.append((element, args, kwargs))
+        return record
+    
+    def _record_value(self, value):
+        if isinstance(value, (pd.DataFrame, pd.Series)) or hasattr(value, 'to_html') and hasattr(value, 'data'):
+            self.blocks.append(('dataframe', (value,), {}))
+        elif hasattr(value, 'to_plotly_json'):
+            self.blocks.append(('plotly_chart', (value,), {}))
+        else:
+            self.blocks.append(('markdown', (str(value),), {}))
+    
+    @property
+    def figures(self):
+        return [args[0] for element, args, _ in self.blocks if element == 'plotly_chart']
+    
+    def to_html(self, title, include_plotlyjs='cdn'):
+        """
+        生成完整的HTML报告
+        
+        Args:
+            title (str): 报告标题
+            include_plotlyjs: 传给 plotly 的 include_plotlyjs，'cdn' 引用在线脚本，True 嵌入脚本
+        
+        Returns:
+            str: HTML文本
+        """
+        parts = []
+        plotlyjs = include_plotlyjs
+        metrics = []
+        for element, args, kwargs in self.blocks:
+            # 连续的指标卡片放在同一行
+            if element == 'metric':
+                metrics.append(_metric_html(*args, **kwargs))
+                continue
+            if metrics:
+                parts.append(f'<div class="metrics">{"".join(metrics)}</div>')
+                metrics = []
+            
+            if element == 'plotly_chart':
+                parts.append(args[0].to_html(full_html=False, include_plotlyjs=plotlyjs))
+                # 脚本只需要引入一次
+                plotlyjs = False
+            else:
+                parts.append(_block_html(element, args))
+        if metrics:
+            parts.append(f'<div class="metrics">{"".join(metrics)}</div>')
+        return _page_html(title, ''.join(parts))
+
+def _block_html(element, args):
+    value = args[0] if args else ''
+    if element == 'title':
+        return f'<h1>{html.escape(str(value))}</h1>'
+    if element == 'header':
+        return f'<h2>{html.escape(str(value))}</h2>'
+    if element == 'subheader':
+        return f'<h3>{html.escape(str(value))}</h3>'
+    if element in ('info', 'warning', 'error', 'success'):
+        return f'<div class="alert {element}">{_markdown_html(value)}</div>'
+    if element == 'caption':
+        return f'<p class="caption">{_inline_markdown(str(value))}</p>'
+    if element in ('dataframe', 'table'):
+        return _table_html(value)
+    if element == 'text':
+        # st.text 为等宽的原始文本
+        return f'<pre class="text">{html.escape(str(value))}</pre>'
+    return f'<div class="text">{_markdown_html(value)}</div>'
+
+def _markdown_html(text):
+    """
+    把页面中使用的 Markdown 子集转换为HTML
+    
+    支持标题、无序和有序列表、代码块、粗体、斜体和行内代码，其他内容按段落显示；
+    与 st.markdown 相同，先去掉多行字符串的公共缩进。
+    """
+    parts = []
+    paragraph = []
+    list_tag = None
+    code = None
+    
+    def close_blocks():
+        nonlocal list_tag
+        if paragraph:
+            parts.append(f'<p>{_inline_markdown(" ".join(paragraph))}</p>')
+            paragraph.clear()
+        if list_tag:
+            parts.append(f'</{list_tag}>')
+            list_tag = None
+    
+    for line in textwrap.dedent(str(text)).strip('\n').splitlines():
+        stripped = line.strip()
+        if code is not None:
+            if stripped.startswith('```'):
+                parts.append(f'<pre><code>{html.escape(chr(10).join(code))}</code></pre>')
+                code = None
+            else:
+                code.append(line)
+            continue
+        
+        heading = re.match(r'(#{1,6})\s+(.*)', stripped)
+        item = re.match(r'([-*+]|\d+\.)\s+(.*)', stripped)
+        if stripped.startswith('```'):
+            close_blocks()
+            code = []
+        elif heading:
+            close_blocks()
+            level = len(heading.group(1))
+            parts.append(f'<h{level}>{_inline_markdown(heading.group(2))}</h{level}>')
+        elif item:
+            tag = 'ol' if item.group(1)[0].isdigit() else 'ul'
+            if list_tag != tag:
+                close_blocks()
+                parts.append(f'<{tag}>')
+                list_tag = tag
+            parts.append(f'<li>{_inline_markdown(item.group(2))}</li>')
+        elif not stripped:
+            close_blocks()
+        else:
+            if list_tag:
+                close_blocks()
+            paragraph.append(stripped)
+    
+    if code is not None:
+        parts.append(f'<pre><code>{html.escape(chr(10).join(code))}</code></pre>')
+    close_blocks()
+    return ''.join(parts)
+
+def _inline_markdown(text):
+    """转义HTML并转换行内代码、粗体和斜体"""
+    text = html.escape(text)
+    text = re.sub(r'`([^`]+)`', r'<code>\1</code>', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
+    return re.sub(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])', r'<em>\1</em>', text)
+
+def _table_html(value):
+    if hasattr(value, 'data') and hasattr(value, 'to_html') and not isinstance(value, pd.DataFrame):
+        # pandas Styler：报告中只输出底层数据
+        value = value.data
+    if not isinstance(value, pd.DataFrame):
+        value = pd.DataFrame(value)
+    note = f'<p class="caption">共 {len(value)} 行，显示前 {MAX_TABLE_ROWS} 行</p>' if len(value) > MAX_TABLE_ROWS else ''
+    return value.head(MAX_TABLE_ROWS).to_html(classes='table', border=0) + note
+
+def _metric_html(label, value=None, delta=None, *args, **kwargs):
+    delta = kwargs.get('delta', delta)
+    delta_html = f'<div class="delta">{html.escape(str(delta))}</div>' if delta is not None else ''
+    return (f'<div class="metric"><div class="label">{html.escape(str(label))}</div>'
+            f'<div class="value">{html.escape(str(value))}</div>{delta_html}</div>')
+
+REPORT_STYLE = """
+body { font-family: sans-serif; margin: 2em auto; max-width: 1200px; color: #262730; }
+.metrics { display: flex; flex-wrap: wrap; gap: 1em; margin: 1em 0; }
+.metric { flex: 1; min-width: 150px; padding: 0.5em 1em; border: 1px solid #ddd; border-radius: 4px; }
+.metric .value { font-size: 1.8em; }
+.metric .delta, .caption { color: #808495; font-size: 0.9em; }
+.text { margin: 0.5em 0; }
+pre.text, pre { white-space: pre-wrap; background: #f6f6f6; padding: 0.5em; }
+.alert { padding: 0.75em 1em; margin: 0.5em 0; border-radius: 4px; }
+.alert p, .text p { margin: 0.25em 0; }
+.info { background: #e8f1fb; } .warning { background: #fffbe6; }
+.error { background: #fdecea; } .success { background: #e8f5e9; }
+.table { border-collapse: collapse; font-size: 0.9em; margin: 0.5em 0; }
+.table th, .table td { padding: 0.25em 0.75em; border-bottom: 1px solid #eee; text-align: right; }
+"""
+
+def _page_html(title, body):
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f'<style>{REPORT_STYLE}</style></head><body>{body}</body></html>')
+
+# 工作进程中加载一次的数据
+_worker_data = None
+
+def _init_worker(data_dir=None):
+    """工作进程初始化：关闭无界面模式的警告并加载数据"""
+    global _worker_data
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    from modules.data_loader import load_data
+    _worker_data = load_data(data_dir)
+
+def render_page(page, output_dir, formats=('html',), data=None):
+    """
+    离线渲染一个页面并写入报告文件
+    
+    Args:
+        page (str): REPORT_PAGES 中的页面标识
+        output_dir (str): 输出目录
+        formats (tuple): 输出格式，'html' 为单个HTML文件，'png' 为每个图表一张图片
+        data (dict): 包含所有数据集的字典，默认使用工作进程加载的数据
+    
+    Returns:
+        dict: 页面标识、标题、耗时、图表数、输出文件和错误信息
+    """
+    title, module_name, function_name = REPORT_PAGES[page]
+    data = data if data is not None else _worker_data
+    if not data:
+        raise RuntimeError("无法加载数据，请确认数据目录中的文件存在")
+    recorder = ReportRecorder()
+    error = None
+    start = time.perf_counter()
+    with recorder.capture():
+        try:
+            getattr(import_module(module_name), function_name)(data)
+        except Exception:
+            # 页面出错时仍然输出已渲染的部分，错误信息写在报告末尾
+            error = traceback.format_exc()
+            st.error(f"渲染页面时出错:\n{error}")
+    seconds = time.perf_counter() - start
+    
+    files = []
+    if 'html' in formats:
+        path = os.path.join(output_dir, f"{page}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(recorder.to_html(title))
+        files.append(path)
+    if 'png' in formats:
+        for i, fig in enumerate(recorder.figures, start=1):
+            path = os.path.join(output_dir, page, f"{i:02d}.png")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fig.write_image(path)
+            files.append(path)
+    
+    return {'page': page, 'title': title, 'seconds': seconds, 'figures': len(recorder.figures),
+            'files': files, 'error': error}
+
+def render_reports(output_dir, pages=None, formats=('html',), workers=None, data_dir=None, progress=None):
+    """
+    在进程池中并行渲染多个页面，并生成报告索引 index.html
+    
+    每个工作进程加载一次数据，依次渲染分配给它的页面；页面之间没有依赖，
+    计算较重的页面在不同进程中同时进行。
+    
+    Args:
+        output_dir (str): 输出目录
+        pages (list): 页面标识，默认全部页面
+        formats (tuple): 输出格式，见 REPORT_FORMATS
+        workers (int): 进程数，默认为CPU核数与页面数中较小的一个；为1时在当前进程中渲染
+        data_dir (str): 数据文件目录，默认为项目的 data 目录
+        progress (callable): 每个页面完成时以结果字典调用
+    
+    Returns:
+        list: 各页面的结果，顺序与 pages 相同
+    """
+    pages = list(pages or REPORT_PAGES)
+    unknown = [page for page in pages if page not in REPORT_PAGES]
+    if unknown:
+        raise ValueError(f"未知的页面: {', '.join(unknown)}")
+    if 'png' in formats and not PNG_EXPORT_AVAILABLE:
+        raise RuntimeError("导出PNG需要安装 kaleido")
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or min(os.cpu_count() or 1, len(pages))
+    
+    results = {}
+    if workers == 1:
+        _init_worker(data_dir)
+        for page in pages:
+            results[page] = render_page(page, output_dir, formats)
+            if progress:
+                progress(results[page])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir,)) as executor:
+            futures = [executor.submit(render_page, page, output_dir, formats) for page in pages]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['page']] = result
+                if progress:
+                    progress(result)
+    
+    ordered = [results[page] for page in pages]
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(_index_html(ordered))
+    return ordered
+
+def _index_html(results):
+    rows = []
+    for result in results:
+        status = '出错' if result['error'] else '完成'
+        link = f'<a href="{html.escape(result["page"])}.html">{html.escape(result["title"])}</a>'
+        rows.append(f'<tr><td>{link}</td><td>{result["figures"]}</td>'
+                    f'<td>{result["seconds"]:.2f}</td><td>{status}</td></tr>')
+    generated = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+    body = (f'<h1>GlobalMart分析报告</h1><p class="caption">生成时间: {generated}</p>'
+            '<table class="table"><tr><th>页面</th><th>图表数</th><th>渲染耗时(秒)</th><th>状态</th></tr>'
+            f'{"".join(rows)}</table>')
+    return _page_html('GlobalMart分析报告', body)
@@ -0,0 +1,357 @@
+import dataclasses
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.data_loader import get_data_version, get_sample_fingerprint
+from modules.instrumentation import track
+
+# 内存中缓存结果的总大小上限
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 淘汰策略：lru 淘汰最久未使用的结果，lfu 淘汰命中次数最少的结果（次数相同时淘汰较久未使用的）
+EVICTION_POLICIES = ('lru', 'lfu')
+
+# 淘汰的结果不小于该大小时写入磁盘，较小的结果重新计算更快
+DEFAULT_SPILL_MIN_BYTES = 1024 * 1024
+
+# 磁盘上溢出结果的总大小上限，超出时删除最早写入的结果
+DEFAULT_SPILL_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "globalmart_result_cache")
+
+# 环境变量可以覆盖内存上限（MB）、淘汰策略和溢出目录
+RESULT_CACHE_MB_ENV = "GLOBALMART_RESULT_CACHE_MB"
+RESULT_CACHE_POLICY_ENV = "GLOBALMART_RESULT_CACHE_POLICY"
+RESULT_CACHE_DIR_ENV = "GLOBALMART_RESULT_CACHE_DIR"
+
+# 溢出结果以 Parquet 列式格式保存，需要 pyarrow
+SPILL_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# 区分"未缓存"和缓存的结果本身为None
+_MISSING = object()
+
+class ResultCache:
+    """
+    计算结果缓存
+    
+    以 (函数名, 数据版本, 参数) 为键保存计算函数的返回值，所有结果的总字节数不超过
+    内存上限，超出时按 LRU 或 LFU 策略淘汰。较大的淘汰结果中的 DataFrame 以 Parquet
+    格式写入磁盘，其余字段用 pickle 保存；之后再次请求时从磁盘读回，不需要重新计算。
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, policy='lru', spill_dir=DEFAULT_SPILL_DIR,
+                 spill_min_bytes=DEFAULT_SPILL_MIN_BYTES, spill_max_bytes=DEFAULT_SPILL_MAX_BYTES):
+        """
+        Args:
+            max_bytes (int): 内存中结果的总大小上限
+            policy (str): 淘汰策略，见 EVICTION_POLICIES
+            spill_dir (str): 溢出目录，None 表示不写入磁盘
+            spill_min_bytes (int): 写入磁盘的结果的最小大小
+            spill_max_bytes (int): 磁盘上溢出结果的总大小上限
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"不支持的淘汰策略: {policy}，可选: {', '.join(EVICTION_POLICIES)}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        # 每个进程使用单独的子目录，多进程渲染时互不干扰
+        self.spill_dir = os.path.join(spill_dir, str(os.getpid())) if spill_dir and SPILL_AVAILABLE else None
+        self.spill_min_bytes = spill_min_bytes
+        self.spill_max_bytes = spill_max_bytes
+        # 键 -> [结果, 字节数, 命中次数]，按最近使用的顺序排列
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # 键 -> (目录, 字节数)，按写入顺序排列
+        self._spilled = OrderedDict()
+        self._spilled_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'spill_hits': 0, 'evictions': 0, 'spills': 0}
+        # 缓存在所有会话之间共享
+        self._lock = threading.RLock()
+        if self.spill_dir:
+            # 溢出的结果只在本进程内有效，清除同一进程号以前留下的文件
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+    
+    def get(self, key, default=None):
+        """返回缓存的结果，先查内存再查磁盘，都不存在时返回 default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry[2] += 1
+                self._stats['hits'] += 1
+                return entry[0]
+            spilled = self._spilled.get(key)
+        
+        if spilled is not None:
+            try:
+                value = _read_spill(spilled[0])
+            except Exception:
+                value = _MISSING
+            if value is not _MISSING:
+                with self._lock:
+                    self._stats['spill_hits'] += 1
+                # 读回的结果重新放入内存，磁盘上的文件保留，再次淘汰时不需要重写
+                self.put(key, value)
+                return value
+        
+        with self._lock:
+            self._stats['misses'] += 1
+        return default
+    
+    def put(self, key, value):
+        """保存结果，超出内存上限时按淘汰策略淘汰，较大的淘汰结果写入磁盘"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            # 单个结果超过上限时不缓存
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = [value, size, 0]
+            self._total_bytes += size
+            evicted = []
+            while self._total_bytes > self.max_bytes:
+                victim = self._select_victim()
+                victim_value, victim_size, _ = self._entries.pop(victim)
+                self._total_bytes -= victim_size
+                self._stats['evictions'] += 1
+                evicted.append((victim, victim_value, victim_size))
+        
+        # 写入磁盘较慢，在锁外进行
+        for victim, victim_value, victim_size in evicted:
+            if self.spill_dir and victim_size >= self.spill_min_bytes:
+                self._spill(victim, victim_value)
+    
+    def _select_victim(self):
+        if self.policy == 'lfu':
+            # OrderedDict 从最久未使用的开始遍历，min 返回次数相同的结果中最久未使用的
+            return min(self._entries, key=lambda key: self._entries[key][2])
+        return next(iter(self._entries))
+    
+    def _spill(self, key, value):
+        with self._lock:
+            if key in self._spilled:
+                return
+        path = os.path.join(self.spill_dir, hashlib.md5(key.encode('utf-8')).hexdigest())
+        try:
+            size = _write_spill(path, value)
+        except Exception:
+            # 无法以列式格式保存的结果（如列名不是字符串）直接丢弃
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        if size is None:
+            return
+        
+        with self._lock:
+            self._spilled[key] = (path, size)
+            self._spilled_bytes += size
+            self._stats['spills'] += 1
+            removed = []
+            while self._spilled_bytes > self.spill_max_bytes and len(self._spilled) > 1:
+                _, (old_path, old_size) = self._spilled.popitem(last=False)
+                self._spilled_bytes -= old_size
+                removed.append(old_path)
+        for old_path in removed:
+            shutil.rmtree(old_path, ignore_errors=True)
+    
+    def clear(self):
+        """清空内存和磁盘上的所有结果"""
+        with self._lock:
+            paths = [path for path, _ in self._spilled.values()]
+            self._entries.clear()
+            self._spilled.clear()
+            self._total_bytes = 0
+            self._spilled_bytes = 0
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def get_stats(self):
+        """返回结果数量、占用字节数、命中/未命中/磁盘命中次数以及淘汰和溢出次数"""
+        with self._lock:
+            requests = self._stats['hits'] + self._stats['spill_hits'] + self._stats['misses']
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'policy': self.policy,
+                **self._stats,
+                'spilled_entries': len(self._spilled),
+                'spilled_bytes': self._spilled_bytes,
+                'hit_rate': (self._stats['hits'] + self._stats['spill_hits']) / requests if requests else 0,
+            }
+
+def estimate_size(value):
+    """
+    估计结果占用的内存字节数
+    
+    DataFrame 和 Series 按 memory_usage(deep=True) 计算，数据类、字典、列表和元组
+    递归累加各元素，其他对象使用 sys.getsizeof。
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(estimate_size(getattr(value, field.name))
+                                          for field in dataclasses.fields(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def _split_frames(value):
+    """
+    把结果（DataFrame、Series、数据类、字典或元组）拆分为 DataFrame 字段和其余字段
+    
+    Returns:
+        tuple: (manifest, frames)，manifest 记录如何还原结果；结果中没有 DataFrame 时
+               frames 为空
+    """
+    if isinstance(value, pd.DataFrame):
+        return {'kind': 'frame'}, {'value': value}
+    if isinstance(value, pd.Series):
+        return {'kind': 'series', 'name': value.name}, {'value': value.to_frame(name='value')}
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        fields = {field.name: getattr(value, field.name) for field in dataclasses.fields(value)}
+        manifest = {'kind': 'dataclass', 'type': type(value)}
+    elif isinstance(value, dict):
+        fields = value
+        manifest = {'kind': 'dict'}
+    elif isinstance(value, tuple):
+        fields = {str(i): item for i, item in enumerate(value)}
+        manifest = {'kind': 'tuple'}
+    else:
+        return None, {}
+    frames = {name: field for name, field in fields.items() if isinstance(field, pd.DataFrame)}
+    manifest['rest'] = {name: field for name, field in fields.items() if name not in frames}
+    return manifest, frames
+
+def _write_spill(path, value):
+    """把结果写入目录，DataFrame 写为 Parquet 文件；返回写入的字节数，无法溢出时返回None"""
+    manifest, frames = _split_frames(value)
+    if not frames:
+        return None
+    os.makedirs(path, exist_ok=True)
+    manifest['frames'] = {}
+    for i, (name, frame) in enumerate(frames.items()):
+        file_name = f"frame_{i}.parquet"
+        frame.to_parquet(os.path.join(path, file_name), index=True)
+        manifest['frames'][name] = file_name
+    with open(os.path.join(path, 'manifest.pkl'), 'wb') as f:
+        pickle.dump(manifest, f)
+    return sum(entry.stat().st_size for entry in os.scandir(path))
+
+def _read_spill(path):
+    """从溢出目录还原结果"""
+    with open(os.path.join(path, 'manifest.pkl'), 'rb') as f:
+        manifest = pickle.load(f)
+    frames = {name: pd.read_parquet(os.path.join(path, file_name))
+              for name, file_name in manifest['frames'].items()}
+    
+    if manifest['kind'] == 'frame':
+        return frames['value']
+    if manifest['kind'] == 'series':
+        return frames['value']['value'].rename(manifest['name'])
+    fields = {**manifest['rest'], **frames}
+    if manifest['kind'] == 'dataclass':
+        return manifest['type'](**fields)
+    if manifest['kind'] == 'tuple':
+        return tuple(fields[str(i)] for i in range(len(fields)))
+    return fields
+
+def _frame_key(frame):
+    """
+    DataFrame 在缓存键中的表示
+    
+    加载时标记的数据版本保存在 attrs 中，会被复制到筛选、增加列或修改值后得到的 DataFrame 上。
+    带版本的 DataFrame 在版本之外附加行数、列名和等间隔抽取的若干行的哈希，派生数据的键
+    不会与原数据集相同；没有版本的 DataFrame 按全部内容计算版本。
+    """
+    version = get_data_version(frame)
+    if 'data_version' not in frame.attrs:
+        return version
+    return f"{version}:{get_sample_fingerprint(frame)}"
+
+def _key_part(value, datasets=None):
+    """把参数转换为缓存键的一部分：数据集用数据版本和内容指纹代替，其他参数原样保留"""
+    if isinstance(value, dict) and value and all(isinstance(item, pd.DataFrame) for item in value.values()):
+        if datasets:
+            value = {name: value[name] for name in datasets if name in value}
+        return {name: _frame_key(frame) for name, frame in sorted(value.items())}
+    if isinstance(value, pd.DataFrame):
+        return _frame_key(value)
+    if isinstance(value, pd.Series):
+        return _frame_key(value.to_frame())
+    return value
+
+def make_result_key(name, args=(), kwargs=None, datasets=None):
+    """
+    生成计算结果的缓存键
+    
+    Args:
+        name (str): 计算函数名
+        args (tuple): 位置参数，数据集字典和 DataFrame 用数据版本和内容指纹代替
+        kwargs (dict): 关键字参数
+        datasets (list): 数据集字典中结果依赖的数据集，其他数据集变化时不影响缓存
+    
+    Returns:
+        str: 缓存键
+    """
+    parts = {
+        'args': [_key_part(arg, datasets) for arg in args],
+        'kwargs': {key: _key_part(value, datasets) for key, value in (kwargs or {}).items()},
+    }
+    params_text = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return f"{name}:{hashlib.md5(params_text.encode('utf-8')).hexdigest()[:16]}"
+
+@st.cache_resource
+def get_result_cache():
+    """返回所有会话共享的计算结果缓存，内存上限、淘汰策略和溢出目录可以用环境变量设置"""
+    max_mb = os.environ.get(RESULT_CACHE_MB_ENV)
+    return ResultCache(
+        max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES,
+        policy=os.environ.get(RESULT_CACHE_POLICY_ENV, 'lru'),
+        spill_dir=os.environ.get(RESULT_CACHE_DIR_ENV, DEFAULT_SPILL_DIR),
+    )
+
+def memoize(name=None, datasets=None):
+    """
+    缓存计算函数结果的装饰器
+    
+    结果按 (函数名, 参数) 缓存在 get_result_cache() 中，数据集字典和 DataFrame 参数以
+    数据版本和内容指纹作为键。缓存的结果在会话之间共享，调用方不应修改返回值。
+    
+    Args:
+        name (str): 缓存和性能统计中使用的名称，默认使用函数的限定名
+        datasets (list): 数据集字典参数中结果依赖的数据集
+    """
+    def decorator(func):
+        func_name = name or func.__qualname__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_result_key(func_name, args, kwargs, datasets)
+            cache = get_result_cache()
+            with track('compute', func_name) as event:
+                value = cache.get(key, _MISSING)
+                event['cache_hit'] = value is not _MISSING
+                if value is _MISSING:
+                    value = func(*args, **kwargs)
+                    cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,283 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.compute.engine import resolve_engine, to_lazy
+from modules.data_loader import get_data_version, month_labels
+from modules.instrumentation import track
+
+# 立方体的维度，日期之外都是分类维度
+CUBE_DIMENSIONS = ['date', 'product_category', 'payment_method', 'device', 'status', 'region', 'segment']
+
+# 订单级别的维度：同一订单的所有明细行在这些维度上取值相同，产品类别除外
+ORDER_DIMENSIONS = [dim for dim in CUBE_DIMENSIONS if dim != 'product_category']
+
+# 从客户数据关联到交易的维度
+CUSTOMER_DIMENSIONS = ['region', 'segment']
+
+def build_sales_cube(transactions_df, customers_df, engine=None):
+    """
+    将交易明细预先汇总为多维立方体
+    
+    立方体包含以下几张表（客户级别的汇总见 modules.customer_360）：
+        items     - 全部维度（含产品类别）的明细汇总：销售额、数量、明细行数、订单数
+        orders    - 订单级别维度的汇总：每个订单只计一次，订单数可以任意相加
+        daily     - 按日期排序的每日销售额、订单数及其前缀和，用于日期范围查询
+    
+    订单数的去重依赖订单的维度取值：订单级别的维度在同一订单内相同，因此 orders 表中
+    的订单数在任意筛选和汇总下都是精确的；items 表中的订单数在按产品类别分组时精确，
+    跨多个类别汇总时同一订单可能被重复计数。
+    
+    Args:
+        transactions_df (pd.DataFrame): 交易明细数据
+        customers_df (pd.DataFrame): 客户数据
+        engine (str): 计算引擎，见 modules.compute.engine.resolve_engine
+    
+    Returns:
+        dict: {'items': pd.DataFrame, 'orders': pd.DataFrame, 'daily': dict}
+    """
+    customer_columns = ['customer_id'] + [col for col in CUSTOMER_DIMENSIONS if col in customers_df.columns]
+    customer_info = customers_df[customer_columns].drop_duplicates('customer_id')
+    
+    # 只保留立方体需要的列，避免复制整张交易表
+    detail_columns = ['transaction_id', 'customer_id', 'total_amount', 'quantity'] + \
+                     [dim for dim in CUBE_DIMENSIONS if dim in transactions_df.columns]
+    detail = transactions_df[[col for col in dict.fromkeys(detail_columns) if col in transactions_df.columns]]
+    if resolve_engine(engine) == 'polars':
+        items, orders = _build_cube_tables_polars(detail, customer_info)
+        for table in (items, orders):
+            table['month'] = month_labels(table['date'])
+        return {'items': items, 'orders': orders, 'daily': build_date_index(orders)}
+    
+    detail = detail.merge(customer_info, on='customer_id', how='left')
+    detail['date'] = pd.to_datetime(detail['date'], errors='coerce')
+    # 订单ID转为整数编码，去重计数和按订单分组时比较整数而不是字符串
+    detail['order_code'] = pd.factorize(detail['transaction_id'])[0]
+    dimensions = [dim for dim in CUBE_DIMENSIONS if dim in detail.columns]
+    for dim in dimensions:
+        if dim != 'date':
+            detail[dim] = detail[dim].astype('category')
+    
+    # 明细汇总：每个维度组合一行
+    aggregations = {
+        'revenue': ('total_amount', 'sum'),
+        'line_items': ('total_amount', 'size'),
+        'orders': ('order_code', 'nunique'),
+    }
+    if 'quantity' in detail.columns:
+        aggregations['quantity'] = ('quantity', 'sum')
+    items = detail.groupby(dimensions, observed=True, dropna=False, sort=False).agg(**aggregations).reset_index()
+    
+    # 订单汇总：先合并为每个订单一行，订单属性取第一行的值
+    order_dimensions = [dim for dim in ORDER_DIMENSIONS if dim in detail.columns]
+    per_order = detail.groupby('order_code', sort=False).agg(
+        revenue=('total_amount', 'sum'),
+        **{dim: (dim, 'first') for dim in order_dimensions}
+    )
+    orders = per_order.groupby(order_dimensions, observed=True, dropna=False, sort=False).agg(
+        revenue=('revenue', 'sum'),
+        orders=('revenue', 'size'),
+    ).reset_index()
+    
+    for table in (items, orders):
+        table['month'] = month_labels(table['date'])
+    
+    return {'items': items, 'orders': orders, 'daily': build_date_index(orders)}
+
+def _build_cube_tables_polars(detail, customer_info):
+    """build_sales_cube 中 items 和 orders 两张表的 Polars 实现，结果与 pandas 实现相同"""
+    import polars as pl
+    
+    detail = detail.assign(date=pd.to_datetime(detail['date'], errors='coerce'))
+    columns = set(detail.columns) | set(customer_info.columns)
+    dimensions = [dim for dim in CUBE_DIMENSIONS if dim in columns]
+    order_dimensions = [dim for dim in ORDER_DIMENSIONS if dim in columns]
+    
+    # 维度与 pandas 实现一样使用分类类型（类别为全部取值排序后的结果），按整数编码分组
+    enums = {}
+    for dim in dimensions:
+        if dim != 'date':
+            source = detail[dim] if dim in detail.columns else customer_info[dim]
+            enums[dim] = pl.Enum(sorted(source.dropna().unique()))
+    joined = to_lazy(detail).join(to_lazy(customer_info), on='customer_id', how='left', maintain_order='left')
+    joined = joined.with_columns([pl.col(dim).cast(dtype) for dim, dtype in enums.items()])
+    
+    aggregations = [
+        pl.col('total_amount').sum().alias('revenue'),
+        pl.len().cast(pl.Int64).alias('line_items'),
+        pl.col('transaction_id').n_unique().cast(pl.Int64).alias('orders'),
+    ]
+    if 'quantity' in columns:
+        aggregations.append(pl.col('quantity').sum())
+    items = joined.group_by(dimensions, maintain_order=True).agg(aggregations)
+    
+    # 与 pandas 的 first 一致，订单属性取第一个非空值
+    per_order = joined.group_by('transaction_id', maintain_order=True).agg(
+        pl.col('total_amount').sum().alias('revenue'),
+        *[pl.col(dim).drop_nulls().first() for dim in order_dimensions],
+    )
+    orders = per_order.group_by(order_dimensions, maintain_order=True).agg(
+        pl.col('revenue').sum(),
+        pl.len().cast(pl.Int64).alias('orders'),
+    )
+    items, orders = [table.to_pandas() for table in pl.collect_all([items, orders])]
+    for table in (items, orders):
+        for dim in enums:
+            if dim in table.columns:
+                table[dim] = table[dim].cat.as_unordered()
+    return items, orders
+
+def build_date_index(orders):
+    """
+    构建按日期排序的前缀和索引
+    
+    每个订单只属于一个日期，因此每日订单数可以直接相加，任意日期范围的订单数
+    等于两个前缀和之差，不需要保存每日的订单集合。
+    
+    Args:
+        orders (pd.DataFrame): 订单汇总表，包含 date、revenue、orders、status 列
+    
+    Returns:
+        dict: dates（升序日期）、revenue/orders/completed_orders（每日值）、
+              revenue_prefix/orders_prefix/completed_orders_prefix（长度为天数+1的前缀和）
+    """
+    orders = orders.dropna(subset=['date'])
+    orders = orders.assign(completed_orders=orders['orders'].where(orders['status'] == 'Completed', 0))
+    daily = orders.groupby('date', sort=True)[['revenue', 'orders', 'completed_orders']].sum()
+    index = {'dates': daily.index.to_numpy(dtype='datetime64[ns]')}
+    for measure in ('revenue', 'orders', 'completed_orders'):
+        values = daily[measure].to_numpy(dtype=float)
+        prefix = np.zeros(len(values) + 1)
+        np.cumsum(values, out=prefix[1:])
+        index[measure] = values
+        index[f'{measure}_prefix'] = prefix
+    return index
+
+def query_date_range(index, start_date, end_date):
+    """
+    计算日期范围（含首尾）内的销售额、订单数和平均订单金额
+    
+    两次二分查找加一次减法，耗时与数据量无关。
+    
+    Args:
+        index (dict): build_date_index 返回的索引
+        start_date: 开始日期
+        end_date: 结束日期
+    
+    Returns:
+        dict: revenue、orders、completed_orders、avg_order_value，以及范围在索引中的位置 start、end
+    """
+    dates = index['dates']
+    start = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date), 'ns'), side='left'))
+    end = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date), 'ns'), side='right'))
+    end = max(start, end)
+    revenue = index['revenue_prefix'][end] - index['revenue_prefix'][start]
+    orders = index['orders_prefix'][end] - index['orders_prefix'][start]
+    completed_orders = index['completed_orders_prefix'][end] - index['completed_orders_prefix'][start]
+    return {
+        'revenue': revenue,
+        'orders': int(round(orders)),
+        'completed_orders': int(round(completed_orders)),
+        'avg_order_value': revenue / orders if orders > 0 else np.nan,
+        'start': start,
+        'end': end,
+    }
+
+def daily_series(index, start=0, end=None):
+    """返回索引中 [start, end) 位置的每日销售额，用于绘制日销售趋势"""
+    return pd.DataFrame({
+        'date': index['dates'][start:end],
+        'total_amount': index['revenue'][start:end],
+        'orders': index['orders'][start:end],
+    })
+
+# 聚合结果只读，使用 cache_resource 在会话之间共享同一份对象，避免每次读取时反序列化
+@st.cache_resource(ttl=3600, show_spinner="正在构建销售数据立方体...")
+def _cached_cube(data_version, _transactions_df, _customers_df):
+    with track('compute', 'sales_cube', rows=len(_transactions_df)):
+        return build_sales_cube(_transactions_df, _customers_df)
+
+def get_sales_cube(data):
+    """
+    获取销售数据立方体，按交易和客户数据的版本缓存，同一版本只构建一次
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        dict: build_sales_cube 返回的立方体
+    """
+    version = get_data_version({'transactions': data["transactions"], 'customers': data["customers"]})
+    return _cached_cube(version, data["transactions"], data["customers"])
+
+def query_cube(cube, by=None, filters=None):
+    """
+    从立方体中按维度汇总销售额和订单数
+    
+    不涉及产品类别的查询使用订单汇总表，订单数精确；按产品类别分组或筛选时使用
+    明细汇总表。明细汇总表的订单数按产品类别去重，同一订单的不同类别会分别计数，
+    因此结果行跨多个产品类别时（未按产品类别分组且类别筛选不止一个取值）订单数和
+    平均订单金额为 NaN。
+    
+    Args:
+        cube (dict): get_sales_cube 返回的立方体
+        by (list): 分组维度，可以包含 'month'，为空时返回总计
+        filters (dict): 维度筛选条件，值为取值列表；'date' 的值为 (开始日期, 结束日期)
+    
+    Returns:
+        pd.DataFrame: 每个分组一行，包含 revenue、orders、avg_order_value 列
+    """
+    by = list(by or [])
+    table, orders_additive = cube_table(cube, by, filters)
+    
+    measures = [col for col in ('revenue', 'orders', 'quantity', 'line_items') if col in table.columns]
+    if by:
+        # 与 DataFrame.groupby 一致，分组维度为空值的行不参与分组
+        result = table.groupby(by, observed=True, sort=True)[measures].sum().reset_index()
+    else:
+        result = table[measures].sum().to_frame().T
+    
+    if not orders_additive:
+        result['orders'] = np.nan
+    result['avg_order_value'] = result['revenue'] / result['orders'].replace(0, np.nan)
+    return result
+
+def cube_table(cube, by=None, filters=None):
+    """
+    选择回答查询的立方体汇总表并应用筛选
+    
+    Args:
+        cube (dict): get_sales_cube 返回的立方体
+        by (list): 分组维度
+        filters (dict): 维度筛选条件，格式同 query_cube
+    
+    Returns:
+        tuple: (筛选后的汇总表, 按分组汇总后订单数是否精确)
+    
+    Raises:
+        ValueError: 筛选或分组维度不在立方体中
+    """
+    by = list(by or [])
+    filters = filters or {}
+    
+    uses_category = 'product_category' in by or 'product_category' in filters
+    table = cube['items'] if uses_category else cube['orders']
+    unknown = [dim for dim in [*by, *filters] if dim not in table.columns]
+    if unknown:
+        raise ValueError(f"销售立方体不支持的维度: {', '.join(unknown)}")
+    
+    # 明细汇总表中每个订单在每个产品类别下只计一次，每个结果行只涉及一个产品类别时订单数才能相加
+    orders_additive = (not uses_category or 'product_category' in by
+                       or len(filters['product_category']) == 1)
+    return _apply_filters(table, filters), orders_additive
+
+def _apply_filters(table, filters):
+    mask = np.ones(len(table), dtype=bool)
+    for dim, values in filters.items():
+        if dim == 'date':
+            start, end = values
+            dates = table['date']
+            mask &= ((dates >= pd.to_datetime(start)) & (dates <= pd.to_datetime(end))).to_numpy()
+        else:
+            mask &= table[dim].isin(values).to_numpy()
+    return table[mask] if not mask.all() else table
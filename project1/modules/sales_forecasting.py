@@ -4,21 +4,62 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
 
-# 尝试导入统计和机器学习库，如果不可用则跳过
-try:
-    from statsmodels.tsa.seasonal import seasonal_decompose
-    from statsmodels.tsa.statespace.sarimax import SARIMAX
-    from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
-    import pmdarima as pm
-    from sklearn.metrics import mean_absolute_error, mean_squared_error
-    from prophet import Prophet
-    import matplotlib.pyplot as plt
-    ADVANCED_MODELS_AVAILABLE = True
-except ImportError:
-    ADVANCED_MODELS_AVAILABLE = False
+from modules.compute.forecast import (ADVANCED_MODELS_AVAILABLE, BASIC_FORECAST_METHODS, FORECAST_METHODS,
+                                      compute_campaign_effect, decompose_monthly_sales, forecast_monthly_sales,
+                                      prepare_sales_history)
+from modules.compute_pool import run_heavy
+from modules.data_loader import get_data_version
+from modules.figure_cache import plotly_chart
+from modules.instrumentation import instrument
+from modules.job_runner import NOT_READY, display_job, submit_job
+from modules.result_cache import memoize
 
+# 时间序列汇总和预测只依赖数据版本和预测参数，切换页面或调整其他控件时复用
+@memoize('sales_history', datasets=['transactions'])
+def get_sales_history(data):
+    """
+    获取当前交易数据的每日和每月销售额汇总
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        SalesHistory: 历史销售的时间序列汇总
+    """
+    return prepare_sales_history(data["transactions"])
+
+@memoize('sales_decomposition', datasets=['transactions'])
+def _decomposition_result(data):
+    return decompose_monthly_sales(get_sales_history(data).monthly)
+
+@memoize('campaign_effect', datasets=['transactions', 'marketing'])
+def _campaign_effect_result(data):
+    return compute_campaign_effect(get_sales_history(data).daily, data["marketing"])
+
+@memoize('forecast', datasets=['transactions'])
+def get_forecast_result(data, method, periods, window_size=3, alpha=0.3):
+    """
+    获取月度销售预测结果，按数据版本和预测参数缓存
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        method (str): 预测方法，见 FORECAST_METHODS
+        periods (int): 预测的月数
+        window_size (int): 简单移动平均的窗口大小
+        alpha (float): 指数平滑的平滑因子
+    
+    Returns:
+        ForecastResult: 预测结果
+    """
+    return forecast_monthly_sales(get_sales_history(data).monthly, method, periods, window_size, alpha)
+
+def _forecast_job(monthly_sales, method, periods, progress):
+    progress(0.1, f"拟合{method}模型")
+    # 模型拟合在计算进程池中运行（如已配置），不阻塞其他会话
+    return run_heavy('forecast', forecast_monthly_sales, monthly_sales, method, periods)
+
+@instrument('page')
 def forecast_sales(data):
     """
     执行销售预测分析
@@ -34,32 +75,19 @@ def forecast_sales(data):
         高级预测模型所需的一些库未安装。为使用全部功能，请安装以下库:
         - statsmodels
         - pmdarima
-        - sklearn
         - prophet
-        - matplotlib
         
         你可以通过运行以下命令进行安装:
         ```
-        pip install statsmodels pmdarima scikit-learn prophet matplotlib
+        pip install statsmodels pmdarima prophet
         ```
         """)
     
-    # 准备数据
-    transactions_df = data["transactions"]
-    
-    # 确保日期格式正确
-    transactions_df['date'] = pd.to_datetime(transactions_df['date'])
-    
-    # 聚合数据
-    # 按日期汇总销售数据
-    daily_sales = transactions_df.groupby('date')['total_amount'].sum().reset_index()
-    daily_sales = daily_sales.sort_values('date')
-    
-    # 计算一些派生特征
-    daily_sales['day_of_week'] = daily_sales['date'].dt.dayofweek
-    daily_sales['month'] = daily_sales['date'].dt.month
-    daily_sales['year'] = daily_sales['date'].dt.year
-    daily_sales['is_weekend'] = daily_sales['day_of_week'].apply(lambda x: 1 if x >= 5 else 0)
+    # 时间序列汇总和预测由 modules/compute/forecast.py 计算，不修改原始数据
+    history = get_sales_history(data)
+    daily_sales = history.daily
+    monthly_sales = history.monthly
+    monthly_pattern = history.month_pattern
     
     # 显示时间序列数据
     st.write("### 历史销售趋势")
@@ -73,12 +101,7 @@ def forecast_sales(data):
         labels={'date': '日期', 'total_amount': '销售金额'}
     )
     
-    st.plotly_chart(fig1, use_container_width=True)
-    
-    # 按月汇总
-    monthly_sales = daily_sales.groupby([daily_sales['year'], daily_sales['month']])['total_amount'].sum().reset_index()
-    monthly_sales['date'] = pd.to_datetime(monthly_sales[['year', 'month']].assign(day=1))
-    monthly_sales['month_name'] = monthly_sales['date'].dt.strftime('%Y-%m')
+    plotly_chart(fig1, 'forecast/daily_sales', use_container_width=True)
     
     # 创建月度销售趋势图
     fig2 = px.bar(
@@ -100,29 +123,20 @@ def forecast_sales(data):
         )
     )
     
-    st.plotly_chart(fig2, use_container_width=True)
+    plotly_chart(fig2, 'forecast/monthly_sales', use_container_width=True)
     
     # 销售模式分析
     st.write("### 销售模式分析")
     
-    # 按周几分析
-    weekday_sales = daily_sales.groupby('day_of_week')['total_amount'].agg(['mean', 'sum']).reset_index()
-    weekday_sales['day_name'] = weekday_sales['day_of_week'].apply(lambda x: ['周一', '周二', '周三', '周四', '周五', '周六', '周日'][x])
-    
     # 创建周几销售分布图
     fig3 = px.bar(
-        weekday_sales,
+        history.weekday,
         x='day_name',
         y='mean',
         title='平均每日销售额（按周几）',
         labels={'day_name': '星期', 'mean': '平均销售额'}
     )
     
-    # 按月份分析
-    monthly_pattern = daily_sales.groupby('month')['total_amount'].mean().reset_index()
-    month_names = ['一月', '二月', '三月', '四月', '五月', '六月', '七月', '八月', '九月', '十月', '十一月', '十二月']
-    monthly_pattern['month_name'] = monthly_pattern['month'].apply(lambda x: month_names[x-1])
-    
     # 创建月份销售分布图
     fig4 = px.bar(
         monthly_pattern,
@@ -135,118 +149,73 @@ def forecast_sales(data):
     col1, col2 = st.columns(2)
     
     with col1:
-        st.plotly_chart(fig3, use_container_width=True)
+        plotly_chart(fig3, 'forecast/weekday_pattern', use_container_width=True)
     
     with col2:
-        st.plotly_chart(fig4, use_container_width=True)
+        plotly_chart(fig4, 'forecast/month_pattern', use_container_width=True)
     
     # 季节性分解
     st.write("### 时间序列分解")
     
-    if ADVANCED_MODELS_AVAILABLE and len(monthly_sales) >= 12:
-        # 创建时间序列对象
-        ts_data = monthly_sales.set_index('date')['total_amount']
+    try:
+        decomposition = _decomposition_result(data)
+    except Exception as e:
+        st.error(f"执行时间序列分解时出错: {str(e)}")
+        decomposition = False
+    
+    if decomposition is None:
+        st.info("需要至少12个月的数据才能进行有意义的季节性分解，或者需要安装statsmodels库。")
+    elif decomposition is not False:
+        # 创建分解图表
+        fig5 = make_subplots(rows=4, cols=1, shared_xaxes=True, vertical_spacing=0.05)
         
-        # 执行季节性分解
-        try:
-            decomposition = seasonal_decompose(ts_data, model='additive', period=12)
-            
-            # 创建分解图表
-            fig5 = make_subplots(rows=4, cols=1, shared_xaxes=True, vertical_spacing=0.05)
-            
-            # 原始数据
-            fig5.add_trace(
-                go.Scatter(x=decomposition.observed.index, y=decomposition.observed, mode='lines', name='观测值'),
-                row=1, col=1
-            )
-            
-            # 趋势
-            fig5.add_trace(
-                go.Scatter(x=decomposition.trend.index, y=decomposition.trend, mode='lines', name='趋势'),
-                row=2, col=1
-            )
-            
-            # 季节性
-            fig5.add_trace(
-                go.Scatter(x=decomposition.seasonal.index, y=decomposition.seasonal, mode='lines', name='季节性'),
-                row=3, col=1
-            )
-            
-            # 残差
+        for row, (column, name) in enumerate([('observed', '观测值'), ('trend', '趋势'),
+                                              ('seasonal', '季节性'), ('resid', '残差')], start=1):
             fig5.add_trace(
-                go.Scatter(x=decomposition.resid.index, y=decomposition.resid, mode='lines', name='残差'),
-                row=4, col=1
+                go.Scatter(x=decomposition.index, y=decomposition[column], mode='lines', name=name),
+                row=row, col=1
             )
-            
-            # 更新布局
-            fig5.update_layout(
-                height=800,
-                title_text='销售时间序列分解',
-                showlegend=False
-            )
-            
-            st.plotly_chart(fig5, use_container_width=True)
-            
-            # 分解解释
-            st.markdown("""
-            **时间序列分解解释：**
-            
-            - **观测值**：原始月度销售数据
-            - **趋势**：长期销售增长或下降的模式
-            - **季节性**：周期性重复的销售模式，如每年特定月份的销售高峰或低谷
-            - **残差**：无法通过趋势或季节性解释的随机波动
-            
-            分解有助于理解销售的基本模式，为预测提供依据。
-            """)
-        except Exception as e:
-            st.error(f"执行时间序列分解时出错: {str(e)}")
-    else:
-        st.info("需要至少12个月的数据才能进行有意义的季节性分解，或者需要安装statsmodels库。")
+        
+        # 更新布局
+        fig5.update_layout(
+            height=800,
+            title_text='销售时间序列分解',
+            showlegend=False
+        )
+        
+        plotly_chart(fig5, 'forecast/decomposition', use_container_width=True)
+        
+        # 分解解释
+        st.markdown("""
+        **时间序列分解解释：**
+        
+        - **观测值**：原始月度销售数据
+        - **趋势**：长期销售增长或下降的模式
+        - **季节性**：周期性重复的销售模式，如每年特定月份的销售高峰或低谷
+        - **残差**：无法通过趋势或季节性解释的随机波动
+        
+        分解有助于理解销售的基本模式，为预测提供依据。
+        """)
     
     # 销售影响因素分析
     st.write("### 销售影响因素分析")
     
     # 合并促销活动数据
     if "marketing" in data:
-        marketing_df = data["marketing"]
-        marketing_df['start_date'] = pd.to_datetime(marketing_df['start_date'])
-        marketing_df['end_date'] = pd.to_datetime(marketing_df['end_date'])
-        
-        # 创建一个日期范围内的营销活动标记
-        date_range = pd.date_range(start=daily_sales['date'].min(), end=daily_sales['date'].max())
-        campaign_dates = pd.DataFrame({'date': date_range})
-        
-        # 标记每一天是否有活动
-        campaign_dates['has_campaign'] = 0
-        
-        for _, campaign in marketing_df.iterrows():
-            mask = (campaign_dates['date'] >= campaign['start_date']) & (campaign_dates['date'] <= campaign['end_date'])
-            campaign_dates.loc[mask, 'has_campaign'] = 1
-        
-        # 合并销售数据和活动数据
-        sales_with_campaigns = daily_sales.merge(campaign_dates, on='date', how='left')
-        
-        # 分析有无活动的销售差异
-        campaign_effect = sales_with_campaigns.groupby('has_campaign')['total_amount'].mean().reset_index()
-        campaign_effect['status'] = campaign_effect['has_campaign'].apply(lambda x: '有营销活动' if x == 1 else '无营销活动')
+        campaign = _campaign_effect_result(data)
         
         # 创建活动影响图表
         fig6 = px.bar(
-            campaign_effect,
+            campaign.effect,
             x='status',
             y='total_amount',
             title='营销活动对日均销售额的影响',
             labels={'status': '状态', 'total_amount': '平均日销售额'}
         )
         
-        st.plotly_chart(fig6, use_container_width=True)
-        
-        # 计算提升效果
-        no_campaign = campaign_effect[campaign_effect['has_campaign'] == 0]['total_amount'].values[0]
-        with_campaign = campaign_effect[campaign_effect['has_campaign'] == 1]['total_amount'].values[0]
-        lift = (with_campaign - no_campaign) / no_campaign * 100 if no_campaign > 0 else 0
+        plotly_chart(fig6, 'forecast/campaign_effect', use_container_width=True)
         
-        st.metric("营销活动销售提升效果", f"{lift:.1f}%")
+        st.metric("营销活动销售提升效果", f"{campaign.lift:.1f}%")
     
     # 销售预测
     st.write("### 销售预测模型")
@@ -254,7 +223,7 @@ def forecast_sales(data):
     # 选择预测方法
     forecast_method = st.selectbox(
         "选择预测方法",
-        options=["简单移动平均", "加权移动平均", "指数平滑", "SARIMA", "Prophet"] if ADVANCED_MODELS_AVAILABLE else ["简单移动平均", "加权移动平均", "指数平滑"],
+        options=FORECAST_METHODS,
         index=0
     )
     
@@ -266,298 +235,41 @@ def forecast_sales(data):
         value=3
     )
     
-    # 准备预测数据
-    forecast_data = monthly_sales[['date', 'total_amount']].copy()
-    
-    # 进行预测
+    # 方法相关的参数
+    window_size = 3
+    alpha = 0.3
     if forecast_method == "简单移动平均":
-        # 选择窗口大小
         window_size = st.slider("选择移动平均窗口大小", min_value=1, max_value=6, value=3)
-        
-        # 计算移动平均
-        forecast_data['forecast'] = forecast_data['total_amount'].rolling(window=window_size).mean()
-        
-        # 预测未来值
-        last_window = forecast_data['total_amount'].iloc[-window_size:].values
-        future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-        
-        future_predictions = []
-        for _ in range(forecast_periods):
-            next_value = last_window.mean()
-            future_predictions.append(next_value)
-            last_window = np.roll(last_window, -1)
-            last_window[-1] = next_value
-        
-        future_df = pd.DataFrame({
-            'date': future_dates,
-            'total_amount': [None] * forecast_periods,
-            'forecast': future_predictions
-        })
-        
-        # 合并历史和预测数据
-        forecast_result = pd.concat([forecast_data, future_df])
-        
-    elif forecast_method == "加权移动平均":
-        # 使用递减权重
-        weights = [0.5, 0.3, 0.2]  # 权重必须总和为1
-        weights = weights[::-1]  # 反转权重，使最近的观测值权重最高
-        
-        # 计算加权移动平均
-        for i in range(len(weights), len(forecast_data)):
-            weighted_sum = 0
-            for j, weight in enumerate(weights):
-                weighted_sum += forecast_data['total_amount'].iloc[i-j-1] * weight
-            forecast_data.loc[forecast_data.index[i], 'forecast'] = weighted_sum
-        
-        # 预测未来值
-        last_values = forecast_data['total_amount'].iloc[-len(weights):].values
-        future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-        
-        future_predictions = []
-        for _ in range(forecast_periods):
-            weighted_sum = 0
-            for j, weight in enumerate(weights):
-                weighted_sum += last_values[j] * weight
-            future_predictions.append(weighted_sum)
-            last_values = np.roll(last_values, -1)
-            last_values[-1] = weighted_sum
-        
-        future_df = pd.DataFrame({
-            'date': future_dates,
-            'total_amount': [None] * forecast_periods,
-            'forecast': future_predictions
-        })
-        
-        # 合并历史和预测数据
-        forecast_result = pd.concat([forecast_data, future_df])
-        
     elif forecast_method == "指数平滑":
-        # 选择平滑因子
         alpha = st.slider("选择平滑因子 (α)", min_value=0.1, max_value=0.9, value=0.3, step=0.1)
-        
-        # 计算指数平滑
-        forecast_data['forecast'] = None
-        forecast_data.loc[forecast_data.index[0], 'forecast'] = forecast_data['total_amount'].iloc[0]
-        
-        for i in range(1, len(forecast_data)):
-            prev_forecast = forecast_data['forecast'].iloc[i-1]
-            prev_actual = forecast_data['total_amount'].iloc[i-1]
-            forecast_data.loc[forecast_data.index[i], 'forecast'] = alpha * prev_actual + (1 - alpha) * prev_forecast
-        
-        # 预测未来值
-        last_forecast = forecast_data['forecast'].iloc[-1]
-        future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-        
-        # 对于简单指数平滑，所有未来预测值都等于最后的平滑值
-        future_df = pd.DataFrame({
-            'date': future_dates,
-            'total_amount': [None] * forecast_periods,
-            'forecast': [last_forecast] * forecast_periods
-        })
-        
-        # 合并历史和预测数据
-        forecast_result = pd.concat([forecast_data, future_df])
-        
-    elif forecast_method == "SARIMA" and ADVANCED_MODELS_AVAILABLE:
-        try:
-            # 准备数据
-            ts_data = forecast_data.set_index('date')['total_amount']
-            
-            # 自动选择最佳SARIMA参数
-            auto_model = pm.auto_arima(
-                ts_data,
-                seasonal=True,
-                m=12,  # 月度数据的季节性周期
-                d=None,  # 自动确定差分阶数
-                D=None,  # 自动确定季节性差分阶数
-                start_p=0, max_p=3,
-                start_q=0, max_q=3,
-                start_P=0, max_P=2,
-                start_Q=0, max_Q=2,
-                information_criterion='aic',
-                trace=False,
-                error_action='ignore',
-                suppress_warnings=True,
-                stepwise=True
-            )
-            
-            # 显示模型参数
-            model_order = auto_model.order
-            seasonal_order = auto_model.seasonal_order
-            st.info(f"最佳SARIMA模型: SARIMA{model_order}{seasonal_order}")
-            
-            # 拟合模型
-            model = SARIMAX(
-                ts_data,
-                order=model_order,
-                seasonal_order=seasonal_order,
-                enforce_stationarity=False,
-                enforce_invertibility=False
-            )
-            
-            model_fit = model.fit(disp=False)
-            
-            # 预测
-            forecast = model_fit.forecast(steps=forecast_periods)
-            
-            # 准备预测结果
-            forecast_data['forecast'] = model_fit.fittedvalues
-            
-            future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-            
-            future_df = pd.DataFrame({
-                'date': future_dates,
-                'total_amount': [None] * forecast_periods,
-                'forecast': forecast.values
-            })
-            
-            # 合并历史和预测数据
-            forecast_result = pd.concat([forecast_data, future_df])
-            
-        except Exception as e:
-            st.error(f"SARIMA预测出错: {str(e)}")
-            # 如果SARIMA失败，回退到简单移动平均
-            forecast_method = "简单移动平均"
-            st.warning(f"回退到简单移动平均方法")
-            
-            # 计算移动平均
-            window_size = 3
-            forecast_data['forecast'] = forecast_data['total_amount'].rolling(window=window_size).mean()
-            
-            # 预测未来值
-            last_window = forecast_data['total_amount'].iloc[-window_size:].values
-            future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-            
-            future_predictions = []
-            for _ in range(forecast_periods):
-                next_value = last_window.mean()
-                future_predictions.append(next_value)
-                last_window = np.roll(last_window, -1)
-                last_window[-1] = next_value
-            
-            future_df = pd.DataFrame({
-                'date': future_dates,
-                'total_amount': [None] * forecast_periods,
-                'forecast': future_predictions
-            })
-            
-            # 合并历史和预测数据
-            forecast_result = pd.concat([forecast_data, future_df])
-    
-    elif forecast_method == "Prophet" and ADVANCED_MODELS_AVAILABLE:
-        try:
-            # 准备Prophet所需的数据格式
-            prophet_data = forecast_data[['date', 'total_amount']].rename(columns={'date': 'ds', 'total_amount': 'y'})
-            
-            # 创建和拟合模型
-            model = Prophet(
-                yearly_seasonality=True,
-                weekly_seasonality=False,
-                daily_seasonality=False,
-                seasonality_mode='additive',
-                interval_width=0.95
-            )
-            
-            # 添加月度季节性
-            model.add_seasonality(name='monthly', period=30.5, fourier_order=5)
-            
-            # 拟合模型
-            model.fit(prophet_data)
-            
-            # 创建未来日期
-            future = model.make_future_dataframe(periods=forecast_periods, freq='MS')
-            
-            # 预测
-            forecast = model.predict(future)
-            
-            # 将预测结果合并到原始数据
-            forecast_result = pd.DataFrame({
-                'date': forecast['ds'],
-                'total_amount': prophet_data['y'].reindex(prophet_data.index.union(forecast.index[-forecast_periods:])),
-                'forecast': forecast['yhat']
-            })
-            
-        except Exception as e:
-            st.error(f"Prophet预测出错: {str(e)}")
-            # 如果Prophet失败，回退到简单移动平均
-            forecast_method = "简单移动平均"
-            st.warning(f"回退到简单移动平均方法")
-            
-            # 计算移动平均
-            window_size = 3
-            forecast_data['forecast'] = forecast_data['total_amount'].rolling(window=window_size).mean()
-            
-            # 预测未来值
-            last_window = forecast_data['total_amount'].iloc[-window_size:].values
-            future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-            
-            future_predictions = []
-            for _ in range(forecast_periods):
-                next_value = last_window.mean()
-                future_predictions.append(next_value)
-                last_window = np.roll(last_window, -1)
-                last_window[-1] = next_value
-            
-            future_df = pd.DataFrame({
-                'date': future_dates,
-                'total_amount': [None] * forecast_periods,
-                'forecast': future_predictions
-            })
-            
-            # 合并历史和预测数据
-            forecast_result = pd.concat([forecast_data, future_df])
     
+    # 进行预测
+    if forecast_method in BASIC_FORECAST_METHODS:
+        result = get_forecast_result(data, forecast_method, forecast_periods, window_size, alpha)
     else:
-        # 默认回退到简单移动平均
-        st.warning(f"所选方法不可用，回退到简单移动平均")
-        
-        # 计算移动平均
-        window_size = 3
-        forecast_data['forecast'] = forecast_data['total_amount'].rolling(window=window_size).mean()
-        
-        # 预测未来值
-        last_window = forecast_data['total_amount'].iloc[-window_size:].values
-        future_dates = pd.date_range(start=forecast_data['date'].iloc[-1] + pd.DateOffset(months=1), periods=forecast_periods, freq='MS')
-        
-        future_predictions = []
-        for _ in range(forecast_periods):
-            next_value = last_window.mean()
-            future_predictions.append(next_value)
-            last_window = np.roll(last_window, -1)
-            last_window[-1] = next_value
-        
-        future_df = pd.DataFrame({
-            'date': future_dates,
-            'total_amount': [None] * forecast_periods,
-            'forecast': future_predictions
-        })
-        
-        # 合并历史和预测数据
-        forecast_result = pd.concat([forecast_data, future_df])
-    
-    # 格式化日期为月份名称
-    forecast_result['month_name'] = forecast_result['date'].dt.strftime('%Y-%m')
+        # SARIMA 和 Prophet 拟合较慢，在后台任务中运行，完成前显示进度
+        job = submit_job('forecast', (get_data_version(data["transactions"]), forecast_method, forecast_periods),
+                         _forecast_job, monthly_sales, forecast_method, forecast_periods)
+        result = display_job(job, f"{forecast_method}预测")
+        if result is NOT_READY:
+            return
+    for level, message in result.notes:
+        getattr(st, level)(message)
+    forecast_result = result.table
     
     # 创建预测图表
     try:
-        # 确保数据类型一致，将数据转换为同样的类型
-        for col in ['total_amount', 'forecast']:
-            if col in forecast_result.columns:
-                forecast_result[col] = pd.to_numeric(forecast_result[col], errors='coerce')
-        
-        # 使用px.line创建图表，但确保数据类型一致
         fig7 = px.line(
             forecast_result,
             x='month_name',
             y=['total_amount', 'forecast'],
-            title=f'销售预测 - {forecast_method}方法',
+            title=f'销售预测 - {result.method}方法',
             labels={'value': '销售额', 'month_name': '月份', 'variable': '数据类型'},
             color_discrete_map={'total_amount': 'blue', 'forecast': 'red'}
         )
         
         # 添加预测区域标记
-        last_historical_date = forecast_data['date'].iloc[-1]
-        forecast_start_idx = forecast_result[forecast_result['date'] > last_historical_date].index.min()
+        forecast_start_idx = forecast_result[forecast_result['date'] > result.last_history_date].index.min()
         
         if forecast_start_idx is not None:
             try:
@@ -574,34 +286,14 @@ def forecast_sales(data):
             except Exception as e:
                 st.warning(f"添加预测标记线时出错: {e}")
         
-        st.plotly_chart(fig7, use_container_width=True)
+        plotly_chart(fig7, 'forecast/forecast', use_container_width=True)
     except Exception as e:
         st.error(f"创建预测图表时出错: {e}")
         # 如果出错，显示数据框架
         st.write("预测结果：")
         st.dataframe(forecast_result)
     
-    # 计算预测表现指标（仅对历史部分）
-    historical_data = forecast_result[~forecast_result['total_amount'].isna()]
-    
-    # 设置默认值
-    mae = 0
-    mape = 0
-    rmse = 0
-    
-    if len(historical_data) > 0 and 'forecast' in historical_data.columns:
-        actual = historical_data['total_amount'].values
-        predicted = historical_data['forecast'].dropna().values
-        
-        if len(actual) == len(predicted) and len(actual) > 0:
-            try:
-                # 计算预测误差
-                mae = np.mean(np.abs(actual - predicted))
-                # 避免除零错误
-                mape = np.mean(np.abs((actual - predicted) / np.maximum(actual, 0.0001))) * 100
-                rmse = np.sqrt(np.mean((actual - predicted) ** 2))
-            except Exception as e:
-                st.warning(f"计算预测指标时出错: {e}")
+    mape = result.mape
     
     # 显示预测误差
     st.write("### 预测准确性指标 (历史数据)")
@@ -609,13 +301,13 @@ def forecast_sales(data):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("平均绝对误差 (MAE)", f"¥{mae:.2f}")
+        st.metric("平均绝对误差 (MAE)", f"¥{result.mae:.2f}")
     
     with col2:
         st.metric("平均绝对百分比误差 (MAPE)", f"{mape:.2f}%")
     
     with col3:
-        st.metric("均方根误差 (RMSE)", f"¥{rmse:.2f}")
+        st.metric("均方根误差 (RMSE)", f"¥{result.rmse:.2f}")
     
     # 显示预测结果表格
     st.write("### 预测结果表格")
@@ -626,20 +318,13 @@ def forecast_sales(data):
     forecast_table = forecast_table[['year', 'month', 'month_name', 'total_amount', 'forecast']]
     forecast_table.columns = ['年份', '月份', '年月', '实际销售额', '预测销售额']
     
-    # 标记预测部分
-    forecast_table['是否预测'] = forecast_table['实际销售额'].isna()
-    
-    st.dataframe(forecast_table.drop(columns=['是否预测']))
-    
-    # 计算预测总销售额
-    predicted_total = forecast_result[forecast_result['total_amount'].isna()]['forecast'].sum()
-    last_periods_total = forecast_data['total_amount'].iloc[-forecast_periods:].sum()
+    st.dataframe(forecast_table)
     
-    growth_rate = (predicted_total - last_periods_total) / last_periods_total * 100 if last_periods_total > 0 else 0
+    growth_rate = result.growth_rate
     
     st.metric(
-        f"预测未来{forecast_periods}个月总销售额", 
-        f"¥{predicted_total:,.2f}", 
+        f"预测未来{forecast_periods}个月总销售额",
+        f"¥{result.predicted_total:,.2f}",
         f"{growth_rate:+.1f}% vs 前{forecast_periods}个月"
     )
     
@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.data_loader import get_data_version
+from modules.instrumentation import track
+
+# 可选的样本比例
+SAMPLE_FRACTIONS = [0.01, 0.02, 0.05, 0.1, 0.2]
+DEFAULT_SAMPLE_FRACTION = 0.05
+
+# 每层至少抽取的明细数，保证每层都能估计方差
+MIN_STRATUM_SAMPLE = 2
+
+# 95% 置信区间的正态分位数
+Z_95 = 1.959964
+
+# 近似查询模式的样本比例保存在会话状态中，未开启时为None
+APPROXIMATE_STATE_KEY = 'approximate_fraction'
+
+class StratifiedSample:
+    """
+    交易明细的分层随机样本及其估计量
+    
+    每层（月份 × 产品类别）内无放回地抽取比例为 fraction 的明细行，每行的权重为
+    该层总行数与样本行数之比。总量用分层估计量 Σ N_h·ȳ_h 估计，方差为
+    Σ N_h²·(1 - f_h)·s_h² / n_h；任意分组（如按支付方式）的总量是对应的域估计，
+    比率（平均订单金额、订单完成率）用线性化方法估计方差。
+    
+    订单可能包含多个类别的明细，样本按明细行抽取。每行的 orders 为 1/订单明细数，
+    全部明细的 orders 之和恰好是订单数，因此订单数也是一个可以估计的总量。
+    """
+    
+    # 可以估计的度量
+    MEASURES = ['revenue', 'orders', 'completed_orders', 'quantity']
+    
+    def __init__(self, transactions_df, fraction=DEFAULT_SAMPLE_FRACTION, random_state=42):
+        """
+        Args:
+            transactions_df (pd.DataFrame): 交易明细数据
+            fraction (float): 每层的抽样比例
+            random_state (int): 随机种子，相同数据和参数得到相同样本
+        """
+        self.fraction = fraction
+        self.population_rows = len(transactions_df)
+        
+        dates = pd.to_datetime(transactions_df['date'], errors='coerce')
+        month_codes = (dates.dt.year * 12 + dates.dt.month - 1).fillna(-1).to_numpy(dtype=np.int64)
+        category_codes, _ = pd.factorize(transactions_df['product_category'], use_na_sentinel=False)
+        stratum, _ = pd.factorize(month_codes * (category_codes.max() + 1) + category_codes)
+        
+        # 每层按随机数排序，取前 n_h 行
+        population = np.bincount(stratum)
+        sample_sizes = np.minimum(population, np.maximum(np.round(population * fraction).astype(int),
+                                                         MIN_STRATUM_SAMPLE))
+        rng = np.random.default_rng(random_state)
+        order = np.lexsort((rng.random(len(stratum)), stratum))
+        starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+        rank = np.empty(len(stratum), dtype=np.int64)
+        rank[order] = np.arange(len(stratum)) - np.repeat(starts, population)
+        selected = np.flatnonzero(rank < sample_sizes[stratum])
+        
+        order_codes = pd.factorize(transactions_df['transaction_id'])[0]
+        lines_per_order = np.bincount(order_codes)
+        
+        columns = [col for col in ('date', 'product_category', 'payment_method', 'device', 'status')
+                   if col in transactions_df.columns]
+        sample = transactions_df.iloc[selected][columns].reset_index(drop=True)
+        sample['date'] = dates.iloc[selected].to_numpy()
+        sample['month'] = sample['date'].dt.strftime('%Y-%m')
+        sample['stratum'] = stratum[selected]
+        sample['revenue'] = transactions_df['total_amount'].to_numpy(dtype=float)[selected]
+        sample['orders'] = 1.0 / lines_per_order[order_codes[selected]]
+        completed = (sample['status'] == 'Completed').to_numpy() if 'status' in sample.columns else False
+        sample['completed_orders'] = sample['orders'] * completed
+        if 'quantity' in transactions_df.columns:
+            sample['quantity'] = transactions_df['quantity'].to_numpy(dtype=float)[selected]
+        
+        self.sample = sample
+        self._population = population.astype(float)
+        self._sample_sizes = sample_sizes.astype(float)
+    
+    @property
+    def sample_rows(self):
+        return len(self.sample)
+    
+    def _filter(self, filters):
+        """返回满足筛选条件的样本行的掩码，'date' 的值为 (开始日期, 结束日期)"""
+        mask = np.ones(len(self.sample), dtype=bool)
+        for dim, values in (filters or {}).items():
+            if dim == 'date':
+                start, end = values
+                dates = self.sample['date']
+                mask &= ((dates >= pd.to_datetime(start)) & (dates <= pd.to_datetime(end))).to_numpy()
+            else:
+                mask &= self.sample[dim].isin(values).to_numpy()
+        return mask
+    
+    def _totals(self, values, groups=None, group_count=1):
+        """
+        按组估计总量及其方差
+        
+        Args:
+            values (np.ndarray): 样本行的值，不在域内的行为0
+            groups (np.ndarray): 样本行的组编码，None 表示只有一组
+            group_count (int): 组数
+        
+        Returns:
+            tuple: (总量估计, 方差估计)，每组一个值
+        """
+        groups = np.zeros(len(values), dtype=np.int64) if groups is None else groups
+        strata = self.sample['stratum'].to_numpy()
+        strata_count = len(self._population)
+        n_h = self._sample_sizes
+        N_h = self._population
+        
+        # 按 (组, 层) 汇总 Σy 和 Σy²；组外的行在该组中贡献0
+        cells = groups * strata_count + strata
+        size = group_count * strata_count
+        sum_y = np.bincount(cells, weights=values, minlength=size).reshape(group_count, strata_count)
+        sum_y2 = np.bincount(cells, weights=values ** 2, minlength=size).reshape(group_count, strata_count)
+        
+        estimate = (sum_y * (N_h / n_h)).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s2 = np.where(n_h > 1, (sum_y2 - sum_y ** 2 / n_h) / (n_h - 1), 0.0)
+            variance = (N_h ** 2 * (1 - n_h / N_h) * np.maximum(s2, 0) / n_h).sum(axis=1)
+        return estimate, variance
+    
+    def estimate(self, measure, filters=None):
+        """
+        估计一个度量的总量
+        
+        Args:
+            measure (str): MEASURES 中的度量
+            filters (dict): 筛选条件，见 _filter
+        
+        Returns:
+            dict: estimate、ci_low、ci_high、margin（置信区间半宽占估计值的比例）
+        """
+        values = self.sample[measure].to_numpy(dtype=float) * self._filter(filters)
+        estimate, variance = self._totals(values)
+        return _interval(estimate[0], variance[0])
+    
+    def estimate_ratio(self, numerator, denominator, filters=None):
+        """
+        估计两个总量的比率，方差用线性化 z = y - R·x 的总量方差近似
+        
+        Args:
+            numerator (str): 分子度量
+            denominator (str): 分母度量
+            filters (dict): 筛选条件
+        
+        Returns:
+            dict: estimate、ci_low、ci_high、margin
+        """
+        mask = self._filter(filters)
+        y = self.sample[numerator].to_numpy(dtype=float) * mask
+        x = self.sample[denominator].to_numpy(dtype=float) * mask
+        y_total, _ = self._totals(y)
+        x_total, _ = self._totals(x)
+        if x_total[0] == 0:
+            return _interval(np.nan, np.nan)
+        ratio = y_total[0] / x_total[0]
+        _, z_variance = self._totals(y - ratio * x)
+        return _interval(ratio, z_variance[0] / x_total[0] ** 2)
+    
+    def estimate_by(self, dim, measure='revenue', filters=None):
+        """
+        按维度分组估计度量的总量
+        
+        Args:
+            dim (str): 分组维度，如 'month'、'payment_method'
+            measure (str): MEASURES 中的度量
+            filters (dict): 筛选条件
+        
+        Returns:
+            pd.DataFrame: 每组一行，包含 dim、estimate、ci_low、ci_high、margin 列，按组排序
+        """
+        codes, labels = pd.factorize(self.sample[dim], sort=True)
+        valid = codes >= 0
+        values = self.sample[measure].to_numpy(dtype=float) * self._filter(filters) * valid
+        estimate, variance = self._totals(values, np.where(valid, codes, 0), max(len(labels), 1))
+        result = pd.DataFrame([_interval(e, v) for e, v in zip(estimate, variance)])
+        result.insert(0, dim, np.asarray(labels))
+        return result
+
+def _interval(estimate, variance):
+    margin = Z_95 * np.sqrt(variance)
+    return {
+        'estimate': estimate,
+        'ci_low': estimate - margin,
+        'ci_high': estimate + margin,
+        'margin': margin / abs(estimate) if estimate else np.nan,
+    }
+
+# 样本只读，使用 cache_resource 在会话之间共享同一个对象
+@st.cache_resource(ttl=3600, show_spinner="正在抽取分层样本...")
+def _cached_sample(data_version, fraction, _transactions_df):
+    with track('compute', 'stratified_sample', rows=len(_transactions_df)):
+        return StratifiedSample(_transactions_df, fraction)
+
+def get_stratified_sample(data, fraction=DEFAULT_SAMPLE_FRACTION):
+    """
+    获取交易数据的分层样本，按数据版本和样本比例缓存
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        fraction (float): 抽样比例
+    
+    Returns:
+        StratifiedSample: 分层样本
+    """
+    return _cached_sample(get_data_version(data["transactions"]), fraction, data["transactions"])
+
+def set_approximate_mode(fraction):
+    """设置当前会话的近似查询模式，fraction 为None时关闭"""
+    st.session_state[APPROXIMATE_STATE_KEY] = fraction
+
+def get_approximate_fraction():
+    """返回当前会话近似查询模式的样本比例，未开启时返回None"""
+    return st.session_state.get(APPROXIMATE_STATE_KEY)
+
+def format_interval(value, fmt):
+    """把估计值和置信区间格式化为 '估计值 ± 半宽' 形式的说明文字"""
+    half_width = (value['ci_high'] - value['ci_low']) / 2
+    return f"95% 置信区间: {fmt.format(value['ci_low'])} ~ {fmt.format(value['ci_high'])}（± {fmt.format(half_width)}）"
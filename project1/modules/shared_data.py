@@ -0,0 +1,108 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+
+import streamlit as st
+
+# 多进程部署时，启动脚本把数据集发布到该目录，各应用进程通过内存映射读取
+SHARED_DATA_ENV = "GLOBALMART_SHARED_DATA_DIR"
+MANIFEST_FILE = "manifest.json"
+
+# 数据集以 Arrow IPC 格式保存，需要 pyarrow
+SHARED_DATA_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+def default_shared_dir():
+    """返回默认的共享数据目录，Linux 上优先使用内存文件系统 /dev/shm"""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "globalmart_data")
+
+def publish_datasets(data, directory):
+    """
+    把数据集写入共享目录，每个数据集一个未压缩的 Arrow IPC 文件
+    
+    清单文件最后写入并原子替换，读取方只会看到完整的一组数据集。
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+        directory (str): 共享目录
+    
+    Returns:
+        str: 清单文件路径
+    """
+    import pyarrow as pa
+    
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for name, df in data.items():
+        file_name = f"{name}.arrow"
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = os.path.join(directory, f".{file_name}.tmp")
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, os.path.join(directory, file_name))
+        # attrs 中保存了数据版本等加载时的标记，读取后原样恢复
+        manifest[name] = {'file': file_name, 'rows': len(df), 'attrs': df.attrs}
+    
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+def attach_datasets(directory):
+    """
+    通过内存映射读取共享目录中的数据集
+    
+    数值列直接引用映射的页面，多个进程读取同一组文件时由操作系统共享物理内存。
+    
+    Args:
+        directory (str): 共享目录
+    
+    Returns:
+        dict: 包含所有数据集的字典
+    """
+    import pyarrow as pa
+    
+    with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    data = {}
+    for name, entry in manifest.items():
+        source = pa.memory_map(os.path.join(directory, entry['file']), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas(split_blocks=True)
+        df.attrs.update(entry['attrs'])
+        data[name] = df
+    return data
+
+def remove_shared_datasets(directory):
+    """删除共享目录，已经映射的进程在解除映射前仍可以读取"""
+    shutil.rmtree(directory, ignore_errors=True)
+
+# 共享数据只读，使用 cache_resource 让所有会话使用同一份映射，不为每个会话复制
+@st.cache_resource(show_spinner="正在映射共享数据...")
+def _cached_shared_datasets(directory, manifest_mtime):
+    return attach_datasets(directory)
+
+def get_shared_datasets(directory=None):
+    """
+    获取共享目录中的数据集，清单更新后重新映射
+    
+    Args:
+        directory (str): 共享目录，默认读取环境变量 GLOBALMART_SHARED_DATA_DIR
+    
+    Returns:
+        dict: 包含所有数据集的字典，未配置共享目录或清单不存在时返回None
+    """
+    directory = directory or os.environ.get(SHARED_DATA_ENV)
+    if not directory or not SHARED_DATA_AVAILABLE:
+        return None
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    datasets = _cached_shared_datasets(directory, os.stat(manifest_path).st_mtime_ns)
+    # 页面会在数据集上添加或替换列，每次调用返回浅复制：写时复制下不复制数据，
+    # 修改只作用于当前会话的副本，不影响其他会话
+    return {name: df.copy(deep=False) for name, df in datasets.items()}
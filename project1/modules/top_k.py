@@ -0,0 +1,263 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.compute.customers import aggregate_customers
+from modules.customer_360 import AppendTracker, get_customer_360
+from modules.data_loader import get_data_version
+from modules.instrumentation import track
+
+# 可用于排名的客户指标
+CUSTOMER_RANK_METRICS = {
+    'total_amount': '消费金额',
+    'order_count': '订单数',
+    'avg_order_value': '平均订单金额',
+}
+
+# 只增不减的指标：新交易的金额非负时，新的前K名一定在旧的前K名和本次更新涉及的客户之中
+MONOTONIC_METRICS = ('total_amount', 'order_count', 'latest_purchase')
+
+# update 会修改的列；筛选条件涉及这些列时，未涉及的客户也可能进入或离开筛选范围
+UPDATED_COLUMNS = ('total_amount', 'order_count', 'total_items', 'latest_purchase', 'first_purchase',
+                   'avg_order_value')
+
+def top_k_indices(values, k, ascending=False, mask=None):
+    """
+    部分选择出前K个值的位置，不对全部数据排序
+    
+    先用 np.argpartition 在线性时间内找出前K个候选，只对这K个候选排序。
+    空值不参与排名，值相同时位置靠前的优先（与 DataFrame.nlargest 一致）。
+    
+    Args:
+        values (np.ndarray): 数值或日期数组
+        k (int): 返回的数量
+        ascending (bool): True 时返回最小的K个
+        mask (np.ndarray): 布尔数组，只在为True的位置中选择
+    
+    Returns:
+        np.ndarray: 按排名顺序排列的位置
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        valid = ~np.isnat(values)
+        keys = values.astype('int64').astype(float)
+    else:
+        keys = values.astype(float)
+        valid = ~np.isnan(keys)
+    if mask is not None:
+        valid &= mask
+    
+    positions = np.flatnonzero(valid)
+    keys = keys[positions] if ascending else -keys[positions]
+    if k <= 0 or len(positions) == 0:
+        return positions[:0]
+    if k < len(positions):
+        # 第K个值并列时 argpartition 任取其一，改为取位置靠前的
+        kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+        better = np.flatnonzero(keys < kth)
+        ties = np.flatnonzero(keys == kth)[:k - len(better)]
+        selected = np.concatenate([better, ties])
+    else:
+        selected = np.arange(len(positions))
+    # 先按值、再按原始位置排序
+    order = np.lexsort((positions[selected], keys[selected]))
+    return positions[selected[order]]
+
+class CustomerTopK:
+    """
+    客户排名服务
+    
+    在每位客户一行的汇总表上按任意指标和筛选条件查询前K名，使用部分选择代替全量排序。
+    查询结果按 (指标, K, 方向, 筛选条件) 保存；新交易到达时只更新涉及的客户，
+    对只增不减的指标，用旧的前K名加上本次更新的客户重新选择，不需要重新扫描全部客户。
+    """
+    
+    def __init__(self, customers, key='customer_id'):
+        """
+        Args:
+            customers (pd.DataFrame): 每位客户一行的汇总表，包含 total_amount、order_count、
+                                      latest_purchase 和客户属性列（见 build_customer_360）
+            key (str): 客户ID列名
+        """
+        self.key = key
+        self._table = customers.reset_index(drop=True).copy()
+        self._positions = pd.Index(self._table[key])
+        self._results = {}
+        # 服务在所有会话之间共享，更新和查询需要加锁
+        self._lock = threading.RLock()
+    
+    def __len__(self):
+        return len(self._table)
+    
+    def top(self, k=10, metric='total_amount', filters=None, ascending=False):
+        """
+        返回按指标排名的前K位客户
+        
+        Args:
+            k (int): 返回的客户数量
+            metric (str): 排名指标列
+            filters (dict): 筛选条件，列表值表示取值之一，元组 (最小值, 最大值) 表示闭区间
+            ascending (bool): True 时返回指标最小的K位客户
+        
+        Returns:
+            pd.DataFrame: 按排名顺序排列的客户汇总行
+        """
+        filters = filters or {}
+        cache_key = (metric, k, ascending, _filters_key(filters))
+        with self._lock:
+            cached = self._results.get(cache_key)
+            if cached is None:
+                mask = _filter_mask(self._table, filters) if filters else None
+                cached = (top_k_indices(self._table[metric].to_numpy(), k, ascending, mask), filters)
+                self._results[cache_key] = cached
+            positions = cached[0]
+            return self._table.iloc[positions].reset_index(drop=True)
+    
+    def update(self, transactions_df, customers_df=None):
+        """
+        将新到达的交易合并到客户汇总中
+        
+        Args:
+            transactions_df (pd.DataFrame): 新交易明细，包含 transaction_id、customer_id、
+                                            total_amount、date 列，每个订单只出现在一个批次中
+            customers_df (pd.DataFrame): 客户数据，用于补充新客户的属性
+        
+        Returns:
+            int: 本次更新涉及的客户数
+        """
+        if transactions_df.empty:
+            return 0
+        
+        increments = aggregate_customers(transactions_df)
+        
+        with self._lock:
+            positions = self._positions.get_indexer(increments.index)
+            existing = positions >= 0
+            
+            # 已有客户：累加金额、订单数和件数，更新首次和最近购买日期
+            rows = positions[existing]
+            added = increments[existing]
+            table = self._table
+            for column in ('total_amount', 'order_count', 'total_items'):
+                if column in table.columns:
+                    table.loc[rows, column] = table[column].to_numpy()[rows] + added[column].to_numpy()
+            table.loc[rows, 'latest_purchase'] = np.fmax(
+                table['latest_purchase'].to_numpy()[rows], added['latest_purchase'].to_numpy())
+            if 'first_purchase' in table.columns:
+                table.loc[rows, 'first_purchase'] = np.fmin(
+                    table['first_purchase'].to_numpy()[rows], added['first_purchase'].to_numpy())
+            
+            # 新客户：追加到汇总表末尾
+            new = increments[~existing].reset_index()
+            if len(new):
+                if customers_df is not None:
+                    attributes = [col for col in table.columns if col in customers_df.columns and col != self.key]
+                    new = new.merge(customers_df[[self.key] + attributes].drop_duplicates(self.key),
+                                    on=self.key, how='left')
+                table = pd.concat([table, new[[col for col in new.columns if col in table.columns]]],
+                                  ignore_index=True)
+                self._positions = pd.Index(table[self.key])
+            
+            touched = np.concatenate([rows, np.arange(len(self._table), len(table))])
+            table.loc[touched, 'avg_order_value'] = (table['total_amount'].to_numpy()[touched]
+                                                     / table['order_count'].to_numpy()[touched])
+            self._table = table
+            self._refresh_results(touched, non_negative=bool((transactions_df['total_amount'] >= 0).all()))
+        return len(increments)
+    
+    def _refresh_results(self, touched, non_negative):
+        """更新后重新计算已保存的查询结果，无法增量计算的结果直接丢弃"""
+        for cache_key in list(self._results):
+            metric, k, ascending, _ = cache_key
+            positions, filters = self._results[cache_key]
+            if (ascending or metric not in MONOTONIC_METRICS or not non_negative
+                    or any(column in UPDATED_COLUMNS for column in filters)):
+                del self._results[cache_key]
+                continue
+            
+            # 未涉及的客户指标不变，旧的前K名指标只增不减，因此新的前K名在候选集合中
+            candidates = np.union1d(positions, touched)
+            subset = self._table.iloc[candidates]
+            selected = top_k_indices(subset[metric].to_numpy(), k, ascending, _filter_mask(subset, filters))
+            self._results[cache_key] = (candidates[selected], filters)
+
+def _filter_mask(table, filters):
+    mask = np.ones(len(table), dtype=bool)
+    for column, values in filters.items():
+        if isinstance(values, tuple):
+            low, high = values
+            column_values = table[column]
+            if pd.api.types.is_datetime64_any_dtype(column_values):
+                low, high = pd.to_datetime(low), pd.to_datetime(high)
+            mask &= ((column_values >= low) & (column_values <= high)).to_numpy()
+        else:
+            mask &= table[column].isin(values).to_numpy()
+    return mask
+
+def _filters_key(filters):
+    # 元组（区间）和列表（取值）需要区分，区间加上标记后再序列化
+    normalized = {column: {'range': list(values)} if isinstance(values, tuple) else list(values)
+                  for column, values in filters.items()}
+    return json.dumps(normalized, sort_keys=True, default=str, ensure_ascii=False)
+
+class CustomerTopKStore:
+    """
+    按数据版本维护客户排名服务
+    
+    数据版本变化时，如果交易数据只是追加了新行（见 AppendTracker），用 CustomerTopK.update
+    把新交易合并到已有的服务中，保留已保存的查询结果；否则基于 Customer-360 表重建。
+    """
+    
+    def __init__(self):
+        self._service = None
+        self._version = None
+        self._tracker = AppendTracker()
+        self._lock = threading.Lock()
+    
+    def get(self, data):
+        """
+        返回当前数据版本的客户排名服务
+        
+        Args:
+            data (dict): 包含所有数据集的字典
+        
+        Returns:
+            CustomerTopK: 客户排名服务
+        """
+        transactions_df, customers_df = data["transactions"], data["customers"]
+        version = get_data_version({'transactions': transactions_df, 'customers': customers_df})
+        customers_version = get_data_version(customers_df)
+        with self._lock:
+            if version == self._version:
+                return self._service
+            
+            new_rows = self._tracker.appended_rows(transactions_df, customers_version)
+            if new_rows is not None:
+                with track('compute', 'customer_top_k_update', rows=len(new_rows)):
+                    self._service.update(new_rows, customers_df)
+            else:
+                self._service = CustomerTopK(get_customer_360(data))
+            self._version = version
+            self._tracker.commit(transactions_df, customers_version, new_rows)
+            return self._service
+
+# 排名服务会在 update 时原地修改，使用 cache_resource 在会话之间共享同一个对象
+@st.cache_resource
+def get_customer_top_k_store():
+    """返回所有会话共享的客户排名服务存储"""
+    return CustomerTopKStore()
+
+def get_customer_top_k(data):
+    """
+    获取客户排名服务，基于 Customer-360 表；交易数据只追加新行时增量更新
+    
+    Args:
+        data (dict): 包含所有数据集的字典
+    
+    Returns:
+        CustomerTopK: 客户排名服务
+    """
+    return get_customer_top_k_store().get(data)
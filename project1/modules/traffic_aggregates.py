@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.data_loader import get_data_version, month_labels
+from modules.instrumentation import track
+from modules.traffic_imputation import TRAFFIC_CHANNELS
+
+# 按访问量加权平均的比率指标
+TRAFFIC_RATE_COLUMNS = ['new_visitors_pct', 'returning_visitors_pct', 'pages_per_session',
+                        'avg_session_duration', 'conversion_rate', 'bounce_rate']
+
+# 支持的聚合粒度
+TRAFFIC_GRAINS = {
+    'daily': '按日',
+    'monthly': '按月',
+}
+
+def build_traffic_rollups(traffic_df, site_column='site'):
+    """
+    将流量明细（按天或按小时，可包含多个站点）预先汇总为日度和月度聚合表
+    
+    聚合表只保存可相加的列：访问量、各渠道访问量、比率指标与访问量的乘积之和
+    （用于计算加权平均），以及各渠道访问量与跳出率的乘积之和（用于计算渠道跳出率）。
+    因此可以在聚合表上任意筛选站点并再次汇总，而不需要回到明细数据。
+    
+    Args:
+        traffic_df (pd.DataFrame): 网站流量明细数据
+        site_column (str): 站点列名，数据中不存在时视为单个站点
+    
+    Returns:
+        dict: {'daily': 日度聚合表, 'monthly': 月度聚合表}，每行对应一个站点的一个周期
+    """
+    if 'date' not in traffic_df.columns or 'total_visits' not in traffic_df.columns:
+        return {grain: pd.DataFrame() for grain in TRAFFIC_GRAINS}
+    
+    channels = [channel for channel in TRAFFIC_CHANNELS if channel in traffic_df.columns]
+    rates = [rate for rate in TRAFFIC_RATE_COLUMNS if rate in traffic_df.columns]
+    
+    # 构造只包含可相加列的明细表，之后的聚合都是简单求和
+    dates = pd.to_datetime(traffic_df['date'])
+    visits = traffic_df['total_visits'].to_numpy(dtype=float)
+    additive = {'date': dates.dt.floor('D'), 'total_visits': visits, 'rows': 1}
+    for channel in channels:
+        additive[channel] = traffic_df[channel].to_numpy(dtype=float)
+    for rate in rates:
+        additive[f'{rate}_weighted'] = traffic_df[rate].to_numpy(dtype=float) * visits
+    if 'bounce_rate' in traffic_df.columns:
+        bounce_rate = traffic_df['bounce_rate'].to_numpy(dtype=float)
+        for channel in channels:
+            additive[f'bounce_{channel}'] = additive[channel] * bounce_rate
+    
+    keys = ['date']
+    if site_column in traffic_df.columns:
+        # 站点转为分类类型，分组时按整数编码比较
+        additive[site_column] = traffic_df[site_column].astype('category')
+        keys = [site_column, 'date']
+    additive = pd.DataFrame(additive)
+    
+    daily = additive.groupby(keys, sort=True, observed=True).sum(min_count=1).reset_index()
+    
+    # 月度聚合表由日度聚合表再次汇总得到
+    month_keys = [key for key in keys if key != 'date'] + ['month']
+    daily['month'] = month_labels(daily['date'])
+    monthly = daily.drop(columns='date').groupby(month_keys, sort=True, observed=True).sum(min_count=1).reset_index()
+    
+    return {'daily': daily, 'monthly': monthly}
+
+# 聚合结果只读，使用 cache_resource 在会话之间共享同一份对象，避免每次读取时反序列化
+@st.cache_resource(ttl=3600, show_spinner="正在汇总流量数据...")
+def _cached_rollups(data_version, _traffic_df):
+    with track('compute', 'traffic_rollups', rows=len(_traffic_df)):
+        return build_traffic_rollups(_traffic_df)
+
+def get_traffic_rollups(traffic_df):
+    """
+    获取流量聚合表，按数据版本缓存，同一版本的数据只汇总一次
+    
+    Args:
+        traffic_df (pd.DataFrame): 网站流量明细数据
+    
+    Returns:
+        dict: {'daily': 日度聚合表, 'monthly': 月度聚合表}
+    """
+    return _cached_rollups(get_data_version(traffic_df), traffic_df)
+
+def get_sites(rollups, site_column='site'):
+    """返回聚合表中的站点列表，单站点数据返回空列表"""
+    daily = rollups['daily']
+    if site_column not in daily.columns:
+        return []
+    return sorted(daily[site_column].dropna().unique().tolist())
+
+def summarize_traffic(rollups, grain='monthly', sites=None, site_column='site', by_site=False):
+    """
+    按周期汇总所选站点的流量，并计算加权平均的比率指标
+    
+    Args:
+        rollups (dict): get_traffic_rollups 返回的聚合表
+        grain (str): 聚合粒度，'daily' 或 'monthly'
+        sites (list): 要包含的站点，为空时包含所有站点
+        site_column (str): 站点列名
+        by_site (bool): 是否保留站点维度
+    
+    Returns:
+        pd.DataFrame: 每个周期（和站点）一行，比率指标已换算为加权平均值
+    """
+    table = _filter_sites(rollups[grain], sites, site_column)
+    if table.empty:
+        return table
+    
+    period = 'date' if grain == 'daily' else 'month'
+    keys = [site_column, period] if by_site and site_column in table.columns else [period]
+    numeric = [col for col in table.columns if col not in (site_column, 'date', 'month')]
+    summary = table.groupby(keys, sort=True, observed=True)[numeric].sum(min_count=1).reset_index()
+    if grain == 'daily':
+        summary['month'] = month_labels(summary['date'])
+    
+    # 比率指标 = 加权和 / 访问量
+    visits = summary['total_visits'].replace(0, np.nan)
+    for rate in TRAFFIC_RATE_COLUMNS:
+        if f'{rate}_weighted' in summary.columns:
+            summary[rate] = summary[f'{rate}_weighted'] / visits
+    return summary
+
+def summarize_channels(rollups, sites=None, site_column='site'):
+    """
+    汇总所选站点各渠道的访问量和加权跳出率
+    
+    Args:
+        rollups (dict): get_traffic_rollups 返回的聚合表
+        sites (list): 要包含的站点，为空时包含所有站点
+        site_column (str): 站点列名
+    
+    Returns:
+        pd.DataFrame: 包含 channel、visits、bounce_rate 列
+    """
+    table = _filter_sites(rollups['monthly'], sites, site_column)
+    channels = [channel for channel in TRAFFIC_CHANNELS if channel in table.columns]
+    visits = table[channels].sum()
+    result = pd.DataFrame({'channel': channels, 'visits': visits.to_numpy()})
+    
+    bounce_columns = [f'bounce_{channel}' for channel in channels]
+    if all(col in table.columns for col in bounce_columns):
+        bounce_sum = table[bounce_columns].sum().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result['bounce_rate'] = np.where(result['visits'] > 0, bounce_sum / result['visits'], np.nan)
+    return result
+
+def _filter_sites(table, sites, site_column):
+    if sites and site_column in table.columns:
+        return table[table[site_column].isin(sites)]
+    return table
+
+def select_sites(rollups, key, site_column='site'):
+    """
+    在页面上显示站点筛选框，单站点数据不显示
+    
+    Returns:
+        list: 选中的站点，为空时表示全部站点
+    """
+    sites = get_sites(rollups, site_column)
+    if len(sites) <= 1:
+        return []
+    return st.multiselect("选择站点（不选表示全部站点）", sites, key=key)
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+TRAFFIC_CHANNELS = ['organic_search', 'paid_search', 'social_media', 'email', 'direct', 'referral']
+
+def impute_channel_shares(df, channels=None, total_column='total_visits', window=28,
+                          group_column=None, order_column='date'):
+    """
+    按各渠道在过去一段时间内的流量占比分配缺失的渠道流量
+    
+    对每一行，缺失流量 = 总量 - 已知渠道之和，按缺失渠道在前 window 行（同一分组内，
+    不含当前行）的平均占比分配。所有缺口在一次矩阵运算中完成，适用于任意
+    "总量 + 多个分量列"的宽表，例如按小时、按站点的流量数据。
+    
+    Args:
+        df (pd.DataFrame): 宽表数据
+        channels (list): 分量列，默认为网站流量的六个渠道
+        total_column (str): 总量列
+        window (int): 计算历史占比的行数窗口
+        group_column (str): 分组列（如站点），为空时整个表视为一组
+        order_column (str): 排序列（如日期），为空时使用当前行顺序
+    
+    Returns:
+        tuple: (填充后的数据集, 被填充的单元格掩码 pd.DataFrame)
+    """
+    channels = channels or TRAFFIC_CHANNELS
+    
+    values = df[channels].to_numpy(dtype=float, copy=True)
+    missing = np.isnan(values)
+    result = df.copy(deep=False)
+    if not missing.any():
+        return result, pd.DataFrame(missing, index=df.index, columns=channels)
+    
+    # 按分组和时间排序，只在数据未排序时才进行排序
+    order = _sort_order(df, group_column, order_column)
+    total = df[total_column].to_numpy(dtype=float)
+    if order is None:
+        values_sorted, total_sorted, missing_sorted = values, total, missing
+    else:
+        values_sorted, total_sorted, missing_sorted = values[order], total[order], missing[order]
+    
+    # 每行各渠道的占比，缺失值不参与平均
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = values_sorted / total_sorted[:, None]
+    known = np.isfinite(shares)
+    shares[~known] = 0.0
+    
+    # 分组内的前缀和，用于O(1)计算任意窗口的占比之和
+    share_prefix = np.zeros((len(df) + 1, len(channels)))
+    np.cumsum(shares, axis=0, out=share_prefix[1:])
+    count_prefix = np.zeros((len(df) + 1, len(channels)), dtype=np.int32)
+    np.cumsum(known, axis=0, dtype=np.int32, out=count_prefix[1:])
+    
+    # 窗口没有历史数据时使用整体平均占比
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overall_share = np.nan_to_num(share_prefix[-1] / count_prefix[-1])
+    del shares, known
+    
+    # 只对存在缺失值的行计算窗口占比并分配缺失流量
+    rows = np.flatnonzero(missing_sorted.any(axis=1))
+    group_start = _group_start(df, group_column, order, rows)
+    window_start = np.maximum(rows - window, group_start)
+    share_sum = share_prefix[rows] - share_prefix[window_start]
+    share_count = count_prefix[rows] - count_prefix[window_start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trailing_share = np.where(share_count > 0, share_sum / share_count, overall_share)
+    
+    # 只在缺失渠道之间按占比分配
+    row_missing = missing_sorted[rows]
+    weights = np.where(row_missing, trailing_share, 0.0)
+    weight_sum = weights.sum(axis=1, keepdims=True)
+    # 没有任何可用占比时退回到平均分配
+    equal_weights = row_missing / row_missing.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(weight_sum > 0, weights / weight_sum, equal_weights)
+    
+    # 缺失流量不能为负数
+    row_values = values_sorted[rows]
+    known_sum = np.where(row_missing, 0.0, row_values).sum(axis=1)
+    missing_traffic = np.clip(total_sorted[rows] - known_sum, 0, None)
+    
+    # 写回原始行顺序
+    target_rows = rows if order is None else order[rows]
+    values[target_rows] = np.where(row_missing, weights * missing_traffic[:, None], row_values)
+    for i, channel in enumerate(channels):
+        result[channel] = values[:, i]
+    
+    return result, pd.DataFrame(missing, index=df.index, columns=channels)
+
+def _group_start(df, group_column, order, rows):
+    """返回指定行（排序后的下标）所在分组第一行的下标"""
+    if not group_column or group_column not in df.columns:
+        return np.zeros(len(rows), dtype=np.int64)
+    
+    codes = pd.factorize(df[group_column])[0]
+    if order is not None:
+        codes = codes[order]
+    is_start = np.ones(len(codes), dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    starts = np.flatnonzero(is_start)
+    return starts[np.searchsorted(starts, rows, side='right') - 1]
+
+def _sort_order(df, group_column, order_column):
+    """
+    返回按分组和时间排序的行下标
+    
+    只要求同一分组的行连续且组内时间递增，数据已满足时返回None以避免复制。
+    """
+    group_codes = None
+    if group_column and group_column in df.columns:
+        group_codes = pd.factorize(df[group_column])[0]
+    
+    order_values = None
+    if order_column and order_column in df.columns:
+        order_values = df[order_column].to_numpy()
+        if not np.issubdtype(order_values.dtype, np.number) and not np.issubdtype(order_values.dtype, np.datetime64):
+            order_values = pd.factorize(df[order_column], sort=True)[0]
+    
+    if group_codes is None and order_values is None:
+        return None
+    
+    # 检查是否已经有序：分组按出现顺序连续，组内时间不递减
+    groups_contiguous = group_codes is None or np.all(np.diff(group_codes) >= 0)
+    if groups_contiguous:
+        if order_values is None:
+            return None
+        same_group = np.ones(len(df) - 1, dtype=bool) if group_codes is None else group_codes[1:] == group_codes[:-1]
+        if np.all(order_values[1:][same_group] >= order_values[:-1][same_group]):
+            return None
+    
+    # np.lexsort 以最后一个键为主键
+    keys = [k for k in [order_values, group_codes] if k is not None]
+    return np.lexsort(keys)
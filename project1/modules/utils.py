@@ -1,3 +1,4 @@
+import functools
 import streamlit as st
 import pandas as pd
 import os
@@ -5,6 +6,38 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+from modules.figure_cache import plotly_chart
+from modules.traffic_aggregates import get_traffic_rollups, select_sites, summarize_traffic
+
+# 页面片段：片段内的控件变化时只重新运行该片段，不重新运行整个页面
+# 片段的参数就是它依赖的数据，重新运行时沿用上一次整页运行传入的参数
+def _with_bare_mode_fallback(streamlit_fragment):
+    # Streamlit 的片段在没有脚本运行上下文时（离线渲染报告等无界面模式）直接返回None，
+    # 不执行函数体；这种情况下按普通函数调用
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    
+    def decorator(func=None, **kwargs):
+        if func is None:
+            return lambda f: decorator(f, **kwargs)
+        wrapped = streamlit_fragment(func, **kwargs)
+        
+        @functools.wraps(func)
+        def run(*args, **kw):
+            if get_script_run_ctx(suppress_warning=True) is None:
+                return func(*args, **kw)
+            return wrapped(*args, **kw)
+        return run
+    return decorator
+
+if hasattr(st, 'fragment'):
+    fragment = _with_bare_mode_fallback(st.fragment)
+elif hasattr(st, 'experimental_fragment'):
+    fragment = _with_bare_mode_fallback(st.experimental_fragment)
+else:
+    # 旧版本 Streamlit 不支持片段，退化为普通函数（控件变化时整页重新运行）
+    def fragment(func=None, **kwargs):
+        return func if func is not None else (lambda f: f)
+
 # 检查数据是否已生成
 def check_data_generated():
     """检查所需的数据文件是否已存在"""
@@ -55,7 +88,7 @@ def display_customer_overview(df):
         # 区域分布图
         if 'region' in df.columns:
             fig = px.pie(df, names='region', title='客户地区分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/customer_region', use_container_width=True)
     
     with col2:
         # 客户细分图
@@ -68,7 +101,7 @@ def display_customer_overview(df):
                          x='segment', y='count', 
                          labels={'segment': '客户细分', 'count': '数量'},
                          title='客户细分分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/customer_segment', use_container_width=True)
 
 def display_product_overview(df):
     """显示产品数据的概览"""
@@ -85,14 +118,14 @@ def display_product_overview(df):
                          x='category', y='count', 
                          labels={'category': '产品类别', 'count': '数量'},
                          title='产品类别分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/product_category', use_container_width=True)
     
     with col2:
         # 价格分布
         if 'current_price' in df.columns:
             fig = px.histogram(df, x='current_price', nbins=20,
                               title='产品价格分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/product_price', use_container_width=True)
 
 def display_transaction_overview(df):
     """显示交易数据的概览"""
@@ -102,7 +135,7 @@ def display_transaction_overview(df):
         # 交易状态分布
         if 'status' in df.columns:
             fig = px.pie(df, names='status', title='交易状态分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/transaction_status', use_container_width=True)
     
     with col2:
         # 支付方式分布
@@ -115,7 +148,7 @@ def display_transaction_overview(df):
                          x='payment_method', y='count', 
                          labels={'payment_method': '支付方式', 'count': '数量'},
                          title='支付方式分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/payment_method', use_container_width=True)
 
 def display_marketing_overview(df):
     """显示营销活动数据的概览"""
@@ -125,7 +158,7 @@ def display_marketing_overview(df):
         # 营销渠道分布
         if 'channel' in df.columns:
             fig = px.pie(df, names='channel', title='营销渠道分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/marketing_channel', use_container_width=True)
     
     with col2:
         # 营销目标分布
@@ -138,23 +171,22 @@ def display_marketing_overview(df):
                          x='objective', y='count', 
                          labels={'objective': '营销目标', 'count': '数量'},
                          title='营销目标分布')
-            st.plotly_chart(fig, use_container_width=True)
+            plotly_chart(fig, 'overview/marketing_objective', use_container_width=True)
 
+@fragment
 def display_traffic_overview(df):
-    """显示网站流量数据的概览"""
+    """显示网站流量数据的概览（站点筛选只重新运行本片段）"""
     if 'date' in df.columns and 'total_visits' in df.columns:
-        # 转换日期列为日期类型
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.strftime('%Y-%m')
-        
-        # 按月聚合流量
-        monthly_traffic = df.groupby('month')['total_visits'].sum().reset_index()
+        # 使用预先汇总的月度聚合表，明细可以是按小时、多站点的数据
+        rollups = get_traffic_rollups(df)
+        sites = select_sites(rollups, key="traffic_overview_sites")
+        monthly_traffic = summarize_traffic(rollups, 'monthly', sites)
         
         # 绘制流量趋势图
         fig = px.line(monthly_traffic, x='month', y='total_visits',
                      labels={'month': '月份', 'total_visits': '总访问量'},
                      title='月度网站流量趋势')
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, 'overview/monthly_traffic', use_container_width=True)
 
 # 创建可视化辅助函数
 def create_timeseries(df, x, y, title):
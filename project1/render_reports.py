@@ -0,0 +1,38 @@
+"""
+离线渲染全部分析页面为静态报告
+
+示例:
+    python render_reports.py --output reports
+    python render_reports.py --pages sales_dashboard rfm_analysis --workers 2 --format html png
+"""
+import argparse
+import sys
+
+from modules.report_renderer import PNG_EXPORT_AVAILABLE, REPORT_FORMATS, REPORT_PAGES, render_reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线渲染GlobalMart分析页面为静态HTML/PNG报告")
+    parser.add_argument("--output", default="reports", help="输出目录（默认 reports）")
+    parser.add_argument("--pages", nargs="+", choices=list(REPORT_PAGES), help="要渲染的页面，默认全部")
+    parser.add_argument("--format", nargs="+", choices=REPORT_FORMATS, default=["html"], dest="formats",
+                        help="输出格式，png 需要安装 kaleido")
+    parser.add_argument("--data-dir", default=None, help="数据文件目录，默认为项目的 data 目录")
+    parser.add_argument("--workers", type=int, default=None, help="并行的进程数，默认为CPU核数")
+    args = parser.parse_args(argv)
+    
+    if "png" in args.formats and not PNG_EXPORT_AVAILABLE:
+        parser.error("导出PNG需要安装 kaleido: pip install kaleido")
+    
+    def report_progress(result):
+        status = "出错" if result["error"] else "完成"
+        print(f"[{status}] {result['title']} ({result['page']}): "
+              f"{result['figures']} 个图表, {result['seconds']:.2f} 秒", flush=True)
+    
+    results = render_reports(args.output, args.pages, tuple(args.formats), args.workers, args.data_dir,
+                             report_progress)
+    failed = [result['page'] for result in results if result['error']]
+    print(f"报告已写入 {args.output}/index.html")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
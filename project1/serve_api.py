@@ -0,0 +1,27 @@
+"""
+在本地运行分析API，供其他内部工具获取KPI、客户分群、销售预测和营销汇总
+
+示例:
+    python serve_api.py --port 8000
+    curl http://127.0.0.1:8000/api/kpis?names=total_sales,overall_roi
+"""
+import argparse
+import sys
+
+from modules.analytics_api import API_SERVER_AVAILABLE, run_server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运行GlobalMart分析API")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口（默认 8000）")
+    parser.add_argument("--data-dir", default=None, help="数据文件目录，默认为项目的 data 目录")
+    args = parser.parse_args(argv)
+    
+    if not API_SERVER_AVAILABLE:
+        parser.error("运行分析API需要安装 starlette 和 uvicorn: pip install starlette uvicorn")
+    
+    run_server(args.host, args.port, args.data_dir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+多进程部署应用：数据集只加载一次并以内存映射方式在各应用进程间共享，同一客户端的会话
+固定路由到同一进程，SARIMA、K-means 等耗时计算在每个应用进程的计算进程池中运行
+
+示例:
+    python serve_multi.py --workers 4 --port 8501
+    python serve_multi.py --workers 2 --compute-workers 2 --data-dir /path/to/data
+"""
+import argparse
+import os
+import signal
+import sys
+
+from modules.multiprocess_server import run_multiprocess_server
+from modules.shared_data import SHARED_DATA_AVAILABLE, default_shared_dir
+
+def main(argv=None):
+    cpu_count = os.cpu_count() or 2
+    parser = argparse.ArgumentParser(description="以多进程方式运行GlobalMart商务智能分析平台")
+    parser.add_argument("--host", default="0.0.0.0", help="对外监听地址（默认 0.0.0.0）")
+    parser.add_argument("--port", type=int, default=8501, help="对外监听端口（默认 8501）")
+    parser.add_argument("--workers", type=int, default=max(2, cpu_count // 2), help="应用进程数（默认为CPU核数的一半）")
+    parser.add_argument("--backend-port", type=int, default=8600, help="第一个应用进程的本机端口（默认 8600）")
+    parser.add_argument("--compute-workers", type=int, default=1, help="每个应用进程的计算进程数，0 表示不使用进程池（默认 1）")
+    parser.add_argument("--compute-queue", type=int, default=None, help="每个应用进程的计算任务排队上限（默认为计算进程数的两倍）")
+    parser.add_argument("--data-dir", default=None, help="数据文件目录，默认为项目的 data 目录")
+    parser.add_argument("--shared-dir", default=default_shared_dir(), help="共享数据目录（默认在 /dev/shm 下）")
+    args = parser.parse_args(argv)
+    
+    if not SHARED_DATA_AVAILABLE:
+        parser.error("共享数据需要安装 pyarrow: pip install pyarrow")
+    
+    # 收到 SIGTERM 时与 Ctrl+C 一样停止应用进程并删除共享数据
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        run_multiprocess_server(args.host, args.port, args.workers, args.backend_port, args.shared_dir,
+                                args.data_dir, args.compute_workers, args.compute_queue)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
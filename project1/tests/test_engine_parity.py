@@ -0,0 +1,84 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.compute.behavior import compute_segment_behavior
+from modules.compute.customers import build_customer_360
+from modules.compute.engine import POLARS_AVAILABLE
+from modules.sales_cube import build_sales_cube
+
+pytestmark = pytest.mark.skipif(not POLARS_AVAILABLE, reason="需要安装 polars")
+
+@pytest.fixture(scope='module')
+def datasets():
+    """小规模的合成数据：多行订单、跨类别订单，以及客户ID、日期、设备和时间的空值"""
+    rng = np.random.default_rng(0)
+    customers = pd.DataFrame({
+        'customer_id': [f"C{i:03d}" for i in range(40)],
+        'age': rng.integers(18, 70, 40),
+        'gender': rng.choice(['Female', 'Male'], 40),
+        'region': rng.choice(['Asia Pacific', 'Europe', 'North America'], 40),
+        'income': rng.integers(20000, 120000, 40).astype(float),
+        'segment': rng.choice(['New', 'Loyal', 'VIP', 'At Risk'], 40),
+    })
+    
+    rows = []
+    for order in range(300):
+        customer = f"C{rng.integers(0, 45):03d}"
+        date = pd.Timestamp('2023-01-01') + pd.Timedelta(days=int(rng.integers(0, 365)))
+        seconds = int(rng.integers(0, 86400))
+        order_fields = {
+            'transaction_id': f"T{order:05d}",
+            'customer_id': customer,
+            'date': date,
+            'time': f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}",
+            'payment_method': rng.choice(['Credit Card', 'PayPal', 'Gift Card']),
+            'status': rng.choice(['Completed', 'Cancelled']),
+            'device': rng.choice(['App', 'Desktop', 'Mobile']),
+            'coupon_used': bool(rng.random() < 0.3),
+        }
+        for _ in range(int(rng.integers(1, 4))):
+            quantity = int(rng.integers(1, 5))
+            rows.append({
+                **order_fields,
+                'product_category': rng.choice(['Books', 'Electronics', 'Fashion', 'Toys']),
+                'quantity': quantity,
+                'total_amount': round(quantity * float(rng.uniform(5, 300)), 2),
+            })
+    transactions = pd.DataFrame(rows)
+    transactions.loc[[3, 50], 'customer_id'] = np.nan
+    transactions.loc[[7, 8], 'date'] = pd.NaT
+    transactions.loc[[11, 90], 'device'] = np.nan
+    transactions.loc[[20], 'time'] = np.nan
+    return transactions, customers
+
+def test_customer_360_parity(datasets):
+    transactions, customers = datasets
+    pd.testing.assert_frame_equal(build_customer_360(transactions, customers, 'pandas'),
+                                  build_customer_360(transactions, customers, 'polars'))
+
+def test_sales_cube_parity(datasets):
+    transactions, customers = datasets
+    expected = build_sales_cube(transactions, customers, 'pandas')
+    actual = build_sales_cube(transactions, customers, 'polars')
+    for table in ('items', 'orders'):
+        pd.testing.assert_frame_equal(expected[table], actual[table])
+    assert list(expected['daily']) == list(actual['daily'])
+    for key, values in expected['daily'].items():
+        np.testing.assert_allclose(values.astype(float), actual['daily'][key].astype(float), err_msg=key)
+
+def test_segment_behavior_parity(datasets):
+    transactions, customers = datasets
+    customer_360 = build_customer_360(transactions, customers, 'pandas')
+    expected = compute_segment_behavior(transactions, customer_360, 'pandas')
+    actual = compute_segment_behavior(transactions, customer_360, 'polars')
+    for name in ('segment_category', 'segment_time', 'segment_payment', 'segment_device',
+                 'coupon_usage', 'coupon_amount'):
+        pd.testing.assert_frame_equal(getattr(expected, name), getattr(actual, name), obj=name)
+    assert list(expected.portraits) == list(actual.portraits)
+    assert expected.portraits == actual.portraits